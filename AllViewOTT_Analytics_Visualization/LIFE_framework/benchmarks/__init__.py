@@ -0,0 +1 @@
+# This is an __init__ file
@@ -0,0 +1,343 @@
+# Run Command (from LIFE_framework):
+#   python -m benchmarks.bench_etl --scales 1 10 [--backend inprocess] [--report bench_etl.json] [--compare baseline.json]
+#   python -m benchmarks.bench_etl --scales 1 --backend postgres --pg-port 5433 --mongo-uri mongodb://localhost:27018/
+# The postgres backend truncates stage.* and processed.fact_ott: point it at a throwaway database named
+# project_analytics (the transform SQL uses three-part names) and, for disney_plus, a throwaway mongod.
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from code.loaders import StageLoader, ProcessedLoader
+from code.utils.db_utils import connect_postgres, truncate_table
+from code.utils.metrics_utils import job_metrics
+from code.utils.scd_utils import scd2_changes
+from benchmarks.synthetic_data import SOURCES, read_schema, sample_rows, generate_source, mutate, write_source
+
+CONFIG_DIR = "config"
+DDL_DIR = "ddl"
+PROCESSED_CONFIG = "fact_ott_processed"
+# Loader stage names (metrics_utils) as reported, so both backends share one vocabulary
+STAGE_NAMES = {"read": "read", "clean": "dedup", "surrogate_keys": "keygen", "load": "insert", "scd2_merge": "scd2_diff",
+               "scd2_diff": "scd2_diff", "mongo_write": "mongo_write"}
+FACT_COLUMNS = ["stage_layer_sk", "ott_platform", "type", "title", "director", "cast", "country", "date_added",
+                "release_year", "duration_min", "num_seasons", "rating", "categories", "description"]
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def current_rss():
+    """Resident set size of this process in bytes (Linux /proc, else the peak from getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class RssSampler:
+    """Peak RSS while the block runs, sampled from a background thread every interval seconds."""
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_rss = self.peak_rss = 0
+        self.stop = threading.Event()
+
+    def _sample(self):
+        while not self.stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = current_rss()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+        self.peak_rss = max(self.peak_rss, current_rss())
+
+def stage_result(seconds, rows, sampler=None):
+    result = {"seconds": round(seconds, 4), "rows": int(rows),
+              "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None}
+    if sampler is not None:
+        result["peak_rss_mb"] = round(sampler.peak_rss / 2**20, 1)
+        result["rss_delta_mb"] = round((sampler.peak_rss - sampler.start_rss) / 2**20, 1)
+    return result
+
+def measure(stages, stage, fn, *args, rows=None):
+    """Run fn, record its wall time, peak RSS and rows per second under stages[stage], return its result."""
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        result = fn(*args)
+        seconds = time.perf_counter() - start
+    stages[stage] = stage_result(seconds, len(result) if rows is None else rows, sampler)
+    return result
+
+class CopySink:
+    """
+    In-process stand-in for a psycopg2 connection that accepts COPY streams and discards them,
+    so the insert stage measures the client-side cost (prepare_frame, CSV encoding) without a server.
+    """
+    def __init__(self):
+        self.bytes_copied = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def copy_expert(self, query, buffer):
+        self.bytes_copied += len(buffer.getvalue()) if isinstance(buffer, io.StringIO) else len(buffer.read())
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+def write_configs(data_dir, files, args):
+    """The shipped job configs with inputs, null files and connections pointed at the benchmark's own."""
+    paths = {}
+    for key in [f"{name}_stg" for name in SOURCES] + [PROCESSED_CONFIG]:
+        with open(os.path.join(CONFIG_DIR, f"{key}.conf")) as f:
+            conf = json.load(f)
+        conf["database"] = {"dbname": args.pg_dbname, "user": args.pg_user, "password": args.pg_password,
+                            "host": args.pg_host, "port": args.pg_port}
+        name = key[:-len("_stg")]
+        if name in files:
+            conf["input_file"] = files[name]
+            conf["null_output_file"] = os.path.join(data_dir, f"{name}_nulls.csv")
+        if "mongodb" in conf:
+            conf["mongodb"]["uri"] = args.mongo_uri
+        paths[key] = os.path.join(data_dir, f"{key}.conf")
+        with open(paths[key], "w") as f:
+            json.dump(conf, f, indent=2)
+    return paths
+
+def generate_inputs(data_dir, scale, seed, run=1):
+    """Write every source at scale; run 2 is the same data mutated into the next day's snapshot."""
+    files, rows = {}, {}
+    for i, (name, (sample_path, schema_path, file_format)) in enumerate(SOURCES.items()):
+        df = generate_source(schema_path, sample_path, max(int(sample_rows(sample_path) * scale), 1), seed + i)
+        if run > 1:
+            df = mutate(df, seed=seed + 100 * run + i)
+        files[name] = write_source(df, os.path.join(data_dir, f"{name}.{file_format}"), file_format, read_schema(schema_path))
+        rows[name] = len(df)
+    return files, rows
+
+def read_raw(loader, path):
+    """The loader's read without the cast, which is measured as its own stage."""
+    if path.endswith(".json"):
+        return pd.read_json(path, dtype=False, convert_dates=False)
+    return pd.read_csv(path, dtype=loader.schema.read_dtypes())
+
+def to_fact_rows(df, name, surrogate_key):
+    """The rows sql/fact_ott_transform.sql selects from one stage table."""
+    df = df.rename(columns={surrogate_key: "stage_layer_sk", "duration_season": "num_seasons"})
+    return df.assign(ott_platform=name)[FACT_COLUMNS]
+
+def stage_inprocess(conf_path, path, name, stages=None):
+    """One stage job step by step with the loader's own methods; returns its rows in the fact transform's shape."""
+    stages = {} if stages is None else stages
+    loader = StageLoader(conf_path, conn=CopySink())
+    unique_keys = loader.config.get("unique_keys", [])
+    surrogate_key = loader.config["surrogate_key"]
+    df = measure(stages, "read", read_raw, loader, path)
+    df = measure(stages, "cast", loader.cast_schema, df, path)
+    df = measure(stages, "dedup", loader.clean_chunk, df, unique_keys, None, loader.config["null_output_file"], path)
+    keys = measure(stages, "keygen", loader.generate_surrogate_keys, df, unique_keys)
+    df = df.assign(**{surrogate_key: keys, "load_timestamp": datetime.now()})
+    measure(stages, "insert", loader.insert, df, loader.config["target_table"], loader.config["target_db_schema"], rows=len(df))
+    return to_fact_rows(df, name, surrogate_key)
+
+def run_inprocess(data_dir, scale, args):
+    """
+    Stage jobs, the first processed load and an SCD2 diff against the next day's snapshot, with
+    file parsing, pandas and hashing done for real and Postgres replaced by CopySink.
+    """
+    files, _ = generate_inputs(data_dir, scale, args.seed)
+    conf_paths = write_configs(data_dir, files, args)
+    report = {}
+    snapshot = []
+    for name, path in files.items():
+        stages = {}
+        snapshot.append(stage_inprocess(conf_paths[f"{name}_stg"], path, name, stages))
+        report[f"{name}_stg"] = {"rows": stages["read"]["rows"], "stages": stages}
+
+    processed = ProcessedLoader(conf_paths[PROCESSED_CONFIG], conn=CopySink())
+    unique_keys = processed.config["unique_keys"]
+    stages = {}
+    current = pd.concat(snapshot, ignore_index=True).drop_duplicates()
+    keys = measure(stages, "keygen", processed.generate_surrogate_keys, current, unique_keys)
+    current = current.assign(**{processed.config["surrogate_key"]: keys})
+    measure(stages, "insert", processed.insert, current, processed.config["target_table"], processed.config["target_db_schema"], rows=len(current))
+
+    # Next day: the same sources with changed, deleted and new show_ids, diffed against the current slice
+    files, _ = generate_inputs(data_dir, scale, args.seed, run=2)
+    next_snapshot = pd.concat([stage_inprocess(conf_paths[f"{name}_stg"], path, name) for name, path in files.items()],
+                              ignore_index=True).drop_duplicates()
+    changes = measure(stages, "scd2_diff", scd2_changes, next_snapshot, current, unique_keys, processed.key_hash_mode,
+                      rows=len(next_snapshot))
+    report[PROCESSED_CONFIG] = {"rows": len(next_snapshot), "changed_rows": len(changes), "stages": stages}
+    return report
+
+def prepare_database(conf):
+    """Create the schemas and any missing tables from ddl/, and empty the fact table so run 1 is a first load."""
+    conn = connect_postgres(conf["database"])
+    try:
+        with conn.cursor() as cursor:
+            for schema in ("stage", "processed", "consumption"):
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+            for ddl_file in sorted(os.listdir(DDL_DIR)):
+                table = ".".join(ddl_file.split(".")[1:3])
+                cursor.execute("SELECT to_regclass(%s)", (table,))
+                if cursor.fetchone()[0] is None:
+                    with open(os.path.join(DDL_DIR, ddl_file)) as f:
+                        cursor.execute(f.read())
+        conn.commit()
+        truncate_table(conn, conf["target_table"], conf["target_db_schema"])
+    finally:
+        conn.close()
+
+def run_job(loader_cls, conf_path, key):
+    """Run one job end to end and report the stage timings metrics_utils collected for it."""
+    loader = loader_cls(conf_path)
+    try:
+        with job_metrics(key) as metrics, RssSampler() as sampler:
+            start = time.perf_counter()
+            loader.run_pipeline()
+            seconds = time.perf_counter() - start
+    finally:
+        loader.close()
+    stages = {}
+    for stage, stage_seconds in metrics.stage_seconds.items():
+        rows = metrics.counters["rows_read" if stage == "read" else "rows_written"]
+        stages[STAGE_NAMES.get(stage, stage)] = stage_result(stage_seconds, rows)
+    return {"rows": metrics.counters["rows_read"], "seconds": round(seconds, 4),
+            "peak_rss_mb": round(sampler.peak_rss / 2**20, 1), "counters": dict(metrics.counters), "stages": stages}
+
+def run_postgres(data_dir, scale, args):
+    """Stage jobs and the processed SCD2 merge against a real Postgres (and mongod for disney_plus), for two days of data."""
+    report = {}
+    for run in (1, 2):
+        files, _ = generate_inputs(data_dir, scale, args.seed, run)
+        conf_paths = write_configs(data_dir, files, args)
+        if run == 1:
+            with open(conf_paths[PROCESSED_CONFIG]) as f:
+                prepare_database(json.load(f))
+        for name in files:
+            key = f"{name}_stg"
+            report[key if run == 1 else f"{key}_day2"] = run_job(StageLoader, conf_paths[key], key)
+        report[PROCESSED_CONFIG if run == 1 else f"{PROCESSED_CONFIG}_day2"] = run_job(ProcessedLoader, conf_paths[PROCESSED_CONFIG], PROCESSED_CONFIG)
+    return report
+
+def best_of(reports):
+    """Fastest time per stage over repeats (peak RSS is taken from the same repeat)."""
+    best = reports[0]
+    for report in reports[1:]:
+        for job, result in report.items():
+            for stage, timing in result["stages"].items():
+                if timing["seconds"] < best[job]["stages"][stage]["seconds"]:
+                    best[job]["stages"][stage] = timing
+    return best
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"git_commit": commit or None, "python": platform.python_version(), "pandas": pd.__version__,
+            "numpy": np.__version__, "platform": platform.platform(), "cpus": os.cpu_count()}
+
+def compare(report, baseline_path, tolerance, min_seconds):
+    """Print stage time ratios against a previous report; returns the stages slower than 1 + tolerance."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old = {(run["scale"], job, stage): timing["seconds"]
+           for run in baseline["runs"] for job, result in run["jobs"].items() for stage, timing in result["stages"].items()}
+    regressions = []
+    print(f"\n{'scale':>6} {'job':<24}{'stage':<12}{'baseline s':>11}{'current s':>11}{'ratio':>8}")
+    for run in report["runs"]:
+        for job, result in run["jobs"].items():
+            for stage, timing in result["stages"].items():
+                before = old.get((run["scale"], job, stage))
+                if before is None:
+                    continue
+                ratio = timing["seconds"] / before if before > 0 else float("inf")
+                slower = ratio > 1 + tolerance and timing["seconds"] >= min_seconds
+                print(f"{run['scale']:>6g} {job:<24}{stage:<12}{before:>11.3f}{timing['seconds']:>11.3f}{ratio:>7.2f}x{'  REGRESSION' if slower else ''}")
+                if slower:
+                    regressions.append((run["scale"], job, stage, ratio))
+    return regressions
+
+def print_run(scale, jobs):
+    print(f"\nscale {scale:g}x")
+    print(f"{'job':<24}{'stage':<12}{'rows':>10}{'seconds':>10}{'rows/s':>12}{'peak RSS MB':>13}")
+    for job, result in jobs.items():
+        for stage, timing in result["stages"].items():
+            rows_per_second = f"{timing['rows_per_second']:,.0f}" if timing["rows_per_second"] else "-"
+            print(f"{job:<24}{stage:<12}{timing['rows']:>10}{timing['seconds']:>10.3f}{rows_per_second:>12}"
+                  f"{timing.get('peak_rss_mb', result.get('peak_rss_mb', '-')):>13}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LIFE stage and processed loaders on synthetic OTT data")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10], help="multiples of the sample files (1 to 100)")
+    parser.add_argument("--backend", choices=["inprocess", "postgres"], default="inprocess")
+    parser.add_argument("--repeat", type=int, default=1, help="in-process runs per scale, fastest kept per stage")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--report", default="bench_etl_report.json")
+    parser.add_argument("--compare", help="previous report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slow-down before a stage counts as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="ignore regressions in stages faster than this")
+    parser.add_argument("--data-dir", help="where to write the generated inputs (default: a temp dir)")
+    parser.add_argument("--keep-data", action="store_true")
+    parser.add_argument("--pg-host", default="localhost")
+    parser.add_argument("--pg-port", type=int, default=5432)
+    parser.add_argument("--pg-user", default="postgres")
+    parser.add_argument("--pg-password", default=os.environ.get("PGPASSWORD", ""))
+    parser.add_argument("--pg-dbname", default="project_analytics")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="life_bench_")
+    os.makedirs(data_dir, exist_ok=True)
+    report = {"benchmark": "life_etl", "backend": args.backend, "created": datetime.now().isoformat(timespec="seconds"),
+              "seed": args.seed, "repeat": args.repeat, **environment(), "runs": []}
+    try:
+        for scale in args.scales:
+            if args.backend == "postgres":
+                jobs = run_postgres(data_dir, scale, args)
+            else:
+                jobs = best_of([run_inprocess(data_dir, scale, args) for _ in range(max(args.repeat, 1))])
+            report["runs"].append({"scale": scale, "jobs": jobs})
+            print_run(scale, jobs)
+    finally:
+        if not args.keep_data and not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.report}")
+
+    if args.compare:
+        regressions = compare(report, args.compare, args.tolerance, args.min_seconds)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed by more than {args.tolerance:.0%}")
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
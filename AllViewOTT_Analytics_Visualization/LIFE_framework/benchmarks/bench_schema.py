@@ -0,0 +1,85 @@
+# Run Command (from LIFE_framework): python -m benchmarks.bench_schema [--scales 1 10 50] [--bad-rate 0.01]
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from code.utils.schema_utils import compile_schema, REJECT_COLUMN
+from benchmarks.synthetic_data import SOURCES, sample_rows, generate_source, write_source
+
+SOURCE = "netflix"
+REPEAT = 3
+# (column, malformed value) pairs injected into the dirty variant, one reason code each
+BAD_VALUES = [("release_year", "20x1"), ("date_added", "2021-09-25"), ("type", "Podcast"), ("duration_min", "-90")]
+
+def legacy_read(path, schema_path, date_format="%d/%m/%y"):
+    """The reader before compiled schemas: parser dtypes plus a per-column astype that fails the whole frame."""
+    schema_df = pd.read_csv(schema_path)
+    col_types = dict(zip(schema_df["column_name"], schema_df["data_type"]))
+    non_date_columns = {k: v for k, v in col_types.items() if v != 'datetime'}
+    df = pd.read_csv(path, dtype=non_date_columns)
+    for col, dtype in col_types.items():
+        if dtype == 'datetime':
+            df[col] = pd.to_datetime(df[col], format=date_format, errors='coerce')
+        elif dtype != 'str':
+            df[col] = df[col].astype(dtype)
+    return df
+
+def compiled_read(path, schema):
+    return schema.apply(pd.read_csv(path, dtype=schema.read_dtypes()))
+
+def dirty(df, bad_rate, seed=7):
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+    for column, value in BAD_VALUES:
+        df.loc[rng.random(len(df)) < bad_rate / len(BAD_VALUES), column] = value
+    return df
+
+def best_of(fn, *args):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except (ValueError, TypeError) as e:
+            return None, e
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of schema casting and validation on synthetic netflix files")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10])
+    parser.add_argument("--bad-rate", type=float, default=0.01, help="fraction of rows given one malformed value")
+    args = parser.parse_args()
+
+    sample_path, schema_path, _ = SOURCES[SOURCE]
+    schema = compile_schema(schema_path)
+    data_dir = tempfile.mkdtemp(prefix="life_bench_schema_")
+    try:
+        print(f"{'scale':>6}{'rows':>10}  {'variant':<18}{'seconds':>9}{'rows/s':>12}{'valid':>10}{'rejected':>10}")
+        for scale in args.scales:
+            df = generate_source(schema_path, sample_path, int(sample_rows(sample_path) * scale))
+            clean_path = write_source(df, os.path.join(data_dir, "clean.csv"), "csv")
+            dirty_path = write_source(dirty(df, args.bad_rate), os.path.join(data_dir, "dirty.csv"), "csv")
+
+            variants = [("legacy, clean", legacy_read, clean_path, schema_path),
+                        ("legacy, dirty", legacy_read, dirty_path, schema_path),
+                        ("compiled, clean", compiled_read, clean_path, schema),
+                        ("compiled, dirty", compiled_read, dirty_path, schema)]
+            for label, fn, path, schema_arg in variants:
+                seconds, result = best_of(fn, path, schema_arg)
+                if seconds is None:
+                    print(f"{scale:>6g}{len(df):>10}  {label:<18}  failed: {type(result).__name__}: {str(result)[:60]}")
+                    continue
+                valid, rejects = result if isinstance(result, tuple) else (result, result.iloc[:0])
+                print(f"{scale:>6g}{len(df):>10}  {label:<18}{seconds:>9.3f}{len(df) / seconds:>12,.0f}{len(valid):>10}{len(rejects):>10}")
+                if len(rejects):
+                    for reason, n in rejects[REJECT_COLUMN].value_counts().items():
+                        print(f"{'':>36}{reason:<32}{n:>8}")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# Run Command (from LIFE_framework): python -m benchmarks.synthetic_data --scale 10 --out bench_data [--seed 42]
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# source: (sample file the value pools are drawn from, schema, output format)
+SOURCES = {
+    "netflix": ("data/netflix.csv", "metadata/schema_netflix.csv", "csv"),
+    "hulu": ("data/hulu.csv", "metadata/schema_hulu.csv", "csv"),
+    "amazon_prime": ("data/amazon_prime.csv", "metadata/schema_amazon_prime.csv", "csv"),
+    "disney_plus": ("data/disney_plus.json", "metadata/schema_disney_plus.csv", "json"),
+}
+KEY_COLUMN = "show_id"
+DATE_FORMAT = "%d/%m/%y"
+WORDS = np.array("the of and a to in is you that it he was for on are as with his they at be this from".split())
+
+def read_schema(schema_path):
+    schema_df = pd.read_csv(schema_path)
+    return dict(zip(schema_df["column_name"], schema_df["data_type"]))
+
+def read_sample(sample_path):
+    """Raw sample values as text, exactly as they appear in the source file (nulls stay NaN)."""
+    if sample_path.endswith(".json"):
+        df = pd.read_json(sample_path, dtype=False, convert_dates=False)
+        return df.astype(object).where(df.isna(), df.astype(str))
+    return pd.read_csv(sample_path, dtype=str)
+
+def synthetic_column(dtype, rows, rng):
+    """Values for a schema column that has no sample to draw from."""
+    if dtype == "int":
+        return rng.integers(0, 2025, rows).astype(str)
+    if dtype == "datetime":
+        days = rng.integers(0, 365 * 15, rows)
+        return (pd.Timestamp("2008-01-01") + pd.to_timedelta(days, unit="D")).strftime(DATE_FORMAT).to_numpy()
+    lengths = rng.integers(1, 12, rows)
+    return np.array([" ".join(rng.choice(WORDS, n)) for n in lengths], dtype=object)
+
+def generate_source(schema_path, sample_path, rows, seed=42, duplicate_rate=0.01, null_key_rate=0.001):
+    """
+    rows schema-conformant records for one source, as text columns ready to write out.
+    Every non-key column is drawn independently from the sample file's values (keeping their
+    null rate and formats), or synthesised from the schema type when the sample lacks it.
+    show_id is unique per row; duplicate_rate exact duplicate rows and null_key_rate rows
+    without a show_id are mixed in so the dedup and null-routing paths get exercised.
+    """
+    rng = np.random.default_rng(seed)
+    col_types = read_schema(schema_path)
+    sample = read_sample(sample_path) if sample_path and os.path.exists(sample_path) else pd.DataFrame()
+
+    unique_rows = max(rows - int(rows * duplicate_rate), 1)
+    data = {}
+    for col, dtype in col_types.items():
+        if col == KEY_COLUMN:
+            data[col] = np.char.add("s", np.arange(1, unique_rows + 1).astype(str)).astype(object)
+        elif col in sample.columns and sample[col].notna().any():
+            pool = sample[col].to_numpy(dtype=object)
+            if dtype == "int":
+                # int columns are cast with astype(int), which rejects nulls
+                pool = pool[pd.notna(pool)]
+            data[col] = pool[rng.integers(0, len(pool), unique_rows)]
+        else:
+            data[col] = synthetic_column(dtype, unique_rows, rng)
+    df = pd.DataFrame(data, columns=list(col_types))
+
+    if null_key_rate:
+        df.loc[rng.random(unique_rows) < null_key_rate, KEY_COLUMN] = np.nan
+    if rows > unique_rows:
+        df = pd.concat([df, df.iloc[rng.integers(0, unique_rows, rows - unique_rows)]], ignore_index=True)
+        df = df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+    return df
+
+def mutate(df, seed=43, change_rate=0.05, delete_rate=0.01, insert_rate=0.02, column="rating"):
+    """
+    Next day's snapshot of a source: change_rate of the show_ids get a new value in column,
+    delete_rate disappear and insert_rate new show_ids arrive, so SCD2 has a realistic diff.
+    Changes are drawn per show_id, so duplicate rows stay exact duplicates.
+    """
+    rng = np.random.default_rng(seed)
+    keys = df[KEY_COLUMN].dropna().unique()
+    draw = pd.Series(rng.random(len(keys)), index=keys)
+    key_draw = df[KEY_COLUMN].map(draw)
+    df = df[~(key_draw < delete_rate)].copy()
+    changed = (key_draw[df.index] >= delete_rate) & (key_draw[df.index] < delete_rate + change_rate)
+    df.loc[changed, column] = df.loc[changed, column].fillna("") + "-rev"
+
+    new_rows = int(len(df) * insert_rate)
+    if new_rows:
+        new_df = df.iloc[rng.integers(0, len(df), new_rows)].copy()
+        new_df[KEY_COLUMN] = [f"n{seed}_{i}" for i in range(new_rows)]
+        df = pd.concat([df, new_df], ignore_index=True)
+    return df
+
+def write_source(df, path, file_format, col_types=None):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if file_format == "json":
+        # A JSON array like the shipped sample, with the int columns as numbers
+        df = df.assign(**{col: pd.to_numeric(df[col]) for col, dtype in (col_types or {}).items() if dtype == "int"})
+        records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+        with open(path, "w") as f:
+            json.dump(records, f)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+def sample_rows(sample_path):
+    return len(read_sample(sample_path))
+
+def generate(out_dir, scale=1.0, seed=42, sources=SOURCES, **options):
+    """Write every source at scale x its sample size into out_dir; returns {source: (path, rows)}."""
+    written = {}
+    for i, (name, (sample_path, schema_path, file_format)) in enumerate(sources.items()):
+        rows = max(int(sample_rows(sample_path) * scale), 1)
+        df = generate_source(schema_path, sample_path, rows, seed + i, **options)
+        path = write_source(df, os.path.join(out_dir, f"{name}.{file_format}"), file_format, read_schema(schema_path))
+        written[name] = (path, len(df))
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic OTT sources shaped like the LIFE sample files")
+    parser.add_argument("--scale", type=float, default=1.0, help="rows as a multiple of each sample file (1 to 100)")
+    parser.add_argument("--out", default="bench_data")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--duplicate-rate", type=float, default=0.01)
+    parser.add_argument("--null-key-rate", type=float, default=0.001)
+    args = parser.parse_args()
+
+    written = generate(args.out, args.scale, args.seed, duplicate_rate=args.duplicate_rate, null_key_rate=args.null_key_rate)
+    for name, (path, rows) in written.items():
+        print(f"{name:<14}{rows:>10} rows  {path}")
+
+if __name__ == "__main__":
+    main()
@@ -4,39 +4,170 @@ import json
 import uuid
 from datetime import datetime
 import hashlib
-from code.utils.db_utils import connect_postgres, run_query, truncate_table, insert_dataframe
-from code.utils.mongo_utils import connect_mongo, read_from_mongo, load_json_to_mongo_with_schema
+from code.utils.db_utils import get_pool, unit_of_work, run_query, run_query_chunks, truncate_table, create_swap_table, swap_in, insert_dataframe, upsert_dataframe, delete_keys, DEFAULT_CHUNK_SIZE
+from code.utils.hash_utils import surrogate_keys, row_hashes, RowDeduplicator
+from code.utils.state_utils import (file_checksum, get_load_state, save_load_state, read_row_hashes, read_row_hash_subset,
+                                    save_row_hashes, reset_row_state, changed_keys_since, full_reloads_since,
+                                    record_table_load, get_table_loads)
+from code.utils.cache_utils import StageCache, read_parquet_chunks
+from code.utils.scd_utils import scd2_merge, scd2_close, scd2_changes, table_has_rows
+from code.utils.metrics_utils import count, timed, timed_iter
+from code.utils.schema_utils import compile_schema, null_key_reasons, DEFAULT_DATE_FORMAT, REJECT_COLUMN
+from code.utils.layout_utils import apply_layout, load_window
+from code.utils.kpi_utils import rebuild_kpi_summary, refresh_kpi_summary
+from code.utils.mongo_utils import connect_mongo, read_from_mongo, read_from_mongo_chunks, truncate_collection, write_to_mongo
 from code.logger_config import get_logger
 
 logger = get_logger()
 
+# Stage config keys that shape the cleaned frame, hashed into the stage cache key with the source and schema files
+CACHE_KEY_SETTINGS = ("source_type", "date_format", "json_lines", "unique_keys", "surrogate_key", "key_hash_mode", "chunk_dedup")
+
 class BaseLoader:
-    def __init__(self, config_path):
+    def __init__(self, config_path, conn=None):
         self.config = self.load_config(config_path)
-        self.conn = connect_postgres(self.config["database"])
-        self.schema_path = self.config["schema_path"]
-        self.col_types = self.apply_custom_schema()
+        self.mongo_client = None
+        # Only loaders that read files or Mongo cast against a metadata schema
+        self.schema_path = self.config.get("schema_path")
+        self.schema = self.apply_custom_schema() if self.schema_path else None
+        self.col_types = self.schema.dtypes if self.schema else {}
+        self.load_method = self.config.get("load_method", "copy")
+        self.load_chunk_size = self.config.get("load_chunk_size", DEFAULT_CHUNK_SIZE)
+        self.key_hash_mode = self.config.get("key_hash_mode", "md5")
+        # "off" trades the last commits on a server crash for not waiting on WAL flushes, for re-runnable bulk jobs
+        self.synchronous_commit = self.config.get("synchronous_commit")
+        self.reject_columns = None
+        self.layout = self.config.get("layout")
         self.df = pd.DataFrame()
+        # Connections come from the database's shared pool; close() hands them back. Taken last, so a
+        # constructor failing on the schema or config never keeps one checked out
+        self.pool = None if conn is not None else get_pool(self.config["database"])
+        self.conn = conn if conn is not None else self.pool.getconn()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        """Release the Postgres connection (back to its pool) and any Mongo client opened by the run."""
+        if self.mongo_client is not None:
+            self.mongo_client.close()
+            self.mongo_client = None
+        if self.pool is not None and self.conn is not None:
+            self.pool.putconn(self.conn)
+            self.conn = None
 
     def load_config(self, path):
         with open(path, 'r') as f:
             return json.load(f)
 
+    def prepare_layout(self, table, db_schema):
+        """Bring the target table's partitions and indexes in line with the config's layout block before loading."""
+        if self.layout:
+            apply_layout(self.conn, db_schema, table, self.layout)
+
     def apply_custom_schema(self):
-        schema_df = pd.read_csv(self.schema_path)
-        col_types = {row["column_name"]: row["data_type"] for _, row in schema_df.iterrows()}
-        logger.info(f"Custom schema applied: {col_types}")
-        return col_types
+        schema = compile_schema(self.schema_path, self.config.get("date_format", DEFAULT_DATE_FORMAT))
+        logger.info(f"Custom schema applied: {schema.dtypes}")
+        return schema
+
+    def cast_schema(self, df, source=None):
+        """
+        Cast and validate a raw frame against the compiled metadata schema; shared by the CSV, JSON,
+        parquet and Mongo readers. Rows that fail a column rule go to the reject output with a
+        reason code instead of failing the run.
+        """
+        df, rejects = self.schema.apply(df)
+        self.write_rejects(rejects, source or self.config.get("input_file"))
+        return df
+
+    def write_rejects(self, rows, source, output_path=None):
+        """Append rows (carrying a reject_reason column) to the nulls/reject file, writing the header once per run."""
+        if rows.empty:
+            return
+        output_path = output_path or self.config.get("null_output_file", "data/nulls.csv")
+        if self.reject_columns is None:
+            self.reject_columns = list(rows.columns)
+            rows.to_csv(output_path, index=False)
+        else:
+            rows.reindex(columns=self.reject_columns).to_csv(output_path, index=False, mode='a', header=False)
+        count("rejected_rows", len(rows))
+        for reason, rejected in rows[REJECT_COLUMN].value_counts().items():
+            logger.info(f"Rejected {rejected} records of file {source} ({reason}) into file {output_path}")
 
     def read_csv(self, file_path):
         logger.info(f"CSV file read with schema: {file_path}")
-        non_date_columns = {k:v for k,v in self.col_types.items() if v!='datetime'}
-        date_columns = {k:v for k,v in self.col_types.items() if v=='datetime'}
-        df = pd.read_csv(file_path, dtype=non_date_columns, parse_dates=list(date_columns.keys()))
-        df[[col for col in date_columns]] = df[[col for col in date_columns]].apply(lambda x: pd.to_datetime(x, format="%Y-%m-%d', errors='coerce"))
-        return df
-    
+        return self.cast_schema(pd.read_csv(file_path, dtype=self.schema.read_dtypes()), file_path)
+
+    def read_csv_chunks(self, file_path, chunk_rows):
+        """Streaming counterpart of read_csv: yields typed DataFrames of at most chunk_rows rows."""
+        logger.info(f"CSV file streamed with schema in chunks of {chunk_rows} rows: {file_path}")
+        with pd.read_csv(file_path, dtype=self.schema.read_dtypes(), chunksize=chunk_rows) as reader:
+            for df in reader:
+                yield self.cast_schema(df, file_path)
+
+    def read_json(self, file_path, chunk_rows=None, lines=False):
+        """
+        Yield a JSON source as typed DataFrames. Line-delimited files (lines=True) are streamed
+        chunk_rows records at a time; a JSON array has to be parsed whole and is only sliced.
+        """
+        logger.info(f"JSON file read with schema: {file_path}")
+        # Values keep their JSON types (dtype=False); casting and validation is the schema's job
+        if chunk_rows and lines:
+            with pd.read_json(file_path, lines=True, dtype=False, convert_dates=False, chunksize=chunk_rows) as reader:
+                for df in reader:
+                    yield self.cast_schema(df, file_path)
+            return
+        df = self.cast_schema(pd.read_json(file_path, lines=lines, dtype=False, convert_dates=False), file_path)
+        if not chunk_rows:
+            yield df
+            return
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+    def read_parquet(self, file_path, chunk_rows=None):
+        """Read a columnar source delivered as parquet, cast to the same schema as the CSV path."""
+        logger.info(f"Parquet file read with schema: {file_path}")
+        for df in read_parquet_chunks(file_path, chunk_rows):
+            yield self.cast_schema(df, file_path)
+
+    def clean_chunk(self, chunk, unique_keys, dedup, nulls_output_path, source):
+        """
+        Drop duplicate rows (across chunks when a RowDeduplicator is passed) and move rows with
+        null unique keys to nulls_output_path, appending after the first write of this run.
+        """
+        # Remove duplicates
+        rows = len(chunk)
+        chunk = dedup.filter(chunk) if dedup else chunk.drop_duplicates()
+        count("duplicate_rows", rows - len(chunk))
+
+        # Null check and write to a file if any
+        if unique_keys:
+            reasons = null_key_reasons(chunk, unique_keys)
+            has_null = pd.notna(reasons)
+            if has_null.any():
+                self.write_rejects(chunk[has_null].assign(**{REJECT_COLUMN: reasons[has_null]}), source, nulls_output_path)
+                count("null_rows", int(has_null.sum()))
+            chunk = chunk[~has_null]
+        return chunk
+
+    def insert(self, df, table, db_schema):
+        insert_dataframe(self.conn, df, table, db_schema, method=self.load_method, chunk_size=self.load_chunk_size)
+
+    def generate_surrogate_keys(self, df, primary_keys):
+        keys, fallbacks = surrogate_keys(df, primary_keys, mode=self.key_hash_mode)
+        if fallbacks:
+            logger.warning(f"{fallbacks} rows have no value in {primary_keys}, assigned random uuid4 surrogate keys")
+        return keys
+
+    def generate_row_hash(self, df, columns):
+        return row_hashes(df, columns, mode=self.key_hash_mode)
+
     def generate_surrogate_key(self, row, primary_keys):
+        # Row-wise reference implementation; generate_surrogate_keys produces identical md5 keys column-wise
         key_string = "_".join(str(row[pk]) for pk in primary_keys if pd.notna(row[pk]))
         return hashlib.md5(key_string.encode()).hexdigest() if key_string else str(uuid.uuid4())
 
@@ -50,47 +181,204 @@ class StageLoader(BaseLoader):
         nulls_output_path = self.config.get("null_output_file", "data/nulls.csv")
         db_schema = self.config.get("target_db_schema", "stage")
         table = self.config["target_table"]
-
-        if source_type == "csv":
-            self.df = self.read_csv(file_path)
+        incremental = self.config.get("load_mode", "full") == "incremental"
+        # "truncate" empties the table inside the load transaction, "swap" loads a copy and renames it in
+        load_strategy = self.config.get("load_strategy", "truncate")
+        if load_strategy not in ("truncate", "swap"):
+            raise ValueError(f"Unsupported load_strategy {load_strategy}. Expected 'truncate' or 'swap'.")
+        # chunk_rows switches to streaming: every step below runs per chunk and memory stays bounded
+        chunk_rows = self.config.get("chunk_rows")
+        # Cross-chunk dedup keeps a 16-byte fingerprint per distinct row ("fingerprint", bounded memory,
+        # ~n**2/2**129 chance of dropping a row); "exact" also keeps the rows to confirm every hit
+        chunk_dedup = self.config.get("chunk_dedup", "fingerprint")
+        if chunk_dedup not in ("exact", "fingerprint"):
+            raise ValueError(f"Unsupported chunk_dedup {chunk_dedup}. Expected 'exact' or 'fingerprint'.")
+        exact_dedup = chunk_dedup == "exact"
+
+        if incremental:
+            checksum = file_checksum(file_path)
+            state = get_load_state(self.conn, table)
+            if state and state["file_checksum"] == checksum:
+                logger.info(f"Source file {file_path} unchanged since last load, skipping {db_schema}.{table}")
+                return
+        self.prepare_layout(table, db_schema)
+
+        mirror_to_mongo = False
+
+        # Optional columnar snapshot of the cleaned frame, reused while source, schema and key settings are unchanged
+        cache_conf = self.config.get("stage_cache")
+        cache = cached = None
+        if cache_conf:
+            cache = StageCache(cache_conf.get("dir", "cache"), table, cache_conf.get("format", "arrow"), cache_conf.get("compression", "zstd"))
+            settings = {key: self.config.get(key) for key in CACHE_KEY_SETTINGS}
+            cache_key = StageCache.source_key(file_path, self.schema_path, extra=json.dumps(settings, sort_keys=True, default=str))
+            cached = cache.read(cache_key, chunk_rows)
+
+        if cached is not None:
+            chunks = cached
+            # A hit replaces parsing and cleaning, not the mirror: Mongo still gets this run's rows. A system of
+            # record is left as is, the cache being a copy of what was staged from it.
+            if source_type == "mongo" and not self.config["mongodb"].get("system_of_record", False):
+                mongo_conf = self.config["mongodb"]
+                mongo_client, upsert_keys = self.open_mongo_target(mongo_conf, unique_keys)
+                mirror_to_mongo = True
+        elif source_type == "csv":
+            chunks = self.read_csv_chunks(file_path, chunk_rows) if chunk_rows else [self.read_csv(file_path)]
+        elif source_type == "parquet":
+            chunks = self.read_parquet(file_path, chunk_rows)
         elif source_type == "mongo":
-            logger.info(f"Reading JSON file: {file_path}")
-            load_json_to_mongo_with_schema(self.config)
-            logger.info("Reading data from MongoDB source.")
-            client = connect_mongo(self.config["mongodb"])
-            self.df = read_from_mongo(client, self.config["mongodb"])
-            # Cast columns
-            non_date_columns = {k:v for k,v in self.col_types.items() if v!='datetime'}
-            date_columns = {k:v for k,v in self.col_types.items() if v=='datetime'}
-            self.df = self.df.astype(non_date_columns)
-            self.df[[col for col in date_columns]] = self.df[[col for col in date_columns]].apply(lambda x: pd.to_datetime(x, format="%d/%m/%y", errors='coerce'))
+            mongo_conf = self.config["mongodb"]
+            mongo_client, upsert_keys = self.open_mongo_target(mongo_conf, unique_keys)
+            json_chunks = self.read_json(file_path, chunk_rows, self.config.get("json_lines", False))
+            if mongo_conf.get("system_of_record", False):
+                # Mongo is the master copy: land the cleaned JSON there first, then stage from what Mongo holds
+                mongo_dedup = RowDeduplicator(exact_dedup) if chunk_rows else None
+                for chunk in json_chunks:
+                    write_to_mongo(mongo_client, mongo_conf, self.clean_chunk(chunk, unique_keys, mongo_dedup, nulls_output_path, file_path), upsert_keys)
+                logger.info("Reading data from MongoDB source.")
+                if chunk_rows:
+                    chunks = (self.cast_schema(df) for df in read_from_mongo_chunks(mongo_client, mongo_conf, chunk_rows, projection=list(self.col_types)))
+                else:
+                    chunks = [self.cast_schema(read_from_mongo(mongo_client, mongo_conf))]
+            else:
+                # Single pass: each cleaned chunk is mirrored to Mongo and goes straight on to Postgres
+                chunks = json_chunks
+                mirror_to_mongo = True
 
         else:
             raise ValueError(f"Unsupported file type: {source_type}")
-        
-        # Remove duplicates
-        self.df.drop_duplicates(inplace=True)
-
-        # Null check and write to a file if any
-        if unique_keys:
-            null_df = self.df[self.df[unique_keys].isnull().any(axis=1)]
-            if not null_df.empty:
-                null_df.to_csv(nulls_output_path, index=False)
-                logger.info(f"Loaded {len(null_df)} null records of file {file_path} into file {nulls_output_path}")
-            self.df = self.df.dropna(subset=unique_keys)
-        
-        # Add surrogate Key
-        self.df[surrogate_key] = self.df.apply(lambda row: self.generate_surrogate_key(row, unique_keys), axis=1)
 
-        # Add load timestamp for tracking
-        self.df['load_timestamp'] = datetime.now()
-
-        # Since stage layer is SCD type1, truncate the table before next step of insert
-        truncate_table(self.conn, table, db_schema)
-
-        # Insert data to postgres
-        insert_dataframe(self.conn, self.df, table, db_schema)
-        logger.info("Stage pipeline completed successfully.")
+        # Add load timestamp for tracking, shared by every chunk of this run
+        load_timestamp = datetime.now()
+
+        # One transaction per load: readers see the previous load until the new one is complete
+        load_table = table
+        with unit_of_work(self.conn, self.synchronous_commit), load_window(self.conn, db_schema, table, self.layout,
+                                                                                   bulk=not incremental and load_strategy == "truncate"):
+            if incremental:
+                tracker = self.begin_incremental(table)
+            elif load_strategy == "swap":
+                load_table = create_swap_table(self.conn, table, db_schema)
+            else:
+                # Since stage layer is SCD type1, truncate the table before next step of insert
+                truncate_table(self.conn, table, db_schema)
+
+            dedup = RowDeduplicator(exact_dedup) if chunk_rows else None
+            cache_writer = cache.writer(cache_key) if cache is not None and cached is None else None
+            rows_loaded = 0
+            try:
+                for chunk in timed_iter(chunks):
+                    if cached is None:
+                        with timed("clean"):
+                            chunk = self.clean_chunk(chunk, unique_keys, dedup, nulls_output_path, file_path)
+                        if mirror_to_mongo:
+                            with timed("mongo_write"):
+                                write_to_mongo(mongo_client, mongo_conf, chunk, upsert_keys)
+
+                        # Add surrogate Key
+                        with timed("surrogate_keys"):
+                            chunk = chunk.assign(**{surrogate_key: self.generate_surrogate_keys(chunk, unique_keys)})
+                        if cache_writer:
+                            cache_writer.write(chunk)
+                    elif mirror_to_mongo:
+                        with timed("mongo_write"):
+                            write_to_mongo(mongo_client, mongo_conf, chunk.drop(columns=[surrogate_key]), upsert_keys)
+
+                    chunk = chunk.assign(load_timestamp=load_timestamp)
+
+                    # Insert data to postgres
+                    if incremental:
+                        self.load_incremental_chunk(tracker, chunk, table, db_schema, surrogate_key)
+                    else:
+                        self.insert(chunk, load_table, db_schema)
+                    rows_loaded += len(chunk)
+                    self.df = chunk
+            except Exception:
+                if cache_writer:
+                    cache_writer.discard()
+                raise
+            if cache_writer:
+                cache_writer.commit()
+
+            if incremental:
+                self.finish_incremental(tracker, table, db_schema, surrogate_key, checksum, load_timestamp)
+            else:
+                if load_table != table:
+                    swap_in(self.conn, load_table, table, db_schema)
+                # Committed with the reload: stale row hashes go, and processed loads see a reload without a delta
+                reset_row_state(self.conn, table, file_checksum(file_path), load_timestamp)
+        logger.info(f"Stage pipeline completed successfully, {rows_loaded} rows loaded.")
+
+    def open_mongo_target(self, mongo_conf, unique_keys):
+        """Connect to the run's Mongo collection and empty it unless it is upserted into; returns (client, upsert keys)."""
+        mongo_client = self.mongo_client = connect_mongo(mongo_conf)
+        upsert_keys = unique_keys if mongo_conf.get("write_mode", "insert") == "upsert" else None
+        if not upsert_keys:
+            truncate_collection(mongo_client, mongo_conf)
+        return mongo_client, upsert_keys
+
+    def begin_incremental(self, table):
+        """
+        Incremental loads upsert only new or changed rows, found through the per-row content
+        hashes kept in the state store, and delete rows that left the source. With append_only
+        the feed is trusted to only grow, so rows are selected by the watermark_column
+        high-water mark instead.
+        """
+        append_only = self.config.get("append_only", False)
+        state = get_load_state(self.conn, table) if append_only else None
+        return {
+            "append_only": append_only,
+            "watermark_column": self.config.get("watermark_column", "date_added"),
+            "high_water_mark": state["high_water_mark"] if state else None,
+            "known": pd.Series(dtype=object) if append_only else read_row_hashes(self.conn, table),
+            "seen_keys": set(),
+            "max_watermark": None,
+            "changed": 0,
+            "unchanged": 0,
+        }
+
+    def load_incremental_chunk(self, tracker, chunk, table, db_schema, surrogate_key):
+        watermark_column = tracker["watermark_column"]
+        data_columns = [col for col in chunk.columns if col not in (surrogate_key, 'load_timestamp')]
+        row_hash = self.generate_row_hash(chunk, data_columns)
+        keys = chunk[surrogate_key]
+
+        if tracker["append_only"]:
+            high_water_mark = tracker["high_water_mark"]
+            if pd.notna(high_water_mark):
+                watermarks = chunk[watermark_column]
+                changed = watermarks > high_water_mark
+                # Rows dated on the high-water mark itself may have arrived after the last load (date_added is
+                # day-granular); of those, only the ones whose hash is not recorded yet are new
+                boundary = (watermarks == high_water_mark).to_numpy()
+                if boundary.any():
+                    known = read_row_hash_subset(self.conn, table, keys[boundary])
+                    changed |= pd.Series(boundary, index=chunk.index) & keys.map(known).ne(row_hash)
+            else:
+                changed = pd.Series(True, index=chunk.index)
+        else:
+            changed = keys.map(tracker["known"]).ne(row_hash)
+            tracker["seen_keys"].update(keys)
+
+        upsert_dataframe(self.conn, chunk[changed], table, db_schema, [surrogate_key], self.load_chunk_size)
+        # State is written after the data, so a failure in between only means the next run re-upserts the same rows
+        save_row_hashes(self.conn, table, pd.DataFrame({"surrogate_key": keys[changed], "row_hash": row_hash[changed]}),
+                        [], chunk['load_timestamp'].iloc[0] if not chunk.empty else None)
+
+        chunk_max = chunk[watermark_column].max()
+        if pd.notna(chunk_max) and (tracker["max_watermark"] is None or chunk_max > tracker["max_watermark"]):
+            tracker["max_watermark"] = chunk_max
+        tracker["changed"] += int(changed.sum())
+        tracker["unchanged"] += int((~changed).sum())
+
+    def finish_incremental(self, tracker, table, db_schema, surrogate_key, checksum, loaded_at):
+        deleted_keys = [] if tracker["append_only"] else sorted(set(tracker["known"].index) - tracker["seen_keys"])
+        if deleted_keys:
+            delete_keys(self.conn, table, db_schema, surrogate_key, deleted_keys)
+            save_row_hashes(self.conn, table, pd.DataFrame(columns=["surrogate_key", "row_hash"]), deleted_keys, loaded_at)
+        save_load_state(self.conn, table, checksum, tracker["max_watermark"], loaded_at)
+        logger.info(f"Incremental load of {db_schema}.{table}: {tracker['changed']} new/changed rows upserted, "
+                    f"{len(deleted_keys)} deleted, {tracker['unchanged']} unchanged")
 
 class ProcessedLoader(BaseLoader):
     def run_pipeline(self):
@@ -100,90 +388,193 @@ class ProcessedLoader(BaseLoader):
         unique_keys = self.config.get("unique_keys", [])
         surrogate_key = self.config.get("surrogate_key")
         scd_type = self.config.get("scd_type")
+        row_hash_column = self.config.get("row_hash_column")
+        # chunk_rows streams the transform result through a server-side cursor instead of one DataFrame
+        chunk_rows = self.config.get("chunk_rows")
 
         with open(query_path, 'r') as f:
             query = f.read()
 
-        new_df = run_query(self.conn, query)
+        # Incremental processed loads only merge the stage keys touched since the last run (SCD2, database mode)
+        incremental = (self.config.get("load_mode", "full") == "incremental" and scd_type == 2
+                       and self.config.get("scd2_mode", "database") == "database")
+        deleted_keys = None
+        if incremental:
+            state = get_load_state(self.conn, table)
+            watermark = state["high_water_mark"] if state else None
+            delta = changed_keys_since(self.conn, watermark)
+            reloaded = full_reloads_since(self.conn, watermark)
+            new_watermark = pd.concat([delta["loaded_at"], reloaded["last_load_at"]]).max()
+            new_watermark = None if pd.isna(new_watermark) else new_watermark
+            if watermark is not None and delta.empty and reloaded.empty:
+                logger.info(f"No stage changes since {watermark}, nothing to load into {db_schema}.{table}")
+                return
+            if watermark is None or not reloaded.empty:
+                # No baseline yet, or a stage table was reloaded in full and left no row-level delta to read
+                if not reloaded.empty:
+                    logger.warning(f"Stage tables {sorted(reloaded['table_name'])} were reloaded in full since {watermark}, "
+                                   f"running a full SCD Type 2 load of {db_schema}.{table}")
+                new_df = run_query(self.conn, query)
+            else:
+                new_df, deleted_keys = self.read_delta(query, delta, watermark, new_watermark)
+        elif chunk_rows and not (scd_type == 2 and self.config.get("scd2_mode", "database") == "pandas"):
+            new_df = None
+        else:
+            new_df = run_query(self.conn, query)
+        frames = timed_iter([new_df] if new_df is not None else run_query_chunks(self.conn, query, chunk_rows))
 
         timestamp = datetime.now()
         high_end_date = pd.Timestamp("9999-12-31")
+        self.prepare_layout(table, db_schema)
 
         if scd_type == 1:
             # SCD Type 1 – Always overwrite with latest
-            new_df['update_timestamp'] = timestamp
-            new_df['effective_from'] = timestamp
-            new_df['effective_to'] = high_end_date
+            with unit_of_work(self.conn, self.synchronous_commit), load_window(self.conn, db_schema, table, self.layout, bulk=True):
+                truncate_table(self.conn, table, db_schema)
+                for new_df in frames:
+                    new_df['update_timestamp'] = timestamp
+                    new_df['effective_from'] = timestamp
+                    new_df['effective_to'] = high_end_date
 
-            new_df[surrogate_key] = new_df.apply(lambda row: self.generate_surrogate_key(row, unique_keys), axis=1)
+                    new_df[surrogate_key] = self.generate_surrogate_keys(new_df, unique_keys)
 
-            truncate_table(self.conn, table, db_schema)
-            insert_dataframe(self.conn, new_df, table, db_schema)
+                    self.insert(new_df, table, db_schema)
+                record_table_load(self.conn, table, timestamp, rewritten=True)
 
             logger.info(f"SCD Type 1 load completed for table {db_schema}.{table}")
 
+        elif scd_type == 2 and self.config.get("scd2_mode", "database") == "database":
+            # SCD Type 2 – Set-based merge inside Postgres, cost scales with the snapshot, not the history
+            first_load = not table_has_rows(self.conn, table, db_schema)
+
+            def snapshot_frames():
+                for new_df in frames:
+                    if row_hash_column:
+                        new_df[row_hash_column] = self.generate_row_hash(new_df, [col for col in new_df.columns if col not in unique_keys])
+                    if first_load:
+                        new_df[surrogate_key] = self.generate_surrogate_keys(new_df, unique_keys)
+                    yield new_df
+
+            with unit_of_work(self.conn, self.synchronous_commit), load_window(self.conn, db_schema, table, self.layout, bulk=False):
+                counts = scd2_merge(self.conn, snapshot_frames(), table, db_schema, unique_keys, surrogate_key, timestamp,
+                                    close_deleted=self.config.get("scd2_close_deleted", True) and deleted_keys is None,
+                                    hash_column=row_hash_column, deleted_keys=deleted_keys)
+                # The watermark only moves together with the merge it describes
+                if incremental:
+                    save_load_state(self.conn, table, high_water_mark=new_watermark, loaded_at=timestamp)
+                record_table_load(self.conn, table, timestamp, rewritten=False)
+            logger.info(f"SCD Type 2 load completed for {db_schema}.{table}: {counts['inserted']} inserted, "
+                        f"{counts['updated']} updated, {counts['closed']} closed, {counts['unchanged']} unchanged")
+
         elif scd_type == 2:
-            # SCD Type 2 – Track history of changes
-            # 1. Read current target table
-            target_query = f"SELECT * FROM project_analytics.{db_schema}.{table}"
-            existing_df = run_query(self.conn, target_query)
+            # SCD Type 2 (scd2_mode = "pandas") – Track history of changes in memory
+            # 1. Read the current slice of the target table, streamed when chunk_rows is set
+            target_query = f"SELECT * FROM project_analytics.{db_schema}.{table} WHERE effective_to = '9999-12-31'"
+            if chunk_rows:
+                existing_df = pd.concat(run_query_chunks(self.conn, target_query, chunk_rows), ignore_index=True)
+            else:
+                existing_df = run_query(self.conn, target_query)
 
-            if existing_df.empty:
+            count("rows_read", len(new_df))
+            if existing_df.empty and not table_has_rows(self.conn, table, db_schema):
                 # First run, treat all as new inserts
                 new_df['update_timestamp'] = timestamp
                 new_df['effective_from'] = timestamp
                 new_df['effective_to'] = high_end_date
-                new_df[surrogate_key] = new_df.apply(lambda row: self.generate_surrogate_key(row, unique_keys), axis=1)
+                new_df[surrogate_key] = self.generate_surrogate_keys(new_df, unique_keys)
 
-                insert_dataframe(self.conn, new_df, table, db_schema)
+                with unit_of_work(self.conn, self.synchronous_commit), load_window(self.conn, db_schema, table, self.layout, bulk=False):
+                    self.insert(new_df, table, db_schema)
+                    record_table_load(self.conn, table, timestamp, rewritten=False)
                 logger.info(f"First-time SCD Type 2 load completed for {db_schema}.{table}")
             else:
                 # Identify changed records
                 merge_keys = unique_keys.copy()
-                compare_columns = [col for col in new_df.columns if col not in merge_keys]
-
                 existing_df_latest = existing_df[existing_df['effective_to'] == high_end_date]
-
-                merged = pd.merge(new_df, existing_df_latest, on=merge_keys, how='left', suffixes=('', '_existing'))
-
-                def is_changed(row):
-                    for col in compare_columns:
-                        if row[col] != row.get(f"{col}_existing"):
-                            return True
-                    return False
-
-                merged['is_changed'] = merged.apply(is_changed, axis=1)
+                with timed("scd2_diff"):
+                    updates_df = scd2_changes(new_df, existing_df_latest, merge_keys, self.key_hash_mode)
 
                 # Separate records
-                updates_df = merged[merged['is_changed']]
                 inserts_df = updates_df[new_df.columns]  # New version of updated records
 
-                if not updates_df.empty:
-                    # 1. Update effective_to of old records
-                    old_keys = updates_df[merge_keys]
-                    conditions = " AND ".join([f"{k} = %s" for k in merge_keys])
-                    update_sql = f"""
-                        UPDATE project_analytics.{db_schema}.{table}
-                        SET effective_to = %s
-                        WHERE effective_to = %s AND {conditions}
-                    """
-                    cursor = self.conn.cursor()
-                    for _, row in old_keys.iterrows():
-                        cursor.execute(update_sql, (timestamp, high_end_date, *[row[k] for k in merge_keys]))
-                    self.conn.commit()
-                    cursor.close()
-
-                    logger.info(f"Updated {len(updates_df)} existing records in SCD Type 2")
-                # 2. Insert new/changed rows
-                if not inserts_df.empty:
-                    inserts_df['update_timestamp'] = timestamp
-                    inserts_df['effective_from'] = timestamp
-                    inserts_df['effective_to'] = high_end_date
-                    # inserts_df[surrogate_key] = inserts_df.apply(lambda row: self.generate_surrogate_key(row, unique_keys), axis=1)
-                    inserts_df[surrogate_key] = [str(uuid.uuid4()) for _ in range(len(inserts_df))]
-
-                    insert_dataframe(self.conn, inserts_df, table, db_schema)
-                    logger.info(f"Inserted {len(inserts_df)} new/changed records into {db_schema}.{table} as part of SCD Type 2")
+                # Closing the old versions and inserting the new ones commit together
+                with unit_of_work(self.conn, self.synchronous_commit), load_window(self.conn, db_schema, table, self.layout, bulk=False):
+                    # 1. Close the current versions of changed keys in one set-based UPDATE
+                    changed_keys = updates_df.loc[updates_df['_merge'] == 'both', merge_keys]
+                    closed = scd2_close(self.conn, changed_keys, table, db_schema, merge_keys, timestamp)
+                    if closed:
+                        logger.info(f"Updated {closed} existing records in SCD Type 2")
+                    # 2. Insert new/changed rows
+                    if not inserts_df.empty:
+                        inserts_df['update_timestamp'] = timestamp
+                        inserts_df['effective_from'] = timestamp
+                        inserts_df['effective_to'] = high_end_date
+                        # Hashed with effective_from, so every version of a key gets its own reproducible key
+                        inserts_df[surrogate_key] = self.generate_surrogate_keys(inserts_df, unique_keys + ['effective_from'])
+
+                        self.insert(inserts_df, table, db_schema)
+                        logger.info(f"Inserted {len(inserts_df)} new/changed records into {db_schema}.{table} as part of SCD Type 2")
+                    record_table_load(self.conn, table, timestamp, rewritten=False)
 
         else:
-            raise ValueError("Unsupported SCD type. Expected 1 or 2.")
\ No newline at end of file
+            raise ValueError("Unsupported SCD type. Expected 1 or 2.")
+
+    def read_delta(self, query, delta, watermark, new_watermark):
+        """
+        Run the transform restricted to the stage keys upserted in (watermark, new_watermark]
+        and return it with the deleted keys, renamed to the processed unique keys.
+        delta_key_columns maps the state store columns onto the transform output; by default
+        the stage table name is the ott_platform and its surrogate key the stage_layer_sk.
+        """
+        key_columns = self.config.get("delta_key_columns", {"table_name": "ott_platform", "surrogate_key": "stage_layer_sk"})
+        delta_query = f"""
+            SELECT * FROM ({query.strip().rstrip(';')}) q
+            WHERE (q.{key_columns['table_name']}, q.{key_columns['surrogate_key']}::text) IN (
+                SELECT table_name, surrogate_key::text FROM project_analytics.stage.etl_row_state
+                WHERE loaded_at > %(watermark)s AND loaded_at <= %(new_watermark)s AND NOT is_deleted
+            )
+        """
+        new_df = run_query(self.conn, delta_query, params={"watermark": watermark, "new_watermark": new_watermark})
+        deleted_keys = delta.loc[delta["is_deleted"], ["table_name", "surrogate_key"]].rename(columns=key_columns)
+        logger.info(f"Delta since {watermark}: {len(new_df)} changed rows, {len(deleted_keys)} deleted keys")
+        return new_df, deleted_keys
+
+class ConsumptionLoader(BaseLoader):
+    def run_pipeline(self):
+        """
+        Keep the KPI summary in step with the processed fact table. refresh_mode "incremental"
+        applies only the SCD2 versions added since the last refresh; the first run, refresh_mode
+        "full", or a fact load since then that rewrote the table (SCD Type 1) rebuild it in full.
+        The refresh is tracked against the fact table's loads row (record_table_load), which only
+        moves when a load commits, not against the newest effective_from it can see.
+        """
+        source_schema = self.config.get("source_db_schema", "processed")
+        source_table = self.config.get("source_table", "fact_ott")
+        db_schema = self.config.get("target_db_schema", "consumption")
+        table = self.config.get("target_table")
+        distinct_table = self.config.get("distinct_table")
+
+        loads = get_table_loads(self.conn, source_table)
+        if loads is None:
+            # Loaded before its loads were recorded: rebuild, and stay on full rebuilds until the next fact load
+            logger.info(f"No recorded loads of {source_schema}.{source_table}, rebuilding {db_schema}.{table} in full")
+            with unit_of_work(self.conn, self.synchronous_commit):
+                rebuild_kpi_summary(self.conn, source_schema, source_table, db_schema, table, distinct_table)
+            return
+        new_watermark = loads["last_load_at"]
+
+        state = get_load_state(self.conn, table) if self.config.get("refresh_mode", "incremental") == "incremental" else None
+        watermark = state["high_water_mark"] if state else None
+        watermark = None if pd.isna(watermark) else watermark
+        if watermark is not None and new_watermark <= watermark:
+            logger.info(f"No loads of {source_schema}.{source_table} since {watermark}, {db_schema}.{table} is current")
+            return
+        if watermark is not None and loads["high_water_mark"] > watermark:
+            logger.info(f"{source_schema}.{source_table} was rewritten at {loads['high_water_mark']}, rebuilding {db_schema}.{table} in full")
+            watermark = None
+        with unit_of_work(self.conn, self.synchronous_commit):
+            if watermark is None:
+                rebuild_kpi_summary(self.conn, source_schema, source_table, db_schema, table, distinct_table)
+            else:
+                refresh_kpi_summary(self.conn, source_schema, source_table, db_schema, table, distinct_table, watermark, new_watermark)
+            save_load_state(self.conn, table, high_water_mark=new_watermark)
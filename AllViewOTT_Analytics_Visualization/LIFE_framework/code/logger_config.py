@@ -1,26 +1,59 @@
+import contextvars
+import json
 import logging
 import os
 from datetime import datetime
-import sys
 
-def get_logger():
-    job_name = sys.argv[1]
-    LOG_DIR = "logs"
-    os.makedirs(LOG_DIR, exist_ok=True)
+LOGGER_NAME = "ETLLogger"
+LOG_DIR = "logs"
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - [%(job)s] %(message)s'
+
+# Job the current thread / task is running, so concurrent orchestrator jobs stay attributable in a shared log
+current_job = contextvars.ContextVar("etl_job", default="pipeline")
+
+class JobFilter(logging.Filter):
+    def filter(self, record):
+        record.job = current_job.get()
+        return True
 
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; structured fields passed as extra={"metrics": {...}} are merged in."""
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "job": getattr(record, "job", current_job.get()),
+            "module": record.module,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "metrics", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(log_name="pipeline", log_format=None):
+    """
+    Attach the file and console handlers; called once by each entry point (etl_pipeline,
+    orchestrator). log_format is "text" or "json", defaulting to the ETL_LOG_FORMAT env var.
+    """
+    log_format = log_format or os.environ.get("ETL_LOG_FORMAT", "text")
+    os.makedirs(LOG_DIR, exist_ok=True)
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    log_file = os.path.join(LOG_DIR, f"etl_{job_name}_{timestamp}.log")
+    log_file = os.path.join(LOG_DIR, f"etl_{log_name}_{timestamp}.{'jsonl' if log_format == 'json' else 'log'}")
 
-    logger = logging.getLogger(f"ETLLogger_{job_name}")
-    if not logger.hasHandlers():
-        handler = logging.FileHandler(log_file)
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    formatter = JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT)
+    for handler in (logging.FileHandler(log_file), logging.StreamHandler()):
         handler.setFormatter(formatter)
+        handler.addFilter(JobFilter())
         logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
 
-        console = logging.StreamHandler()
-        console.setFormatter(formatter)
-        logger.addHandler(console)
-
-    return logger
\ No newline at end of file
+def get_logger():
+    # No side effects at import time: handlers are attached by configure_logging in the entry points
+    return logging.getLogger(LOGGER_NAME)
@@ -0,0 +1,119 @@
+import os
+import hashlib
+import pandas as pd
+from code.utils.state_utils import file_checksum
+from code.logger_config import get_logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for the stage cache and parquet sources
+    pa = ipc = pq = None
+
+logger = get_logger()
+
+CACHE_FORMATS = ("arrow", "parquet")
+SOURCE_KEY_METADATA = b"life_source_key"
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the stage cache and parquet sources. Install it with: pip install pyarrow")
+
+def read_parquet_chunks(file_path, chunk_rows=None):
+    """Yield a parquet file as DataFrames, record batch by record batch when chunk_rows is set."""
+    require_pyarrow()
+    parquet_file = pq.ParquetFile(file_path, memory_map=True)
+    if not chunk_rows:
+        yield parquet_file.read().to_pandas()
+        return
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+class StageCache:
+    """
+    Typed columnar snapshot of a cleaned stage DataFrame, keyed on the checksums of the source
+    file and its schema so that re-runs over unchanged inputs skip parsing and cleaning.
+
+    format "arrow" writes an uncompressed Arrow IPC file that is read back without decoding
+    (still converted to pandas, one chunk at a time with chunk_rows);
+    format "parquet" writes a compressed Parquet file, smaller on disk but decoded on read.
+    """
+    def __init__(self, cache_dir, name, fmt="arrow", compression="zstd"):
+        require_pyarrow()
+        if fmt not in CACHE_FORMATS:
+            raise ValueError(f"Unsupported stage cache format: {fmt}. Expected one of {CACHE_FORMATS}.")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.fmt = fmt
+        self.compression = compression
+        self.path = os.path.join(cache_dir, f"{name}.{fmt}")
+
+    @staticmethod
+    def source_key(*paths, extra=""):
+        """Cache key from the checksums of the given files plus any settings that shape the cached frame."""
+        return hashlib.sha256(("".join(file_checksum(path) for path in paths) + extra).encode()).hexdigest()
+
+    def _stored_key(self):
+        if not os.path.exists(self.path):
+            return None
+        if self.fmt == "arrow":
+            with pa.memory_map(self.path) as source:
+                metadata = ipc.open_file(source).schema.metadata or {}
+        else:
+            metadata = pq.read_schema(self.path).metadata or {}
+        return metadata.get(SOURCE_KEY_METADATA, b"").decode() or None
+
+    def read(self, key, chunk_rows=None):
+        """Return an iterator of cached DataFrames for key, or None if the cache is missing or stale."""
+        if self._stored_key() != key:
+            return None
+        logger.info(f"Stage cache hit: {self.path}")
+        if self.fmt == "parquet":
+            return read_parquet_chunks(self.path, chunk_rows)
+        return self._read_arrow(chunk_rows)
+
+    def _read_arrow(self, chunk_rows):
+        with pa.memory_map(self.path) as source:
+            reader = ipc.open_file(source)
+            if not chunk_rows:
+                yield reader.read_all().to_pandas()
+                return
+            # Record batch by record batch, so only the chunk being converted is held in pandas
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                for start in range(0, batch.num_rows, chunk_rows):
+                    yield batch.slice(start, chunk_rows).to_pandas()
+
+    def writer(self, key):
+        return StageCacheWriter(self, key)
+
+class StageCacheWriter:
+    """Appends cleaned chunks to a temp file and only replaces the cache on commit()."""
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.tmp_path = f"{cache.path}.tmp"
+        self._writer = None
+        self._schema = None
+
+    def write(self, df):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema.with_metadata({SOURCE_KEY_METADATA: self.key.encode()})
+            if self.cache.fmt == "arrow":
+                self._writer = ipc.new_file(self.tmp_path, self._schema)
+            else:
+                self._writer = pq.ParquetWriter(self.tmp_path, self._schema, compression=self.cache.compression)
+        self._writer.write_table(table.cast(self._schema))
+
+    def commit(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        os.replace(self.tmp_path, self.cache.path)
+        logger.info(f"Stage cache written: {self.cache.path}")
+
+    def discard(self):
+        if self._writer is not None:
+            self._writer.close()
+            os.remove(self.tmp_path)
@@ -1,61 +1,427 @@
+import io
+import re
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 import psycopg2
 import pandas as pd
 from psycopg2 import sql
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 from code.logger_config import get_logger
+from code.utils.metrics_utils import count, observe, timed
 
 logger = get_logger()
 
+DEFAULT_CHUNK_SIZE = 50000
+COPY_NULL = "\\N"
+DEFAULT_POOL_SIZE = 4
+# Seconds a job waits for a pooled connection before failing instead of hanging its worker
+DEFAULT_POOL_TIMEOUT = 600
+SYNCHRONOUS_COMMIT_LEVELS = ("on", "off", "local", "remote_write", "remote_apply")
+NAME_LIMIT = 63
+# pg_get_indexdef: CREATE [UNIQUE] INDEX <name> ON [ONLY] <table> USING ...
+INDEX_DEF = re.compile(r"^(CREATE (?:UNIQUE )?INDEX )(\S+)( ON (?:ONLY )?)(\S+)( USING .*)$", re.S)
+
+# Connection of the unit_of_work open in this thread/context; helpers leave commit and rollback to it
+_unit_conn = ContextVar("unit_conn", default=None)
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _connect_args(config):
+    return {
+        "dbname": config["dbname"].strip(),
+        "user": config["user"].strip(),
+        "password": config["password"].strip(),
+        "host": config["host"].strip(),
+        "port": config["port"],
+    }
+
 def connect_postgres(config):
-    return psycopg2.connect(
-        dbname=config["dbname"].strip(),
-        user=config["user"].strip(),
-        password=config["password"].strip(),
-        host=config["host"].strip(),
-        port=config["port"]
-    )
+    return psycopg2.connect(**_connect_args(config))
+
+class ConnectionPool:
+    """
+    ThreadedConnectionPool that waits for a free connection instead of raising once all
+    pool_size connections are handed out, so orchestrator workers can share one pool.
+    The wait is bounded by timeout seconds, after which getconn raises PoolError.
+    """
+    def __init__(self, config, size, timeout=DEFAULT_POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.pool = ThreadedConnectionPool(0, size, **_connect_args(config))
+        self.slots = threading.BoundedSemaphore(size)
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        if not self.slots.acquire(timeout=timeout):
+            raise PoolError(f"No free connection in the pool of {self.size} after {timeout}s")
+        try:
+            return self.pool.getconn()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn):
+        """Return a connection; whatever it left uncommitted is rolled back, a broken one is discarded."""
+        try:
+            if not conn.closed:
+                conn.rollback()
+        except psycopg2.Error as e:
+            logger.warning(f"Discarding pooled connection that failed to reset: {e}")
+            conn.close()
+        finally:
+            self.pool.putconn(conn, close=bool(conn.closed))
+            self.slots.release()
+
+    def closeall(self):
+        self.pool.closeall()
 
-def run_query(conn, query):
+def get_pool(config):
+    """
+    The process-wide pool of config's database, created on first use with database.pool_size
+    connections and database.pool_timeout seconds of waiting for one.
+    """
+    key = (config["host"].strip(), config["port"], config["dbname"].strip(), config["user"].strip())
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(config, config.get("pool_size", DEFAULT_POOL_SIZE),
+                                         config.get("pool_timeout", DEFAULT_POOL_TIMEOUT))
+        return _pools[key]
+
+@contextmanager
+def pooled_connection(config):
+    pool = get_pool(config)
+    conn = pool.getconn()
     try:
-        return pd.read_sql_query(query, conn)
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+def close_pools():
+    """Close every pooled connection; call once when the process is done with the database."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
+
+def in_unit_of_work(conn):
+    return _unit_conn.get() is conn
+
+def commit(conn):
+    """Commit conn, unless it is inside a unit_of_work, which then commits everything at its end."""
+    if not in_unit_of_work(conn):
+        conn.commit()
+
+def rollback(conn):
+    """Roll conn back, unless it is inside a unit_of_work, which rolls back as the error leaves it."""
+    if not in_unit_of_work(conn):
+        conn.rollback()
+
+def _synchronous_commit(value):
+    if isinstance(value, bool):
+        return "on" if value else "off"
+    value = str(value).strip().lower()
+    if value not in SYNCHRONOUS_COMMIT_LEVELS:
+        raise ValueError(f"Unsupported synchronous_commit {value}. Expected one of {SYNCHRONOUS_COMMIT_LEVELS}.")
+    return value
+
+@contextmanager
+def unit_of_work(conn, synchronous_commit=None):
+    """
+    Run every db_utils (and scd/kpi/state) helper called on conn inside the block as one
+    transaction: they skip their own commits, the block commits once at the end and rolls
+    everything back on error. A TRUNCATE inside it is only visible to readers after the commit.
+    synchronous_commit (e.g. "off" for bulk jobs that can be re-run) applies to this
+    transaction only. Nested units on the same connection join the outer one.
+    """
+    if in_unit_of_work(conn):
+        yield conn
+        return
+    level = _synchronous_commit(synchronous_commit) if synchronous_commit is not None else None
+    token = _unit_conn.set(conn)
+    try:
+        if level is not None:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT set_config('synchronous_commit', %s, true)", (level,))
+        yield conn
+        with timed("commit"):
+            conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _unit_conn.reset(token)
+
+def run_query(conn, query, params=None):
+    try:
+        with timed("read"):
+            return pd.read_sql_query(query, conn, params=params)
     except Exception as e:
         logger.error(f"Failed to execute query: {e}")
         raise
 
-def truncate_table(conn, table, schema):
-    """Truncate the specified table before loading new data."""
-    try:
-        cursor = conn.cursor()
-        truncate_query = sql.SQL("TRUNCATE TABLE {}.{}").format(
-            sql.Identifier(schema),
-            sql.Identifier(table)
-        )
-        cursor.execute(truncate_query)
-        conn.commit()
+def run_query_chunks(conn, query, itersize=DEFAULT_CHUNK_SIZE, params=None):
+    """
+    Stream a query through a named (server-side) cursor and yield DataFrames of at most
+    itersize rows, so the full result never has to fit in memory. Always yields at least
+    one, possibly empty, DataFrame carrying the result columns.
+    The cursor is WITH HOLD so it survives commits made while the chunks are consumed
+    (e.g. insert_dataframe committing each loaded chunk outside a unit_of_work).
+    """
+    cursor = conn.cursor(name=f"life_stream_{uuid.uuid4().hex[:12]}", withhold=True)
+    cursor.itersize = itersize
+    try:
+        cursor.execute(query, params)
+        yielded = False
+        while True:
+            rows = cursor.fetchmany(itersize)
+            if not rows and yielded:
+                break
+            columns = [desc[0] for desc in cursor.description]
+            yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+            yielded = True
+            if len(rows) < itersize:
+                break
+    except Exception as e:
+        logger.error(f"Failed to execute query: {e}")
+        raise
+    finally:
         cursor.close()
+
+def truncate_table(conn, table, schema):
+    """Truncate the specified table before loading new data; inside a unit_of_work the empty table is never visible."""
+    try:
+        with conn.cursor() as cursor:
+            truncate_query = sql.SQL("TRUNCATE TABLE {}.{}").format(
+                sql.Identifier(schema),
+                sql.Identifier(table)
+            )
+            cursor.execute(truncate_query)
+        commit(conn)
         logger.info(f"Successfully truncated table {schema}.{table}")
     except Exception as e:
         logger.error(f"Failed to truncate table {schema}.{table}: {e}")
+        rollback(conn)
         raise
 
-def insert_dataframe(conn, df, table, schema):
+def swap_table_name(table):
+    return f"{table}_swap"
+
+def create_swap_table(conn, table, schema):
+    """
+    Create an empty, unindexed copy of schema.table (columns, defaults and checks) to load into
+    while readers keep using the table; swap_in() indexes and replaces the table with it. Both
+    must run in the same unit_of_work. Not for partitioned tables, LIKE does not copy partitioning.
+    """
+    if not in_unit_of_work(conn):
+        raise RuntimeError(f"Swap loads of {schema}.{table} must run inside a unit_of_work")
+    swap = swap_table_name(table)
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}.{}").format(sql.Identifier(schema), sql.Identifier(swap)))
+        cursor.execute(sql.SQL("CREATE TABLE {}.{} (LIKE {}.{} INCLUDING ALL EXCLUDING INDEXES)").format(
+            sql.Identifier(schema), sql.Identifier(swap), sql.Identifier(schema), sql.Identifier(table)
+        ))
+    logger.info(f"Loading {schema}.{table} through swap table {schema}.{swap}")
+    return swap
+
+def swap_index_ddl(indexdef, index_name, table_name):
+    """pg_get_indexdef output rewritten to create the same index as index_name on table_name (both quoted SQL)."""
+    match = INDEX_DEF.match(indexdef)
+    if not match:
+        raise ValueError(f"Unrecognised index definition: {indexdef}")
+    return f"{match.group(1)}{index_name}{match.group(3)}{table_name}{match.group(5)}"
+
+def swap_in(conn, swap, table, schema):
+    """
+    Build schema.table's indexes and primary key / unique constraints on the loaded swap table,
+    under temporary names, then drop schema.table, rename the swap table to its name and give
+    the indexes back their names. The live table is untouched until the DROP, so the exclusive
+    lock is only held from there to the commit; grants on the old table do not carry over.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname, pg_get_indexdef(i.indexrelid), con.conname, con.contype
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            LEFT JOIN pg_constraint con ON con.conindid = i.indexrelid AND con.conrelid = i.indrelid AND con.contype IN ('p', 'u')
+            WHERE i.indrelid = %s::regclass
+            ORDER BY c.relname
+        """, (sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(table)).as_string(conn),))
+        indexes = cursor.fetchall()
+        swap_sql = sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(swap))
+        renames = []
+        for name, indexdef, constraint, kind in indexes:
+            temp = f"{name[:NAME_LIMIT - 5]}_swap"
+            cursor.execute(swap_index_ddl(indexdef, sql.Identifier(temp).as_string(conn), swap_sql.as_string(conn)))
+            if constraint:
+                cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {} USING INDEX {}").format(
+                    swap_sql, sql.Identifier(temp), sql.SQL("PRIMARY KEY" if kind == "p" else "UNIQUE"), sql.Identifier(temp)
+                ))
+            renames.append((temp, constraint or name, bool(constraint)))
+
+        cursor.execute(sql.SQL("DROP TABLE {}.{}").format(sql.Identifier(schema), sql.Identifier(table)))
+        cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(swap_sql, sql.Identifier(table)))
+        for temp, name, is_constraint in renames:
+            if is_constraint:
+                # Renaming a key constraint renames its index too
+                cursor.execute(sql.SQL("ALTER TABLE {}.{} RENAME CONSTRAINT {} TO {}").format(
+                    sql.Identifier(schema), sql.Identifier(table), sql.Identifier(temp), sql.Identifier(name)
+                ))
+            else:
+                cursor.execute(sql.SQL("ALTER INDEX {}.{} RENAME TO {}").format(
+                    sql.Identifier(schema), sql.Identifier(temp), sql.Identifier(name)
+                ))
+    logger.info(f"Swapped {schema}.{swap} in as {schema}.{table} with {len(renames)} indexes")
+
+def prepare_frame(df):
+    """
+    Normalise a DataFrame for bulk loading: integral float columns (ints that picked up
+    NaN on the way through pandas) go back to nullable ints so Postgres INT columns accept them.
+    """
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_float_dtype(df[col]):
+            values = df[col].dropna()
+            if (values == values.round()).all():
+                df[col] = df[col].astype("Int64")
+    return df
+
+def _chunks(df, chunk_size):
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+def copy_dataframe(conn, df, table, schema, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream a DataFrame into Postgres with COPY FROM STDIN, one in-memory CSV buffer per chunk."""
+    copy_query = sql.SQL("COPY {}.{} ({}) FROM STDIN WITH (FORMAT csv, NULL {})").format(
+        sql.Identifier(schema),
+        sql.Identifier(table),
+        sql.SQL(', ').join(map(sql.Identifier, df.columns)),
+        sql.Literal(COPY_NULL)
+    )
+    with conn.cursor() as cursor:
+        for chunk in _chunks(df, chunk_size):
+            buffer = io.StringIO()
+            chunk.to_csv(buffer, index=False, header=False, na_rep=COPY_NULL)
+            buffer.seek(0)
+            cursor.copy_expert(copy_query, buffer)
+
+def values_dataframe(conn, df, table, schema, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Insert a DataFrame with batched multi-row INSERT ... VALUES statements."""
+    insert_query = sql.SQL("INSERT INTO {}.{} ({}) VALUES %s").format(
+        sql.Identifier(schema),
+        sql.Identifier(table),
+        sql.SQL(', ').join(map(sql.Identifier, df.columns))
+    )
+    # Object dtype so that NaN/NaT/pd.NA can be swapped for None before binding
+    records = df.astype(object).where(df.notna(), None)
+    with conn.cursor() as cursor:
+        for chunk in _chunks(records, chunk_size):
+            execute_values(cursor, insert_query.as_string(conn), chunk.itertuples(index=False, name=None), page_size=1000)
+
+def insert_dataframe(conn, df, table, schema, method="copy", chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Bulk load a DataFrame into schema.table.
+    method="copy" streams through COPY FROM STDIN and falls back to batched execute_values
+    when the server refuses COPY; method="values" goes straight to execute_values.
+    """
+    if method not in ("copy", "values"):
+        raise ValueError(f"Unsupported load method: {method}. Expected 'copy' or 'values'.")
+    if df.empty:
+        logger.info(f"No rows to insert into {schema}.{table}")
+        return
+
+    df = prepare_frame(df)
+    start = time.perf_counter()
     try:
-        cursor = conn.cursor()
-        for _, row in df.iterrows():
-            columns = list(row.index)
-            values = tuple(row)
-            insert_query = sql.SQL("INSERT INTO {}.{} ({}) VALUES ({})").format(
-                sql.Identifier(schema),
-                sql.Identifier(table),
-                sql.SQL(', ').join(map(sql.Identifier, columns)),
-                sql.SQL(', ').join(sql.Placeholder() * len(values))
-            )
-            cursor.execute(insert_query, values)
-        conn.commit()
-        cursor.close()
-        logger.info(f"Successfully inserted {len(df)} rows into {schema}.{table}")
+        if method == "copy":
+            # Inside a unit_of_work only the failed COPY is undone, not the work before it
+            savepoint = in_unit_of_work(conn)
+            if savepoint:
+                with conn.cursor() as cursor:
+                    cursor.execute("SAVEPOINT life_copy")
+            try:
+                copy_dataframe(conn, df, table, schema, chunk_size)
+            except (psycopg2.errors.InsufficientPrivilege, psycopg2.errors.FeatureNotSupported) as e:
+                logger.warning(f"COPY not allowed on {schema}.{table} ({e}), falling back to execute_values")
+                if savepoint:
+                    with conn.cursor() as cursor:
+                        cursor.execute("ROLLBACK TO SAVEPOINT life_copy")
+                else:
+                    conn.rollback()
+                method = "values"
+        if method == "values":
+            values_dataframe(conn, df, table, schema, chunk_size)
+        commit(conn)
     except Exception as e:
         logger.error(f"Failed to insert data into {schema}.{table}: {e}")
-        conn.rollback()
-        if cursor:
-            cursor.close()
-        raise
\ No newline at end of file
+        rollback(conn)
+        raise
+
+    elapsed = time.perf_counter() - start
+    observe("load", elapsed)
+    count("rows_written", len(df))
+    rows_per_sec = len(df) / elapsed if elapsed > 0 else float("inf")
+    logger.info(f"Successfully inserted {len(df)} rows into {schema}.{table} using {method} "
+                f"in {elapsed:.2f}s ({rows_per_sec:,.0f} rows/sec)")
+
+def upsert_dataframe(conn, df, table, schema, conflict_columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    INSERT ... ON CONFLICT DO UPDATE a DataFrame into schema.table: rows are copied into a
+    temp table first so the upsert itself is a single set-based statement.
+    """
+    if df.empty:
+        logger.info(f"No rows to upsert into {schema}.{table}")
+        return
+
+    df = prepare_frame(df)
+    columns = list(df.columns)
+    update_columns = [col for col in columns if col not in conflict_columns]
+    start = time.perf_counter()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("CREATE TEMP TABLE upsert_rows ON COMMIT DROP AS SELECT {} FROM {}.{} WITH NO DATA").format(
+                sql.SQL(', ').join(map(sql.Identifier, columns)), sql.Identifier(schema), sql.Identifier(table)
+            ))
+            copy_dataframe(conn, df, "upsert_rows", "pg_temp", chunk_size)
+            cursor.execute(sql.SQL("""
+                INSERT INTO {}.{} ({columns}) SELECT {columns} FROM upsert_rows
+                ON CONFLICT ({conflict}) DO UPDATE SET {updates}
+            """).format(
+                sql.Identifier(schema), sql.Identifier(table),
+                columns=sql.SQL(', ').join(map(sql.Identifier, columns)),
+                conflict=sql.SQL(', ').join(map(sql.Identifier, conflict_columns)),
+                updates=sql.SQL(', ').join(sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(col)) for col in update_columns)
+            ))
+            # Dropped here as well as on commit, a unit_of_work may upsert several times per transaction
+            cursor.execute("DROP TABLE upsert_rows")
+        commit(conn)
+    except Exception as e:
+        logger.error(f"Failed to upsert data into {schema}.{table}: {e}")
+        rollback(conn)
+        raise
+
+    elapsed = time.perf_counter() - start
+    observe("load", elapsed)
+    count("rows_written", len(df))
+    logger.info(f"Successfully upserted {len(df)} rows into {schema}.{table} in {elapsed:.2f}s "
+                f"({len(df) / elapsed if elapsed > 0 else float('inf'):,.0f} rows/sec)")
+
+def delete_keys(conn, table, schema, key_column, keys):
+    """Delete the rows of schema.table whose UUID key_column is in keys."""
+    if not keys:
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("DELETE FROM {}.{} WHERE {} = ANY(%s::uuid[])").format(
+                sql.Identifier(schema), sql.Identifier(table), sql.Identifier(key_column)
+            ), (list(keys),))
+        commit(conn)
+        count("rows_deleted", len(keys))
+        logger.info(f"Deleted {len(keys)} rows from {schema}.{table}")
+    except Exception as e:
+        logger.error(f"Failed to delete rows from {schema}.{table}: {e}")
+        rollback(conn)
+        raise
@@ -0,0 +1,146 @@
+import hashlib
+import uuid
+import numpy as np
+import pandas as pd
+
+HASH_MODES = ("md5", "fast")
+# Two independent 16-byte siphash keys give a 128-bit digest that still fits the UUID key columns
+FAST_HASH_KEYS = ("0123456789123456", "6543219876543210")
+ROW_SEPARATOR = "\x1f"
+ROW_NULL = "\x00"
+HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype="S1")
+
+def column_as_str(series):
+    """
+    Render a column the way str(value) does for the scalars that DataFrame.apply(axis=1)
+    hands out, so vectorized key strings match the row-wise ones byte for byte.
+    """
+    if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return series.astype(str)
+    # datetime/float/bool: astype(str) formats differently from str(scalar), so map per value
+    return series.map(str)
+
+def row_dtype(df):
+    """
+    The dtype of the rows DataFrame.apply(axis=1) hands out when every column is a plain int or
+    float column (e.g. float64 for int and float columns, so an int 1 reads "1.0"); None when
+    the rows are object and each value keeps its own type.
+    """
+    dtypes = list(df.dtypes)
+    if dtypes and all(isinstance(dtype, np.dtype) and dtype.kind in "iuf" for dtype in dtypes):
+        return np.result_type(*dtypes)
+    return None
+
+def build_key_strings(df, columns, separator="_", null_token=None):
+    """
+    Join the given columns into one string per row in a single column-wise pass.
+    With null_token=None null values are skipped (surrogate key semantics), otherwise
+    they are written as null_token so NULL and '' stay distinguishable (row hash semantics).
+    """
+    result = np.full(len(df), "", dtype=object)
+    has_value = np.zeros(len(df), dtype=bool)
+    common = row_dtype(df)
+    for col in columns:
+        notna = df[col].notna().to_numpy()
+        part = column_as_str(df[col] if common is None else df[col].astype(common)).to_numpy(dtype=object)
+        if null_token is not None:
+            # As an object array: numpy turns a bare "\x00" scalar into '' and NULL would match ''
+            part = np.where(notna, part, np.array([null_token], dtype=object))
+            notna = np.ones(len(df), dtype=bool)
+        joined = np.where(has_value, result + separator + part, part)
+        result = np.where(notna, joined, result)
+        has_value |= notna
+    return result
+
+def hash_strings(strings, mode="md5"):
+    """Hash an array of strings to 32-char hex digests, md5 (stable, default) or vectorized siphash ("fast")."""
+    if mode == "md5":
+        md5 = hashlib.md5
+        return np.array([md5(s.encode()).hexdigest() for s in strings], dtype=object)
+    if mode == "fast":
+        values = np.asarray(strings, dtype=object)
+        high = pd.util.hash_array(values, hash_key=FAST_HASH_KEYS[0], categorize=False)
+        low = pd.util.hash_array(values, hash_key=FAST_HASH_KEYS[1], categorize=False)
+        return _hex128(high, low)
+    raise ValueError(f"Unsupported hash mode: {mode}. Expected one of {HASH_MODES}.")
+
+def _hex128(high, low):
+    """Format two uint64 arrays as 32-char hex strings without a per-row Python loop."""
+    raw = np.stack([high, low], axis=1).astype(">u8").view(np.uint8)
+    digits = np.empty((len(raw), 32), dtype="S1")
+    digits[:, 0::2] = HEX_DIGITS[raw >> 4]
+    digits[:, 1::2] = HEX_DIGITS[raw & 0x0F]
+    return digits.view("S32").ravel().astype(str).astype(object)
+
+def _fast_frame_hash(df, columns):
+    """128-bit siphash of whole columns via hash_pandas_object, no key strings built at all."""
+    frame = df[columns]
+    high = pd.util.hash_pandas_object(frame, index=False, hash_key=FAST_HASH_KEYS[0], categorize=False).to_numpy()
+    low = pd.util.hash_pandas_object(frame, index=False, hash_key=FAST_HASH_KEYS[1], categorize=False).to_numpy()
+    return _hex128(high, low)
+
+def surrogate_keys(df, primary_keys, mode="md5"):
+    """
+    Column-wise surrogate keys. In md5 mode this is the hash of the non-null primary key
+    values joined by '_', identical to the row-wise generator; "fast" hashes the key
+    columns directly. Rows whose keys are all null get a random uuid4, as before.
+    Returns (Series of keys, number of uuid4 fallbacks).
+    """
+    if mode == "fast":
+        keys = _fast_frame_hash(df, primary_keys)
+        empty = df[primary_keys].isna().all(axis=1).to_numpy()
+    else:
+        key_strings = build_key_strings(df, primary_keys)
+        keys = hash_strings(key_strings, mode)
+        empty = key_strings == ""
+    fallbacks = int(empty.sum())
+    if fallbacks:
+        keys[empty] = [str(uuid.uuid4()) for _ in range(fallbacks)]
+    return pd.Series(keys, index=df.index), fallbacks
+
+def row_hashes(df, columns, mode="md5"):
+    """Full-row content hash over the given columns, suitable for change detection."""
+    if mode == "fast":
+        return pd.Series(_fast_frame_hash(df, columns), index=df.index)
+    key_strings = build_key_strings(df, columns, separator=ROW_SEPARATOR, null_token=ROW_NULL)
+    return pd.Series(hash_strings(key_strings, mode), index=df.index)
+
+def row_fingerprints(df):
+    """128-bit fingerprint of every full row, as Python ints (compact enough to keep one per distinct row)."""
+    high = pd.util.hash_pandas_object(df, index=False, hash_key=FAST_HASH_KEYS[0], categorize=False).to_numpy()
+    low = pd.util.hash_pandas_object(df, index=False, hash_key=FAST_HASH_KEYS[1], categorize=False).to_numpy()
+    return [h << 64 | l for h, l in zip(high.tolist(), low.tolist())]
+
+class RowDeduplicator:
+    """
+    Cross-chunk equivalent of DataFrame.drop_duplicates(): keeps the first occurrence of every
+    full row across all chunks seen so far, remembering only its 128-bit fingerprint. Memory
+    stays at about 16 bytes per distinct row, at the price of dropping a row whose fingerprint
+    collides with an earlier one (chance about n**2 / 2**129 for n distinct rows, under 1e-18
+    at a billion). exact=True also keeps every distinct row's values to confirm each hit, so
+    colliding rows are both kept, but memory then grows with the source.
+    """
+    def __init__(self, exact=False):
+        self.exact = exact
+        self.seen = {} if exact else set()
+
+    @staticmethod
+    def _row_values(df):
+        # None for every kind of null, so NaN compares equal to NaN like in drop_duplicates
+        return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+    def filter(self, df):
+        df = df.drop_duplicates()
+        seen = self.seen
+        keep = []
+        if not self.exact:
+            for fingerprint in row_fingerprints(df):
+                keep.append(fingerprint not in seen)
+                seen.add(fingerprint)
+        else:
+            for fingerprint, row in zip(row_fingerprints(df), self._row_values(df)):
+                rows = seen.setdefault(fingerprint, [])
+                keep.append(row not in rows)
+                if keep[-1]:
+                    rows.append(row)
+        return df[np.array(keep, dtype=bool)]
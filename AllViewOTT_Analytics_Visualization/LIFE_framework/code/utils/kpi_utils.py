@@ -0,0 +1,158 @@
+import time
+from psycopg2 import sql
+from code.utils.db_utils import commit, rollback
+from code.logger_config import get_logger
+from code.utils.metrics_utils import observe
+
+logger = get_logger()
+
+GROUP_COLUMNS = ["ott_platform", "content_added_month", "release_year"]
+DISTINCT_ATTRIBUTES = {"director": "unique_directors", "country": "unique_countries"}
+
+# Like the mv_ott_kpi_summary it replaces, the summary aggregates every fact_ott row, closed SCD2
+# versions included. An SCD2 load only ever adds versions (closing one keeps its row), so the delta
+# of (watermark, new_watermark] is the versions opened in it, each counted once (sign +1). The
+# watermarks are recorded fact load timestamps, which every version opened by that load carries
+# as its effective_from; loads that rewrite the table (SCD Type 1) need a full rebuild instead.
+DELTA_QUERY = """
+CREATE TEMP TABLE kpi_delta ON COMMIT DROP AS
+SELECT ott_platform, date_trunc('month', date_added) AS content_added_month, release_year,
+       type, duration_min, num_seasons, director, country, 1 AS sign
+FROM {fact}
+WHERE effective_from > %(watermark)s AND effective_from <= %(new_watermark)s
+"""
+
+SUMMARY_DELTA = """
+INSERT INTO {summary} AS s (ott_platform, content_added_month, release_year, total_titles, total_movies, total_tv_shows,
+                            movie_duration_sum, movie_duration_count, tvshow_seasons_sum, tvshow_seasons_count)
+SELECT ott_platform, content_added_month, release_year,
+       SUM(sign),
+       COALESCE(SUM(sign) FILTER (WHERE type = 'Movie'), 0),
+       COALESCE(SUM(sign) FILTER (WHERE type = 'TV Show'), 0),
+       COALESCE(SUM(sign * duration_min) FILTER (WHERE type = 'Movie'), 0),
+       COALESCE(SUM(sign) FILTER (WHERE type = 'Movie' AND duration_min IS NOT NULL), 0),
+       COALESCE(SUM(sign * num_seasons) FILTER (WHERE type = 'TV Show'), 0),
+       COALESCE(SUM(sign) FILTER (WHERE type = 'TV Show' AND num_seasons IS NOT NULL), 0)
+FROM kpi_delta
+GROUP BY ott_platform, content_added_month, release_year
+ON CONFLICT (ott_platform, content_added_month, release_year) DO UPDATE SET
+    total_titles = s.total_titles + EXCLUDED.total_titles,
+    total_movies = s.total_movies + EXCLUDED.total_movies,
+    total_tv_shows = s.total_tv_shows + EXCLUDED.total_tv_shows,
+    movie_duration_sum = s.movie_duration_sum + EXCLUDED.movie_duration_sum,
+    movie_duration_count = s.movie_duration_count + EXCLUDED.movie_duration_count,
+    tvshow_seasons_sum = s.tvshow_seasons_sum + EXCLUDED.tvshow_seasons_sum,
+    tvshow_seasons_count = s.tvshow_seasons_count + EXCLUDED.tvshow_seasons_count
+"""
+
+DISTINCT_DELTA = """
+INSERT INTO {distinct} AS d (ott_platform, content_added_month, release_year, attribute, value, row_count)
+SELECT ott_platform, content_added_month, release_year, %(attribute)s, {column}, SUM(sign)
+FROM kpi_delta
+WHERE {column} IS NOT NULL
+GROUP BY ott_platform, content_added_month, release_year, {column}
+ON CONFLICT (ott_platform, content_added_month, release_year, attribute, value) DO UPDATE SET
+    row_count = d.row_count + EXCLUDED.row_count
+"""
+
+# Re-derive the distinct counts of the touched groups from their (small) distinct sets
+DISTINCT_COUNTS = """
+UPDATE {summary} s SET {count_column} = (
+    SELECT COUNT(*) FROM {distinct} d
+    WHERE d.attribute = %(attribute)s AND d.ott_platform = s.ott_platform
+      AND d.content_added_month IS NOT DISTINCT FROM s.content_added_month
+      AND d.release_year IS NOT DISTINCT FROM s.release_year
+)
+WHERE EXISTS (
+    SELECT 1 FROM kpi_delta k
+    WHERE k.ott_platform = s.ott_platform
+      AND k.content_added_month IS NOT DISTINCT FROM s.content_added_month
+      AND k.release_year IS NOT DISTINCT FROM s.release_year
+)
+"""
+
+FULL_DISTINCT = """
+INSERT INTO {distinct} (ott_platform, content_added_month, release_year, attribute, value, row_count)
+SELECT ott_platform, date_trunc('month', date_added), release_year, %(attribute)s, {column}, COUNT(*)
+FROM {fact}
+WHERE {column} IS NOT NULL
+GROUP BY 1, 2, 3, {column}
+"""
+
+FULL_SUMMARY = """
+INSERT INTO {summary} (ott_platform, content_added_month, release_year, total_titles, total_movies, total_tv_shows,
+                       movie_duration_sum, movie_duration_count, tvshow_seasons_sum, tvshow_seasons_count,
+                       unique_directors, unique_countries)
+SELECT ott_platform, date_trunc('month', date_added), release_year,
+       COUNT(*),
+       COUNT(*) FILTER (WHERE type = 'Movie'),
+       COUNT(*) FILTER (WHERE type = 'TV Show'),
+       COALESCE(SUM(duration_min) FILTER (WHERE type = 'Movie'), 0),
+       COUNT(duration_min) FILTER (WHERE type = 'Movie'),
+       COALESCE(SUM(num_seasons) FILTER (WHERE type = 'TV Show'), 0),
+       COUNT(num_seasons) FILTER (WHERE type = 'TV Show'),
+       COUNT(DISTINCT director),
+       COUNT(DISTINCT country)
+FROM {fact}
+GROUP BY 1, 2, 3
+"""
+
+def _identifiers(fact_schema, fact_table, schema, summary_table, distinct_table):
+    return {
+        "fact": sql.SQL("{}.{}").format(sql.Identifier(fact_schema), sql.Identifier(fact_table)),
+        "summary": sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(summary_table)),
+        "distinct": sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(distinct_table)),
+    }
+
+def rebuild_kpi_summary(conn, fact_schema, fact_table, schema, summary_table, distinct_table):
+    """
+    Full rebuild from every row of the fact table. DELETE + INSERT in one transaction
+    instead of TRUNCATE, so dashboard readers keep seeing the previous summary (MVCC) and are
+    never blocked, like REFRESH MATERIALIZED VIEW CONCURRENTLY.
+    """
+    start = time.perf_counter()
+    names = _identifiers(fact_schema, fact_table, schema, summary_table, distinct_table)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("DELETE FROM {distinct}").format(**names))
+            cursor.execute(sql.SQL("DELETE FROM {summary}").format(**names))
+            for column in DISTINCT_ATTRIBUTES:
+                cursor.execute(sql.SQL(FULL_DISTINCT).format(column=sql.Identifier(column), **names), {"attribute": column})
+            cursor.execute(sql.SQL(FULL_SUMMARY).format(**names))
+            groups = cursor.rowcount
+        commit(conn)
+    except Exception as e:
+        logger.error(f"Full rebuild of {schema}.{summary_table} failed: {e}")
+        rollback(conn)
+        raise
+    observe("kpi_refresh", time.perf_counter() - start)
+    logger.info(f"Rebuilt {schema}.{summary_table} with {groups} groups in {time.perf_counter() - start:.2f}s")
+
+def refresh_kpi_summary(conn, fact_schema, fact_table, schema, summary_table, distinct_table, watermark, new_watermark):
+    """
+    Apply the fact versions added in (watermark, new_watermark] to the summary: only the
+    (ott_platform, content_added_month, release_year) groups they touch are updated, additive
+    measures by their delta and distinct counts through the per-group sets.
+    Returns the number of touched groups.
+    """
+    start = time.perf_counter()
+    names = _identifiers(fact_schema, fact_table, schema, summary_table, distinct_table)
+    params = {"watermark": watermark, "new_watermark": new_watermark}
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL(DELTA_QUERY).format(**names), params)
+            cursor.execute(sql.SQL(SUMMARY_DELTA).format(**names))
+            groups = cursor.rowcount
+            for column, count_column in DISTINCT_ATTRIBUTES.items():
+                cursor.execute(sql.SQL(DISTINCT_DELTA).format(column=sql.Identifier(column), **names), {"attribute": column})
+                cursor.execute(sql.SQL(DISTINCT_COUNTS).format(count_column=sql.Identifier(count_column), **names), {"attribute": column})
+            cursor.execute(sql.SQL("DELETE FROM {distinct} WHERE row_count <= 0").format(**names))
+            cursor.execute(sql.SQL("DELETE FROM {summary} WHERE total_titles <= 0").format(**names))
+        commit(conn)
+    except Exception as e:
+        logger.error(f"Incremental refresh of {schema}.{summary_table} failed: {e}")
+        rollback(conn)
+        raise
+    observe("kpi_refresh", time.perf_counter() - start)
+    logger.info(f"Refreshed {groups} groups of {schema}.{summary_table} in {time.perf_counter() - start:.2f}s")
+    return groups
@@ -0,0 +1,226 @@
+import re
+from contextlib import contextmanager
+from code.utils.db_utils import commit, rollback, in_unit_of_work
+from code.logger_config import get_logger
+
+logger = get_logger()
+
+PARTITION_STRATEGIES = ("list",)
+NAME_LIMIT = 63
+
+# Layout is read from the "layout" block of a job config, e.g.
+#   "layout": {
+#     "partitions": [
+#       {"column": "ott_platform", "values": ["hulu", "netflix"], "default": "other"},
+#       {"column": "effective_to", "values": {"current": "9999-12-31"}, "default": "history"}
+#     ],
+#     "primary_key": ["fact_ott_sk", "ott_platform", "effective_to"],
+#     "indexes": [{"name": "fact_ott_current_keys", "columns": ["stage_layer_sk", "ott_platform"],
+#                  "where": "effective_to = '9999-12-31'"}],
+#     "drop_indexes_for_bulk_load": true,
+#     "analyze_after_load": true,
+#     "dry_run": false
+#   }
+# DDL is built as plain text (identifiers and literals quoted here) so a dry run can print it without a server.
+
+def ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def qualified(schema, table):
+    return f"{ident(schema)}.{ident(table)}"
+
+def partition_name(parent, name):
+    name = f"{parent}_{re.sub(r'[^0-9A-Za-z_]+', '_', str(name)).strip('_').lower()}"
+    if len(name) > NAME_LIMIT:
+        raise ValueError(f"Partition name {name} is longer than Postgres' {NAME_LIMIT} characters")
+    return name
+
+def partition_values(level):
+    """[(partition name suffix, value), ...] of a partition level; a list of values names each partition after its value."""
+    values = level.get("values", [])
+    return list(values.items()) if isinstance(values, dict) else [(value, value) for value in values]
+
+def _check_levels(levels):
+    for level in levels:
+        strategy = level.get("strategy", "list")
+        if strategy not in PARTITION_STRATEGIES:
+            raise ValueError(f"Unsupported partition strategy {strategy}. Expected one of {PARTITION_STRATEGIES}.")
+        if "column" not in level:
+            raise ValueError(f"Partition level {level} has no column")
+
+def read_table_state(conn, schema, table):
+    """
+    What is physically there: whether the table exists, its partition key column, every
+    partition below it (at any depth) and the names of its indexes.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", (qualified(schema, table),))
+        if cursor.fetchone()[0] is None:
+            return {"exists": False, "partition_key": None, "partitions": set(), "indexes": set()}
+        cursor.execute("""
+            SELECT a.attname FROM pg_partitioned_table p
+            JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+            WHERE p.partrelid = to_regclass(%s)
+        """, (qualified(schema, table),))
+        row = cursor.fetchone()
+        cursor.execute("""
+            WITH RECURSIVE tree AS (
+                SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s)
+                UNION ALL
+                SELECT i.inhrelid FROM pg_inherits i JOIN tree t ON i.inhparent = t.inhrelid
+            )
+            SELECT c.relname FROM tree JOIN pg_class c ON c.oid = tree.inhrelid
+        """, (qualified(schema, table),))
+        partitions = {name for name, in cursor.fetchall()}
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = %s AND tablename = %s", (schema, table))
+        indexes = {name for name, in cursor.fetchall()}
+    return {"exists": True, "partition_key": row[0] if row else None, "partitions": partitions, "indexes": indexes}
+
+def assumed_state():
+    """State used for an offline dry run: the table as created from ddl/, unpartitioned and without managed indexes."""
+    return {"exists": True, "partition_key": None, "partitions": set(), "indexes": set()}
+
+def _partition_ddl(schema, parent, prefix, levels, existing, statements):
+    """CREATE ... PARTITION OF parent statements for every missing partition of levels, named prefix_<name>, depth first."""
+    level, below = levels[0], levels[1:]
+    sub_clause = f" PARTITION BY LIST ({ident(below[0]['column'])})" if below else ""
+    children = [(partition_name(prefix, name), f"FOR VALUES IN ({literal(value)})") for name, value in partition_values(level)]
+    if level.get("default"):
+        default = level["default"] if isinstance(level["default"], str) else "default"
+        children.append((partition_name(prefix, default), "DEFAULT"))
+    for child, bounds in children:
+        if child not in existing:
+            statements.append(f"CREATE TABLE {qualified(schema, child)} PARTITION OF {qualified(schema, parent)} {bounds}{sub_clause}")
+        if below:
+            _partition_ddl(schema, child, child, below, existing, statements)
+
+def index_ddl(schema, table, index):
+    unique = "UNIQUE " if index.get("unique") else ""
+    method = f" USING {index['method']}" if index.get("method") else ""
+    columns = ", ".join(ident(col) for col in index["columns"])
+    where = f" WHERE {index['where']}" if index.get("where") else ""
+    return f"CREATE {unique}INDEX IF NOT EXISTS {ident(index['name'])} ON {qualified(schema, table)}{method} ({columns}){where}"
+
+def plan_layout(schema, table, layout, state):
+    """
+    DDL that brings schema.table from state (see read_table_state) to the layout config.
+    An existing unpartitioned table is rebuilt as a partitioned one in the same transaction:
+    a partitioned copy is created next to it, filled, and swapped in under the table's name.
+    Returns the statements in execution order; an empty list means the layout is current.
+    """
+    if not state["exists"]:
+        raise ValueError(f"{schema}.{table} does not exist; create it from ddl/ before applying a layout")
+    levels = layout.get("partitions", [])
+    _check_levels(levels)
+    statements = []
+    existing = set(state["partitions"])
+    indexes = set(state["indexes"])
+
+    if levels and state["partition_key"] is None:
+        staging = f"{table}_partitioned"
+        statements.append(f"CREATE TABLE {qualified(schema, staging)} (LIKE {qualified(schema, table)} INCLUDING DEFAULTS) "
+                          f"PARTITION BY LIST ({ident(levels[0]['column'])})")
+        # Partitions are named after the final table, not the staging one
+        _partition_ddl(schema, staging, table, levels, set(), statements)
+        statements.append(f"INSERT INTO {qualified(schema, staging)} SELECT * FROM {qualified(schema, table)}")
+        statements.append(f"DROP TABLE {qualified(schema, table)}")
+        statements.append(f"ALTER TABLE {qualified(schema, staging)} RENAME TO {ident(table)}")
+        existing, indexes = set(), set()
+        if layout.get("primary_key"):
+            statements.append(f"ALTER TABLE {qualified(schema, table)} ADD PRIMARY KEY ({', '.join(ident(col) for col in layout['primary_key'])})")
+    elif levels:
+        if state["partition_key"] != levels[0]["column"]:
+            raise ValueError(f"{schema}.{table} is partitioned by {state['partition_key']}, not {levels[0]['column']}; "
+                             f"repartitioning an already partitioned table is not supported")
+        _partition_ddl(schema, table, table, levels, existing, statements)
+
+    for index in layout.get("indexes", []):
+        if index["name"] not in indexes:
+            statements.append(index_ddl(schema, table, index))
+    return statements
+
+def apply_layout(conn, schema, table, layout, dry_run=None):
+    """Plan and, unless dry_run (default: the layout's own "dry_run"), execute the layout DDL in one transaction."""
+    dry_run = layout.get("dry_run", False) if dry_run is None else dry_run
+    statements = plan_layout(schema, table, layout, read_table_state(conn, schema, table))
+    if not statements:
+        logger.info(f"Physical layout of {schema}.{table} is current")
+        return statements
+    if dry_run:
+        logger.info(f"Planned layout DDL for {schema}.{table} (dry run, not applied):\n" + ";\n".join(statements) + ";")
+        return statements
+    try:
+        with conn.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Failed to apply layout to {schema}.{table}: {e}")
+        conn.rollback()
+        raise
+    logger.info(f"Applied {len(statements)} layout statements to {schema}.{table}")
+    return statements
+
+def droppable_indexes(layout):
+    """Managed indexes that may be dropped around a bulk load; unique ones stay, upserts and the PK rely on them."""
+    if not layout.get("drop_indexes_for_bulk_load"):
+        return []
+    return [index for index in layout.get("indexes", []) if not index.get("unique")]
+
+def bulk_load_ddl(schema, table, layout):
+    """(index drops before a bulk load, index rebuilds after it, ANALYZE after it)."""
+    indexes = droppable_indexes(layout)
+    drops = [f"DROP INDEX IF EXISTS {qualified(schema, index['name'])}" for index in indexes]
+    rebuilds = [index_ddl(schema, table, index) for index in indexes]
+    analyze = [f"ANALYZE {qualified(schema, table)}"] if layout.get("analyze_after_load") else []
+    return drops, rebuilds, analyze
+
+def _execute(conn, statements):
+    if not statements:
+        return
+    try:
+        with conn.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+        commit(conn)
+    except Exception:
+        rollback(conn)
+        raise
+
+@contextmanager
+def load_window(conn, schema, table, layout, bulk=True):
+    """
+    Wrap a load of schema.table: for bulk loads the droppable indexes are dropped first and
+    rebuilt afterwards, and with analyze_after_load the table is analyzed once the load succeeded.
+    Inside a unit_of_work the drops, rebuilds and ANALYZE are part of the load's transaction:
+    readers never see the table without its indexes, and a failed load rolls the drops back.
+    DROP INDEX holds an ACCESS EXCLUSIVE lock on the table until the commit, so pass bulk only
+    for truncate + reload loads, whose TRUNCATE takes that lock anyway. Swap loads build their
+    indexes on the swap table (swap_in) and merges keep theirs.
+    """
+    if not layout or layout.get("dry_run"):
+        yield
+        return
+    drops, rebuilds, analyze = bulk_load_ddl(schema, table, layout)
+    if not bulk:
+        drops, rebuilds = [], []
+    transactional = in_unit_of_work(conn)
+    _execute(conn, drops)
+    if drops:
+        logger.info(f"Dropped {len(drops)} indexes on {schema}.{table} for the bulk load")
+    try:
+        yield
+    except BaseException:
+        # Outside a transaction the indexes must come back even when the load failed
+        if not transactional:
+            _execute(conn, rebuilds)
+        raise
+    _execute(conn, rebuilds)
+    if rebuilds:
+        logger.info(f"Rebuilt {len(rebuilds)} indexes on {schema}.{table}")
+    _execute(conn, analyze)
+    if analyze:
+        logger.info(f"Analyzed {schema}.{table}")
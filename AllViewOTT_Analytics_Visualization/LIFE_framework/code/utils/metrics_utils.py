@@ -0,0 +1,125 @@
+import contextvars
+import cProfile
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from code.logger_config import get_logger, LOG_DIR
+
+logger = get_logger()
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+class JobMetrics:
+    """
+    Counters (rows_read, rows_written, null_rows, duplicate_rows, scd2_inserted, ...) and
+    accumulated wall time per stage for one ETL job.
+    """
+    def __init__(self, job):
+        self.job = job
+        self.counters = defaultdict(int)
+        self.stage_seconds = defaultdict(float)
+        self.started = time.perf_counter()
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        summary = {
+            "job": self.job,
+            "elapsed_seconds": round(elapsed, 3),
+            **self.counters,
+            "rows_per_second": round(self.counters["rows_written"] / elapsed, 1) if elapsed else 0.0,
+            "stage_seconds": {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()},
+        }
+        if self.stage_seconds.get("load"):
+            summary["load_rows_per_second"] = round(self.counters["rows_written"] / self.stage_seconds["load"], 1)
+        return summary
+
+_current = contextvars.ContextVar("etl_job_metrics", default=None)
+_default = JobMetrics("pipeline")
+
+def current_metrics():
+    return _current.get() or _default
+
+@contextmanager
+def job_metrics(job):
+    """Collect metrics for everything run inside the block and log them as one structured record."""
+    metrics = JobMetrics(job)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+        summary = metrics.summary()
+        logger.info(f"Job metrics: {json.dumps(summary)}", extra={"metrics": {"event": "job_metrics", **summary}})
+
+def count(name, value=1):
+    current_metrics().counters[name] += int(value)
+
+def observe(stage, seconds):
+    current_metrics().stage_seconds[stage] += seconds
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+def timed_iter(frames, stage="read", counter="rows_read"):
+    """Time producing each DataFrame of a lazy source (the read cost of streamed chunks) and count its rows."""
+    frames = iter(frames)
+    while True:
+        start = time.perf_counter()
+        try:
+            frame = next(frames)
+        except StopIteration:
+            observe(stage, time.perf_counter() - start)
+            return
+        observe(stage, time.perf_counter() - start)
+        if counter:
+            count(counter, len(frame))
+        yield frame
+
+@contextmanager
+def profiled(job, mode=None):
+    """
+    Profile the block with cProfile (logs/profile_<job>.prof) or pyinstrument
+    (logs/profile_<job>.html); mode defaults to the ETL_PROFILE env var, off when unset.
+    """
+    mode = mode or os.environ.get("ETL_PROFILE")
+    if not mode:
+        yield
+        return
+    if mode not in PROFILERS:
+        raise ValueError(f"Unsupported profiler {mode}. Expected one of {PROFILERS}.")
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("pyinstrument is not installed, running without profiling")
+            yield
+            return
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            path = os.path.join(LOG_DIR, f"profile_{job}.html")
+            with open(path, "w") as f:
+                f.write(profiler.output_html())
+            logger.info(f"Profile written to {path}")
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = os.path.join(LOG_DIR, f"profile_{job}.prof")
+            profiler.dump_stats(path)
+            logger.info(f"Profile written to {path}")
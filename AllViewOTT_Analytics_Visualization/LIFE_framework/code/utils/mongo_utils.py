@@ -1,4 +1,4 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne
 import pandas as pd
 from code.logger_config import get_logger
 
@@ -22,62 +22,53 @@ def read_from_mongo(client, mongo_conf):
     data = list(collection.find({}, {"_id": 0}))  # Exclude Mongo's internal _id
     return pd.DataFrame(data)
 
-def truncate_collection(client, mongo_conf):
+def read_from_mongo_chunks(client, mongo_conf, batch_size=50000, projection=None):
     """
-    Delete all records from the specified MongoDB collection.
+    Stream a MongoDB collection as DataFrames of at most batch_size documents, fetching
+    with the same cursor batch size so only one batch of BSON is held at a time.
+    projection limits the fields sent over the wire (a list of field names).
     """
     db_name = mongo_conf["database"]
     collection_name = mongo_conf["collection"]
-    client[db_name][collection_name].delete_many({})
+    fields = {"_id": 0}
+    if projection:
+        fields.update({field: 1 for field in projection})
+    cursor = client[db_name][collection_name].find({}, fields, batch_size=batch_size)
+    try:
+        batch = []
+        for document in cursor:
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield pd.DataFrame(batch, columns=projection)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=projection)
+    finally:
+        cursor.close()
 
-def insert_to_mongo(client, mongo_conf, df):
+def truncate_collection(client, mongo_conf):
     """
-    Insert a Pandas DataFrame into MongoDB collection.
+    Delete all records from the specified MongoDB collection.
     """
     db_name = mongo_conf["database"]
     collection_name = mongo_conf["collection"]
-    records = df.to_dict(orient='records')
-    client[db_name][collection_name].insert_many(records)
+    client[db_name][collection_name].delete_many({})
 
-def load_json_to_mongo_with_schema(config):
+def write_to_mongo(client, mongo_conf, df, upsert_keys=None, batch_size=None):
     """
-    Load data from JSON file into MongoDB with schema validation, deduplication, and null handling.
+    Write a DataFrame to MongoDB in batches of unordered bulk writes: plain inserts, or
+    replace-upserts keyed on upsert_keys so re-runs do not need to truncate the collection.
     """
-    file_path = config["input_file"]
-    schema_path = config["schema_path"]
-    mongo_conf = config["mongodb"]
-    unique_keys = config.get("unique_keys", [])
-    surrogate_key = config.get("surrogate_key")
-    nulls_output_path = config.get("null_output_file", "data/nulls.csv")
-
-    # Load schema
-    schema_df = pd.read_csv(schema_path)
-    col_types = {row["column_name"]: row["data_type"] for _, row in schema_df.iterrows()}
-
-    # Load JSON data
-    df = pd.read_json(file_path, dtype={k: v for k, v in col_types.items() if v != 'datetime'})
-    
-    # Convert datetime columns
-    for col, dtype in col_types.items():
-        if dtype == "datetime":
-            df[col] = pd.to_datetime(df[col], format="%d/%m/%y", errors='coerce')
-
-    logger.info(f"Read {len(df)} rows from JSON file: {file_path}")
-
-    # Drop duplicates
-    df.drop_duplicates(inplace=True)
-
-    # Null check on unique keys
-    if unique_keys:
-        null_df = df[df[unique_keys].isnull().any(axis=1)]
-        if not null_df.empty:
-            null_df.to_csv(nulls_output_path, index=False)
-            logger.warning(f"Found nulls in unique keys, {len(null_df)} rows written to {nulls_output_path}")
-        df = df.dropna(subset=unique_keys)
-
-    # Truncate and insert into MongoDB
-    client = connect_mongo(mongo_conf)
-    truncate_collection(client, mongo_conf)
-    insert_to_mongo(client, mongo_conf, df)
-
-    logger.info(f"Inserted {len(df)} clean records into MongoDB collection: {mongo_conf['collection']}")
\ No newline at end of file
+    if df.empty:
+        return
+    collection = client[mongo_conf["database"]][mongo_conf["collection"]]
+    batch_size = batch_size or mongo_conf.get("write_batch_size", 10000)
+    # NaN/NaT are not BSON-encodable, store them as nulls
+    records = df.astype(object).where(df.notna(), None).to_dict(orient='records')
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        if upsert_keys:
+            collection.bulk_write([ReplaceOne({k: r[k] for k in upsert_keys}, r, upsert=True) for r in batch], ordered=False)
+        else:
+            collection.insert_many(batch, ordered=False)
+    logger.info(f"Wrote {len(records)} records into MongoDB collection: {mongo_conf['collection']}")
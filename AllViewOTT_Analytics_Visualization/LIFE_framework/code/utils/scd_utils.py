@@ -0,0 +1,191 @@
+import time
+import uuid
+import pandas as pd
+from psycopg2 import sql
+from code.utils.db_utils import copy_dataframe, prepare_frame, commit, rollback
+from code.utils.hash_utils import row_hashes
+from code.logger_config import get_logger
+from code.utils.metrics_utils import count, observe
+
+logger = get_logger()
+
+HIGH_END_DATE = "9999-12-31"
+SNAPSHOT_TABLE = "scd2_snapshot"
+DELETED_TABLE = "scd2_deleted"
+
+def _row_hash(alias, columns):
+    """md5 over the text form of a ROW(...) so NULL and '' hash differently."""
+    return sql.SQL("md5(ROW({})::text)").format(
+        sql.SQL(', ').join(sql.Identifier(alias, col) for col in columns)
+    )
+
+def _key_match(unique_keys):
+    return sql.SQL(' AND ').join(
+        sql.SQL("{} = {}").format(sql.Identifier("t", k), sql.Identifier("s", k)) for k in unique_keys
+    )
+
+def _with_surrogate_key(df, surrogate_key):
+    """New versions without a precomputed key get a random uuid4 surrogate key."""
+    if surrogate_key not in df.columns:
+        df = df.assign(**{surrogate_key: [str(uuid.uuid4()) for _ in range(len(df))]})
+    return prepare_frame(df)
+
+def scd2_changes(new_df, existing_df, merge_keys, mode="md5"):
+    """
+    In-memory SCD2 diff (scd2_mode "pandas"): the rows of new_df that are new or whose content
+    hash differs from their current version in existing_df, joined with the existing columns
+    (suffixed _existing) and the merge indicator.
+    """
+    compare_columns = [col for col in new_df.columns if col not in merge_keys]
+    merged = pd.merge(new_df, existing_df, on=merge_keys, how='left', suffixes=('', '_existing'), indicator=True)
+
+    # Compare content hashes of the new and current versions instead of a per-row Python loop
+    existing_columns = merged[[f"{col}_existing" for col in compare_columns]].set_axis(compare_columns, axis=1)
+    for col in compare_columns:
+        if existing_columns[col].dtype != merged[col].dtype:
+            existing_columns[col] = existing_columns[col].astype(merged[col].dtype, errors='ignore')
+    new_hash = row_hashes(merged, compare_columns, mode)
+    existing_hash = row_hashes(existing_columns, compare_columns, mode)
+    return merged[(new_hash != existing_hash) | (merged['_merge'] == 'left_only')]
+
+def scd2_close(conn, keys, table, schema, unique_keys, timestamp):
+    """
+    Close the current versions of the unique_keys in keys (a DataFrame) with one set-based
+    UPDATE joined to a temp table of the keys; the pandas-mode counterpart of scd2_merge's step 3.
+    Returns the number of versions closed.
+    """
+    if keys.empty:
+        return 0
+    target = sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(table))
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA").format(
+                sql.Identifier(DELETED_TABLE), sql.SQL(', ').join(map(sql.Identifier, unique_keys)), target
+            ))
+            copy_dataframe(conn, prepare_frame(keys[unique_keys].drop_duplicates()), DELETED_TABLE, "pg_temp")
+            cursor.execute(sql.SQL("""
+                UPDATE {target} t
+                SET effective_to = %(ts)s, update_timestamp = %(ts)s
+                FROM {keys} s
+                WHERE t.effective_to = %(high)s AND {key_match}
+            """).format(target=target, keys=sql.Identifier(DELETED_TABLE), key_match=_key_match(unique_keys)),
+                {"ts": timestamp, "high": HIGH_END_DATE})
+            closed = cursor.rowcount
+            # Dropped here as well as on commit, the caller's unit_of_work carries on with the inserts
+            cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(DELETED_TABLE)))
+        commit(conn)
+    except Exception as e:
+        logger.error(f"Closing SCD Type 2 versions in {schema}.{table} failed: {e}")
+        rollback(conn)
+        raise
+    count("scd2_closed", closed)
+    return closed
+
+def table_has_rows(conn, table, schema):
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {}.{})").format(sql.Identifier(schema), sql.Identifier(table)))
+        return cursor.fetchone()[0]
+
+def scd2_merge(conn, frames, table, schema, unique_keys, surrogate_key, timestamp, close_deleted=True, hash_column=None, deleted_keys=None):
+    """
+    Set-based SCD Type 2 merge of a full source snapshot into schema.table.
+
+    The snapshot is copied into a temp table, compared with the current slice
+    (effective_to = '9999-12-31') through a hashed row diff, then changed (and, if
+    close_deleted, vanished) versions are closed with one UPDATE and new versions are
+    added with one INSERT ... SELECT, all in a single transaction.
+    With hash_column the precomputed content hash stored on both sides is compared
+    instead of hashing every column in SQL.
+    For delta snapshots pass close_deleted=False and the removed keys as deleted_keys
+    (a DataFrame of unique_keys); only those are closed besides the changed rows.
+    frames is the snapshot as one DataFrame or an iterable of DataFrames (e.g. from
+    run_query_chunks), which are copied into the temp table one at a time.
+    Returns a dict of inserted / updated / closed / unchanged counts.
+    """
+    start = time.perf_counter()
+    frames = iter([frames] if isinstance(frames, pd.DataFrame) else frames)
+    df = _with_surrogate_key(next(frames), surrogate_key)
+
+    columns = list(df.columns)
+    compare_columns = [col for col in columns if col not in unique_keys and col not in (surrogate_key, hash_column)]
+    target = sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(table))
+    snapshot = sql.Identifier(SNAPSHOT_TABLE)
+    params = {"ts": timestamp, "high": HIGH_END_DATE}
+    key_match = _key_match(unique_keys)
+    first_key = sql.Identifier("t", unique_keys[0])
+    if hash_column:
+        changed = sql.SQL("{} IS DISTINCT FROM {}").format(sql.Identifier("s", hash_column), sql.Identifier("t", hash_column))
+    else:
+        changed = sql.SQL("{} <> {}").format(_row_hash("s", compare_columns), _row_hash("t", compare_columns))
+
+    try:
+        with conn.cursor() as cursor:
+            # 1. Snapshot into a temp table shaped like the target columns being loaded
+            cursor.execute(sql.SQL("CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA").format(
+                snapshot, sql.SQL(', ').join(map(sql.Identifier, columns)), target
+            ))
+            copy_dataframe(conn, df, SNAPSHOT_TABLE, "pg_temp")
+            for df in frames:
+                copy_dataframe(conn, _with_surrogate_key(df, surrogate_key)[columns], SNAPSHOT_TABLE, "pg_temp")
+            cursor.execute(sql.SQL("ANALYZE {}").format(snapshot))
+
+            if deleted_keys is not None:
+                cursor.execute(sql.SQL("CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA").format(
+                    sql.Identifier(DELETED_TABLE), sql.SQL(', ').join(map(sql.Identifier, unique_keys)), target
+                ))
+                copy_dataframe(conn, prepare_frame(deleted_keys[unique_keys]), DELETED_TABLE, "pg_temp")
+
+            # 2. Classify the snapshot against the current slice in one join
+            cursor.execute(sql.SQL("""
+                SELECT
+                    COUNT(*) FILTER (WHERE {first_key} IS NULL),
+                    COUNT(*) FILTER (WHERE {first_key} IS NOT NULL AND {changed}),
+                    COUNT(*) FILTER (WHERE {first_key} IS NOT NULL AND NOT ({changed}))
+                FROM {snapshot} s
+                LEFT JOIN {target} t ON t.effective_to = %(high)s AND {key_match}
+            """).format(first_key=first_key, changed=changed, snapshot=snapshot, target=target, key_match=key_match), params)
+            inserted, updated, unchanged = cursor.fetchone()
+
+            # 3. Close current versions that changed or, optionally, vanished from the source
+            if close_deleted:
+                close_filter = sql.SQL("NOT EXISTS (SELECT 1 FROM {snapshot} s WHERE {key_match} AND NOT ({changed}))")
+            else:
+                close_filter = sql.SQL("EXISTS (SELECT 1 FROM {snapshot} s WHERE {key_match} AND {changed})")
+            close_filter = close_filter.format(snapshot=snapshot, key_match=key_match, changed=changed)
+            if deleted_keys is not None:
+                close_filter = sql.SQL("({}) OR EXISTS (SELECT 1 FROM {} s WHERE {})").format(
+                    close_filter, sql.Identifier(DELETED_TABLE), key_match
+                )
+            cursor.execute(sql.SQL("""
+                UPDATE {target} t
+                SET effective_to = %(ts)s, update_timestamp = %(ts)s
+                WHERE t.effective_to = %(high)s AND {close_filter}
+            """).format(target=target, close_filter=close_filter), params)
+            closed = cursor.rowcount - updated
+
+            # 4. Open a new version for every key that no longer has a current row
+            cursor.execute(sql.SQL("""
+                INSERT INTO {target} ({columns}, update_timestamp, effective_from, effective_to)
+                SELECT {source_columns}, %(ts)s, %(ts)s, %(high)s
+                FROM {snapshot} s
+                WHERE NOT EXISTS (SELECT 1 FROM {target} t WHERE t.effective_to = %(high)s AND {key_match})
+            """).format(
+                target=target,
+                columns=sql.SQL(', ').join(map(sql.Identifier, columns)),
+                source_columns=sql.SQL(', ').join(sql.Identifier("s", col) for col in columns),
+                snapshot=snapshot,
+                key_match=key_match
+            ), params)
+        commit(conn)
+    except Exception as e:
+        logger.error(f"SCD Type 2 merge into {schema}.{table} failed: {e}")
+        rollback(conn)
+        raise
+
+    counts = {"inserted": inserted, "updated": updated, "closed": closed, "unchanged": unchanged}
+    observe("scd2_merge", time.perf_counter() - start)
+    count("rows_written", inserted + updated)
+    for name, value in counts.items():
+        count(f"scd2_{name}", value)
+    logger.info(f"SCD Type 2 merge into {schema}.{table} completed in {time.perf_counter() - start:.2f}s: {counts}")
+    return counts
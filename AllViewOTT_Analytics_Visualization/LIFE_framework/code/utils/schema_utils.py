@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_DATE_FORMAT = "%d/%m/%y"
+SUPPORTED_TYPES = ("str", "int", "float", "bool", "datetime")
+REJECT_COLUMN = "reject_reason"
+ALLOWED_SEPARATOR = "|"
+
+# Reject reason codes, written as "<code>:<column>" next to the rejected row
+INVALID_TYPE = "invalid_type"
+INVALID_DATE = "invalid_date"
+NULL_VALUE = "null_value"
+NULL_KEY = "null_key"
+OUT_OF_RANGE = "out_of_range"
+NOT_ALLOWED = "not_allowed"
+
+TRUE_VALUES = {"true", "t", "yes", "y", "1"}
+FALSE_VALUES = {"false", "f", "no", "n", "0"}
+
+def _is_set(value):
+    return value is not None and not (isinstance(value, float) and np.isnan(value)) and str(value).strip() != ""
+
+class ColumnRule:
+    """
+    Type, format, nullability and allowed range or values of one schema column, with the
+    vectorized parse for that type chosen once when the schema is compiled.
+    """
+    def __init__(self, name, dtype, fmt=None, nullable=True, min_value=None, max_value=None, allowed=None):
+        if dtype not in SUPPORTED_TYPES:
+            raise ValueError(f"Unsupported data type {dtype} for column {name}. Expected one of {SUPPORTED_TYPES}.")
+        self.name = name
+        self.dtype = dtype
+        self.format = fmt or (DEFAULT_DATE_FORMAT if dtype == "datetime" else None)
+        self.nullable = nullable
+        self.min_value = self._bound(min_value)
+        self.max_value = self._bound(max_value)
+        self.allowed = set(allowed) if allowed else None
+        self.parse_values = getattr(self, f"_parse_{dtype}")
+
+    def _bound(self, value):
+        if not _is_set(value):
+            return None
+        if self.dtype == "datetime":
+            return pd.Timestamp(value)
+        return float(value) if self.dtype in ("int", "float") else value
+
+    def _parse_str(self, series):
+        if pd.api.types.is_object_dtype(series):
+            return series, None
+        return series.where(series.isna(), series.astype(str)), None
+
+    def _parse_int(self, series):
+        if pd.api.types.is_integer_dtype(series):
+            return series, None
+        try:
+            # Strict cast of a clean column is several times faster than coercing it
+            return series.astype("int64"), None
+        except (ValueError, TypeError, OverflowError):
+            pass
+        values = pd.to_numeric(series, errors="coerce")
+        failed = (series.notna() & values.isna()) | (values.notna() & (values % 1 != 0))
+        return values.where(~failed), failed
+
+    def _parse_float(self, series):
+        try:
+            return series.astype(float), None
+        except (ValueError, TypeError):
+            pass
+        values = pd.to_numeric(series, errors="coerce")
+        return values, series.notna() & values.isna()
+
+    def _parse_bool(self, series):
+        if pd.api.types.is_bool_dtype(series):
+            return series, None
+        text = series.astype(str).str.strip().str.lower()
+        values = pd.Series(np.where(text.isin(TRUE_VALUES), True, np.where(text.isin(FALSE_VALUES), False, None)),
+                           index=series.index, dtype=object)
+        return values, series.notna() & values.isna()
+
+    def _parse_datetime(self, series):
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series, None
+        values = pd.to_datetime(series, format=self.format, errors="coerce")
+        return values, series.notna() & values.isna()
+
+    def parse(self, series):
+        """(parsed values, [(reason code, failing rows mask), ...]) for one raw column."""
+        values, failed = self.parse_values(series)
+        failures = []
+        if failed is not None:
+            failures.append((INVALID_DATE if self.dtype == "datetime" else INVALID_TYPE, failed))
+        if not self.nullable:
+            failures.append((NULL_VALUE, series.isna()))
+        if self.min_value is not None or self.max_value is not None:
+            too_low = values < self.min_value if self.min_value is not None else False
+            too_high = values > self.max_value if self.max_value is not None else False
+            failures.append((OUT_OF_RANGE, too_low | too_high))
+        if self.allowed is not None:
+            failures.append((NOT_ALLOWED, values.notna() & ~values.isin(self.allowed)))
+        return values, failures
+
+    def finalize(self, values):
+        """Final dtype of the column once the rejected rows are gone."""
+        if self.dtype == "int" and not pd.api.types.is_integer_dtype(values):
+            return values.astype("int64" if values.notna().all() else "Int64")
+        if self.dtype == "bool" and values.notna().all():
+            return values.astype(bool)
+        return values
+
+class CompiledSchema:
+    """
+    A metadata/schema_*.csv compiled into per-column rules. apply() casts and validates a raw
+    frame in one vectorized pass per column and splits it into typed valid rows and rejected
+    rows tagged with a reason code, instead of failing the whole frame on the first bad value.
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        self.dtypes = {rule.name: rule.dtype for rule in rules}
+
+    def read_dtypes(self):
+        """dtype argument for the CSV/JSON readers: every schema column as text, the schema does the casting."""
+        return {name: str for name in self.dtypes}
+
+    def apply(self, df):
+        """Returns (valid rows cast to the schema, rejected raw rows with a reject_reason column)."""
+        reasons = np.full(len(df), None, dtype=object)
+        parsed = {}
+        rules = [rule for rule in self.rules if rule.name in df.columns]
+        for rule in rules:
+            parsed[rule.name], failures = rule.parse(df[rule.name])
+            for code, failed in failures:
+                failed = np.asarray(failed, dtype=bool)
+                if failed.any():
+                    # First failing rule wins, so every rejected row carries exactly one reason
+                    reasons = np.where(failed & pd.isna(reasons), f"{code}:{rule.name}", reasons)
+
+        rejected = pd.notna(reasons)
+        if not rejected.any():
+            return df.assign(**{rule.name: rule.finalize(parsed[rule.name]) for rule in rules}), df.iloc[:0].assign(**{REJECT_COLUMN: None})
+        valid = ~rejected
+        rejects = df[rejected].assign(**{REJECT_COLUMN: reasons[rejected]})
+        return df[valid].assign(**{rule.name: rule.finalize(parsed[rule.name][valid]) for rule in rules}), rejects
+
+def compile_schema(schema_path, date_format=DEFAULT_DATE_FORMAT):
+    """
+    Compile a schema CSV. Besides column_name and data_type it may carry optional format
+    (strftime format of datetime columns), nullable, min, max and allowed_values ("a|b|c")
+    columns; missing ones default to nullable with no checks, dates in date_format.
+    """
+    schema_df = pd.read_csv(schema_path, dtype=str, keep_default_na=False)
+    rules = []
+    for row in schema_df.to_dict(orient="records"):
+        dtype = row["data_type"].strip()
+        rules.append(ColumnRule(
+            row["column_name"].strip(),
+            dtype,
+            fmt=row.get("format") or (date_format if dtype == "datetime" else None),
+            nullable=row.get("nullable", "").strip().lower() not in FALSE_VALUES,
+            min_value=row.get("min") or None,
+            max_value=row.get("max") or None,
+            allowed=row["allowed_values"].split(ALLOWED_SEPARATOR) if row.get("allowed_values") else None,
+        ))
+    return CompiledSchema(rules)
+
+def null_key_reasons(df, keys):
+    """null_key:<column> of the first null unique key of every row, None where all are set."""
+    return np.select([df[key].isna().to_numpy() for key in keys], [f"{NULL_KEY}:{key}" for key in keys], None)
@@ -0,0 +1,120 @@
+import hashlib
+import pandas as pd
+from psycopg2 import sql
+from code.utils.db_utils import run_query, upsert_dataframe, commit, rollback
+from code.logger_config import get_logger
+
+logger = get_logger()
+
+LOAD_STATE_TABLE = "etl_load_state"
+ROW_STATE_TABLE = "etl_row_state"
+# Load-state row recording the loads of a downstream (processed) table, see record_table_load
+LOADS_SUFFIX = ":loads"
+
+def file_checksum(path, block_size=1 << 20):
+    """sha256 of a source file, read in blocks so large feeds are never held in memory."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def get_load_state(conn, table, schema="stage"):
+    """Return the persisted {file_checksum, high_water_mark, last_load_at} of a table, or None before its first incremental load."""
+    state = run_query(conn, sql.SQL("SELECT file_checksum, high_water_mark, last_load_at FROM {}.{} WHERE table_name = %(table)s").format(
+        sql.Identifier(schema), sql.Identifier(LOAD_STATE_TABLE)
+    ).as_string(conn), params={"table": table})
+    return None if state.empty else state.iloc[0].to_dict()
+
+def save_load_state(conn, table, file_checksum=None, high_water_mark=None, loaded_at=None, schema="stage"):
+    state = pd.DataFrame([{"table_name": table, "file_checksum": file_checksum,
+                           "high_water_mark": high_water_mark, "last_load_at": loaded_at}])
+    upsert_dataframe(conn, state, LOAD_STATE_TABLE, schema, ["table_name"])
+
+def record_table_load(conn, table, loaded_at, rewritten, schema="stage"):
+    """
+    Record a load of table in the load's own transaction, as its "<table>:loads" state row:
+    last_load_at is the load's timestamp and high_water_mark that of the latest load which
+    rewrote the table instead of only adding rows (the first recorded load counts as one).
+    The row only changes when a load commits, so readers get a commit-ordered table version.
+    """
+    state = get_load_state(conn, f"{table}{LOADS_SUFFIX}", schema)
+    last_rewrite = loaded_at if rewritten or state is None else state["high_water_mark"]
+    save_load_state(conn, f"{table}{LOADS_SUFFIX}", None, last_rewrite, loaded_at, schema)
+
+def get_table_loads(conn, table, schema="stage"):
+    """{high_water_mark: last rewrite, last_load_at: last load} of table (see record_table_load), or None."""
+    return get_load_state(conn, f"{table}{LOADS_SUFFIX}", schema)
+
+def read_row_hashes(conn, table, schema="stage"):
+    """Current (not deleted) per-row content hashes of a table, indexed by the 32-char hex surrogate key."""
+    hashes = run_query(conn, sql.SQL("SELECT replace(surrogate_key::text, '-', '') AS surrogate_key, row_hash FROM {}.{} WHERE table_name = %(table)s AND NOT is_deleted").format(
+        sql.Identifier(schema), sql.Identifier(ROW_STATE_TABLE)
+    ).as_string(conn), params={"table": table})
+    return hashes.set_index("surrogate_key")["row_hash"]
+
+def read_row_hash_subset(conn, table, keys, schema="stage"):
+    """read_row_hashes restricted to the given 32-char hex surrogate keys."""
+    hashes = run_query(conn, sql.SQL("SELECT replace(surrogate_key::text, '-', '') AS surrogate_key, row_hash FROM {}.{} WHERE table_name = %(table)s AND surrogate_key = ANY(%(keys)s::uuid[]) AND NOT is_deleted").format(
+        sql.Identifier(schema), sql.Identifier(ROW_STATE_TABLE)
+    ).as_string(conn), params={"table": table, "keys": list(keys)})
+    return hashes.set_index("surrogate_key")["row_hash"]
+
+def reset_row_state(conn, table, file_checksum, loaded_at, schema="stage"):
+    """
+    After a full (truncate or swap) stage load: forget the table's row hashes, which no longer
+    describe its rows, and record the load, so incremental runs start from a clean slate and
+    downstream loads can tell the table was reloaded without a row-level delta.
+    """
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("DELETE FROM {}.{} WHERE table_name = %(table)s").format(
+                sql.Identifier(schema), sql.Identifier(ROW_STATE_TABLE)
+            ), {"table": table})
+        commit(conn)
+    except Exception as e:
+        logger.error(f"Failed to reset the row state of {table}: {e}")
+        rollback(conn)
+        raise
+    save_load_state(conn, table, file_checksum, None, loaded_at, schema)
+
+def full_reloads_since(conn, watermark, schema="stage"):
+    """
+    Stage tables reloaded in full after watermark (ever, when it is None): they have a load state
+    with a source checksum but no row state, so changed_keys_since cannot see their changes.
+    A DataFrame of table_name and last_load_at.
+    """
+    query = sql.SQL("""
+        SELECT l.table_name, l.last_load_at FROM {schema}.{load_state} l
+        WHERE l.file_checksum IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM {schema}.{row_state} r WHERE r.table_name = l.table_name)
+    """).format(schema=sql.Identifier(schema), load_state=sql.Identifier(LOAD_STATE_TABLE), row_state=sql.Identifier(ROW_STATE_TABLE))
+    if watermark is None:
+        return run_query(conn, query.as_string(conn))
+    return run_query(conn, (query + sql.SQL(" AND l.last_load_at > %(watermark)s")).as_string(conn), params={"watermark": watermark})
+
+def save_row_hashes(conn, table, changed, deleted_keys, loaded_at, schema="stage"):
+    """
+    Record the hashes of upserted rows and flag deleted keys, stamping both with loaded_at
+    so downstream loads can pick up exactly this delta.
+    changed is a DataFrame with surrogate_key and row_hash columns.
+    """
+    rows = changed.assign(table_name=table, loaded_at=loaded_at, is_deleted=False)
+    if deleted_keys:
+        deleted = pd.DataFrame({"surrogate_key": list(deleted_keys), "row_hash": "", "table_name": table,
+                                "loaded_at": loaded_at, "is_deleted": True})
+        rows = pd.concat([rows, deleted], ignore_index=True)
+    upsert_dataframe(conn, rows[["table_name", "surrogate_key", "row_hash", "loaded_at", "is_deleted"]],
+                     ROW_STATE_TABLE, schema, ["table_name", "surrogate_key"])
+
+def changed_keys_since(conn, watermark, schema="stage"):
+    """
+    Stage keys touched after watermark (all keys when watermark is None), as a DataFrame of
+    table_name, surrogate_key, is_deleted and loaded_at.
+    """
+    query = sql.SQL("SELECT table_name, surrogate_key::text AS surrogate_key, is_deleted, loaded_at FROM {}.{}").format(
+        sql.Identifier(schema), sql.Identifier(ROW_STATE_TABLE)
+    )
+    if watermark is None:
+        return run_query(conn, query.as_string(conn))
+    return run_query(conn, (query + sql.SQL(" WHERE loaded_at > %(watermark)s")).as_string(conn), params={"watermark": watermark})
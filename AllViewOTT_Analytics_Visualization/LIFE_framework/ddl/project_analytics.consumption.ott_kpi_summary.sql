@@ -0,0 +1,33 @@
+-- Incrementally maintained replacement for consumption.mv_ott_kpi_summary (requires PostgreSQL 15+ for NULLS NOT DISTINCT).
+-- Same semantics as the view: every processed.fact_ott row is counted, closed SCD2 versions included.
+CREATE TABLE project_analytics.consumption.ott_kpi_summary (
+    ott_platform            VARCHAR NOT NULL,
+    content_added_month     TIMESTAMP,
+    release_year            INT,
+    total_titles            BIGINT NOT NULL DEFAULT 0,
+    total_movies            BIGINT NOT NULL DEFAULT 0,
+    total_tv_shows          BIGINT NOT NULL DEFAULT 0,
+    movie_duration_sum      BIGINT NOT NULL DEFAULT 0,
+    movie_duration_count    BIGINT NOT NULL DEFAULT 0,
+    tvshow_seasons_sum      BIGINT NOT NULL DEFAULT 0,
+    tvshow_seasons_count    BIGINT NOT NULL DEFAULT 0,
+    avg_movie_duration_min  NUMERIC GENERATED ALWAYS AS (movie_duration_sum::NUMERIC / NULLIF(movie_duration_count, 0)) STORED,
+    avg_tvshow_seasons      NUMERIC GENERATED ALWAYS AS (tvshow_seasons_sum::NUMERIC / NULLIF(tvshow_seasons_count, 0)) STORED,
+    unique_directors        BIGINT NOT NULL DEFAULT 0,
+    unique_countries        BIGINT NOT NULL DEFAULT 0,
+    UNIQUE NULLS NOT DISTINCT (ott_platform, content_added_month, release_year)
+);
+
+CREATE INDEX ott_kpi_summary_platform_year_idx
+    ON project_analytics.consumption.ott_kpi_summary (ott_platform, release_year);
+
+-- Exact per-group distinct sets behind unique_directors / unique_countries, with a reference count per value
+CREATE TABLE project_analytics.consumption.ott_kpi_distinct (
+    ott_platform            VARCHAR NOT NULL,
+    content_added_month     TIMESTAMP,
+    release_year            INT,
+    attribute               VARCHAR NOT NULL,
+    value                   VARCHAR NOT NULL,
+    row_count               BIGINT NOT NULL,
+    UNIQUE NULLS NOT DISTINCT (ott_platform, content_added_month, release_year, attribute, value)
+);
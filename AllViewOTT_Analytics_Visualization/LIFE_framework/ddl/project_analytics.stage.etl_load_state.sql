@@ -0,0 +1,17 @@
+CREATE TABLE project_analytics.stage.etl_load_state (
+    table_name      VARCHAR PRIMARY KEY,
+    file_checksum   VARCHAR,
+    high_water_mark TIMESTAMP,
+    last_load_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE project_analytics.stage.etl_row_state (
+    table_name      VARCHAR NOT NULL,
+    surrogate_key   UUID NOT NULL,
+    row_hash        VARCHAR(32) NOT NULL,
+    loaded_at       TIMESTAMP NOT NULL,
+    is_deleted      BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (table_name, surrogate_key)
+);
+
+CREATE INDEX etl_row_state_loaded_at_idx ON project_analytics.stage.etl_row_state (loaded_at);
@@ -2,39 +2,55 @@
 import sys
 import os
 import json
-from code.loaders import StageLoader, ProcessedLoader
-from code.logger_config import get_logger
+from code.loaders import StageLoader, ProcessedLoader, ConsumptionLoader
+from code.logger_config import get_logger, configure_logging, current_job
+from code.utils.metrics_utils import job_metrics, profiled
+from code.utils.db_utils import close_pools
 
 # logger = None
 logger = get_logger()
 
-def main(config_key):
-    # global logger
-    try:
-        config_path = os.path.join("config", f"{config_key}.conf")
+def run_job(config_key):
+    """Run one ETL job end to end; raises on failure so callers can react to it."""
+    config_path = os.path.join("config", f"{config_key}.conf")
+
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"Config file not found: {config_path}")
 
-        if not os.path.exists(config_path):
-            raise FileNotFoundError(f"Config file not found: {config_path}")
-            
-        with open(config_path, 'r') as f:
-            conf = json.load(f)
-            identifier = conf.get("run_layer")
-        
-        # logger = get_logger(config_key)
+    with open(config_path, 'r') as f:
+        conf = json.load(f)
+        identifier = conf.get("run_layer")
 
+    token = current_job.set(config_key)
+    loader = None
+    try:
+        # Built inside the try so a connection taken by the loader always goes back to the pool
         if identifier == "stage":
             loader = StageLoader(config_path)
         elif identifier == "processed":
             loader = ProcessedLoader(config_path)
+        elif identifier == "consumption":
+            loader = ConsumptionLoader(config_path)
         else:
-            raise ValueError("Invalid identifier in config file.  Expected either 'stage' or 'processed'.")
+            raise ValueError("Invalid identifier in config file.  Expected one of 'stage', 'processed' or 'consumption'.")
 
-        loader.run_pipeline()
+        with job_metrics(config_key), profiled(config_key, conf.get("profile")):
+            loader.run_pipeline()
+    finally:
+        if loader is not None:
+            loader.close()
+        current_job.reset(token)
 
+def main(config_key):
+    # global logger
+    try:
+        run_job(config_key)
     except Exception as e:
         error_msg = f"ETL Pipeline execution for {config_key} failed: {e}"
         logger.error(error_msg)
         print(error_msg)
+    finally:
+        close_pools()
 
 if __name__ == "__main__":
     if len(sys.argv) != 2:
@@ -42,4 +58,5 @@ if __name__ == "__main__":
         sys.exit(1)
 
     config_key = sys.argv[1]
-    main(config_key)
\ No newline at end of file
+    configure_logging(config_key)
+    main(config_key)
@@ -0,0 +1,51 @@
+# Run Command: python layout_manager.py "fact_ott_processed" [--dry-run] [--offline]
+import argparse
+import os
+import json
+from code.utils.db_utils import connect_postgres
+from code.utils.layout_utils import apply_layout, plan_layout, assumed_state, bulk_load_ddl
+from code.logger_config import get_logger, configure_logging
+
+logger = get_logger()
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply or preview the partitioning and index layout of a job's target table")
+    parser.add_argument("config_key")
+    parser.add_argument("--dry-run", action="store_true", help="print the planned DDL without executing it")
+    parser.add_argument("--offline", action="store_true", help="plan against the table as created from ddl/, without a database")
+    args = parser.parse_args()
+
+    config_path = os.path.join("config", f"{args.config_key}.conf")
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"Config file not found: {config_path}")
+    with open(config_path, 'r') as f:
+        conf = json.load(f)
+    layout = conf.get("layout")
+    if not layout:
+        print(f"{args.config_key} has no layout block, nothing to do")
+        return
+    db_schema, table = conf.get("target_db_schema"), conf["target_table"]
+
+    if args.offline:
+        statements = plan_layout(db_schema, table, layout, assumed_state())
+    else:
+        conn = connect_postgres(conf["database"])
+        try:
+            statements = apply_layout(conn, db_schema, table, layout, dry_run=args.dry_run or None)
+        finally:
+            conn.close()
+
+    drops, rebuilds, analyze = bulk_load_ddl(db_schema, table, layout)
+    applied = not (args.offline or args.dry_run or layout.get("dry_run"))
+    print(f"-- Layout of {db_schema}.{table}: {len(statements)} statements{' applied' if applied else ' planned'}")
+    for statement in statements:
+        print(f"{statement};")
+    for label, group in (("before bulk loads", drops), ("after bulk loads", rebuilds + analyze)):
+        if group:
+            print(f"-- Run by the loader {label}")
+            for statement in group:
+                print(f"{statement};")
+
+if __name__ == "__main__":
+    configure_logging("layout_manager")
+    main()
@@ -0,0 +1,132 @@
+# Run Command: python orchestrator.py --workers 4 [--executor process] [--jobs netflix_stg hulu_stg fact_ott_processed]
+import os
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from etl_pipeline import run_job
+from code.logger_config import get_logger, configure_logging
+from code.utils.db_utils import close_pools
+
+logger = get_logger()
+
+CONFIG_DIR = "config"
+LAYER_ORDER = ["stage", "processed", "consumption"]
+
+def timed_job(config_key):
+    start = time.perf_counter()
+    run_job(config_key)
+    return time.perf_counter() - start
+
+def load_jobs(config_dir=CONFIG_DIR):
+    """Read every config/*.conf into {config_key: config}."""
+    jobs = {}
+    for path in sorted(glob.glob(os.path.join(config_dir, "*.conf"))):
+        with open(path, 'r') as f:
+            jobs[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+    return jobs
+
+def build_dag(jobs):
+    """
+    Map each job to the set of jobs it depends on: every job of an earlier run_layer,
+    plus any explicit depends_on keys in its config.
+    """
+    dag = {}
+    for key, conf in jobs.items():
+        layer = conf.get("run_layer")
+        if layer not in LAYER_ORDER:
+            raise ValueError(f"Invalid run_layer '{layer}' in {key}. Expected one of {LAYER_ORDER}.")
+        deps = {other for other, other_conf in jobs.items()
+                if LAYER_ORDER.index(other_conf["run_layer"]) < LAYER_ORDER.index(layer)}
+        for dep in conf.get("depends_on", []):
+            if dep not in jobs:
+                raise ValueError(f"Job {key} depends on unknown job {dep}")
+            deps.add(dep)
+        dag[key] = deps
+
+    # Kahn's algorithm only to reject cycles up front
+    remaining = {key: set(deps) for key, deps in dag.items()}
+    while remaining:
+        ready = [key for key, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between jobs: {sorted(remaining)}")
+        for key in ready:
+            del remaining[key]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return dag
+
+def descendants(dag, key):
+    found, frontier = set(), [key]
+    while frontier:
+        current = frontier.pop()
+        for job, deps in dag.items():
+            if current in deps and job not in found:
+                found.add(job)
+                frontier.append(job)
+    return found
+
+def run_dag(dag, workers, executor="thread"):
+    """
+    Run jobs as soon as their dependencies succeed. A failed job only skips the jobs
+    downstream of it. Returns {job: (status, seconds)}.
+    """
+    pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    results = {}
+    pending = dict(dag)
+    running = {}
+    start = time.perf_counter()
+
+    with pool_cls(max_workers=workers) as pool:
+        while pending or running:
+            for key in [k for k, deps in pending.items() if all(results.get(d, ("",))[0] == "success" for d in deps)]:
+                logger.info(f"Starting job {key}")
+                running[pool.submit(timed_job, key)] = key
+                del pending[key]
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                try:
+                    elapsed = future.result()
+                    results[key] = ("success", elapsed)
+                    logger.info(f"Job {key} succeeded in {elapsed:.2f}s")
+                except Exception as e:
+                    results[key] = ("failed", None)
+                    logger.error(f"ETL Pipeline execution for {key} failed: {e}")
+                    for skipped in descendants(dag, key):
+                        if skipped in pending:
+                            del pending[skipped]
+                            results[skipped] = ("skipped", None)
+                            logger.warning(f"Skipping job {skipped}: upstream job {key} failed")
+
+    total = time.perf_counter() - start
+    for key in dag:
+        status, elapsed = results[key]
+        logger.info(f"{key:<24} {status:<8} {f'{elapsed:.2f}s' if elapsed is not None else '-'}")
+    logger.info(f"DAG of {len(dag)} jobs finished in {total:.2f}s with {workers} {executor} workers")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Run all LIFE ETL jobs as a dependency DAG.")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum number of jobs running at once")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--jobs", nargs="*", help="Only run these config keys; layer ordering still applies between them")
+    args = parser.parse_args()
+
+    configure_logging("orchestrator")
+    jobs = load_jobs()
+    if args.jobs:
+        jobs = {key: conf for key, conf in jobs.items() if key in args.jobs}
+    try:
+        results = run_dag(build_dag(jobs), args.workers, args.executor)
+    finally:
+        close_pools()
+    if any(status != "success" for status, _ in results.values()):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+# Run Command: python -m pytest tests
+import pandas as pd
+import pytest
+from code.utils.cache_utils import StageCache
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_stage_cache_round_trip_in_chunks(tmp_path, fmt):
+    source = tmp_path / "source.csv"
+    source.write_text("id\n1\n")
+    frame = pd.DataFrame({"id": range(10), "name": [f"n{i}" for i in range(10)]})
+    cache = StageCache(str(tmp_path), "stage_table", fmt)
+    key = StageCache.source_key(str(source), extra="settings")
+    writer = cache.writer(key)
+    writer.write(frame.iloc[:6])
+    writer.write(frame.iloc[6:])
+    writer.commit()
+
+    assert cache.read(StageCache.source_key(str(source), extra="other settings")) is None
+    chunks = list(cache.read(key, chunk_rows=4))
+    assert max(len(chunk) for chunk in chunks) <= 4
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), frame)
+    pd.testing.assert_frame_equal(next(cache.read(key)), frame)
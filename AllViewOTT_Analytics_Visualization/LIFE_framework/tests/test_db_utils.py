@@ -0,0 +1,34 @@
+# Run Command: python -m pytest tests
+import json
+import pytest
+from psycopg2.pool import PoolError
+from code import loaders
+from code.utils.db_utils import ConnectionPool, swap_index_ddl
+
+DATABASE = {"dbname": "db", "user": "user", "password": "secret", "host": "localhost", "port": 5432}
+
+def test_getconn_gives_up_after_the_pool_timeout():
+    # minconn 0: nothing connects until a connection is handed out
+    pool = ConnectionPool(DATABASE, 1, timeout=0.05)
+    assert pool.slots.acquire(blocking=False)
+    with pytest.raises(PoolError):
+        pool.getconn()
+
+def test_loader_failing_in_its_constructor_takes_no_connection(tmp_path, monkeypatch):
+    class Pool:
+        taken = 0
+        def getconn(self):
+            Pool.taken += 1
+    monkeypatch.setattr(loaders, "get_pool", lambda config: Pool())
+    config_path = tmp_path / "job.conf"
+    config_path.write_text(json.dumps({"database": DATABASE, "schema_path": str(tmp_path / "missing.csv")}))
+    with pytest.raises(FileNotFoundError):
+        loaders.StageLoader(str(config_path))
+    assert Pool.taken == 0
+
+def test_swap_index_ddl_moves_an_index_to_the_swap_table():
+    indexdef = 'CREATE UNIQUE INDEX shows_pkey ON stage.shows USING btree (sk) WHERE (sk IS NOT NULL)'
+    assert swap_index_ddl(indexdef, '"shows_pkey_swap"', '"stage"."shows_swap"') == \
+        'CREATE UNIQUE INDEX "shows_pkey_swap" ON "stage"."shows_swap" USING btree (sk) WHERE (sk IS NOT NULL)'
+    with pytest.raises(ValueError):
+        swap_index_ddl("ALTER TABLE stage.shows", '"x"', '"y"')
@@ -0,0 +1,47 @@
+# Run Command: python -m pytest tests
+import hashlib
+import pandas as pd
+import pytest
+from code.utils.hash_utils import RowDeduplicator, surrogate_keys, row_hashes, ROW_SEPARATOR, ROW_NULL
+
+def test_row_deduplicator_matches_drop_duplicates_across_chunks():
+    frame = pd.DataFrame({"id": [1, 2, 1, 3, 2, 4], "plan": ["a", "b", "a", None, "b", None]})
+    for exact in (False, True):
+        deduplicator = RowDeduplicator(exact)
+        chunks = [deduplicator.filter(frame.iloc[start:start + 2]) for start in range(0, len(frame), 2)]
+        pd.testing.assert_frame_equal(pd.concat(chunks), frame.drop_duplicates())
+
+def test_row_deduplicator_keeps_rows_whose_fingerprints_collide(monkeypatch):
+    from code.utils import hash_utils
+    monkeypatch.setattr(hash_utils, "row_fingerprints", lambda df: [0] * len(df))
+    frame = pd.DataFrame({"id": [1, 2, 1], "plan": ["a", None, "a"]})
+    deduplicator = RowDeduplicator(exact=True)
+    chunks = [deduplicator.filter(frame.iloc[[i]]) for i in range(len(frame))]
+    assert pd.concat(chunks)["id"].tolist() == [1, 2]
+    assert RowDeduplicator().filter(frame)["id"].tolist() == [1]
+
+def row_wise_key(row, columns):
+    key_string = "_".join(str(row[col]) for col in columns if pd.notna(row[col]))
+    return hashlib.md5(key_string.encode()).hexdigest()
+
+def row_wise_hash(row, columns):
+    return hashlib.md5(ROW_SEPARATOR.join(ROW_NULL if pd.isna(row[col]) else str(row[col]) for col in columns).encode()).hexdigest()
+
+@pytest.mark.parametrize("frame", [
+    pd.DataFrame({"id": [1, 2, 3], "title": ["a", None, ""], "score": [1.0, 2.5, None],
+                  "added": pd.to_datetime(["2024-01-01", None, "2024-03-01"]), "flag": [True, False, True]}),
+    # All-numeric rows come out of apply(axis=1) as float64, so the int column reads "1.0" there too
+    pd.DataFrame({"id": [1, 2, 3], "season": [1.0, None, 3.5]}),
+    pd.DataFrame({"id": [1, 2, 3], "season": [4, 5, 6]}),
+])
+def test_md5_keys_and_row_hashes_match_the_row_wise_versions(frame):
+    columns = list(frame.columns)
+    keys, fallbacks = surrogate_keys(frame, columns)
+    assert fallbacks == 0
+    assert keys.tolist() == frame.apply(lambda row: row_wise_key(row, columns), axis=1).tolist()
+    assert row_hashes(frame, columns).tolist() == frame.apply(lambda row: row_wise_hash(row, columns), axis=1).tolist()
+
+def test_row_hashes_tell_null_from_empty_string():
+    frame = pd.DataFrame({"id": [1, 1], "title": [None, ""]})
+    hashes = row_hashes(frame, ["id", "title"])
+    assert hashes[0] != hashes[1]
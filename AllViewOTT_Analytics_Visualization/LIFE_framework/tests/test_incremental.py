@@ -0,0 +1,26 @@
+# Run Command: python -m pytest tests
+import pandas as pd
+from code import loaders
+from code.loaders import StageLoader
+
+def test_append_only_keeps_late_rows_on_the_high_water_mark(monkeypatch):
+    loader = StageLoader.__new__(StageLoader)
+    loader.conn, loader.key_hash_mode, loader.load_chunk_size = None, "md5", 1000
+    chunk = pd.DataFrame({
+        "show_id": ["s1", "s2", "s3", "s4"],
+        "date_added": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-02", "2024-01-03"]),
+        "sk": ["a" * 32, "b" * 32, "c" * 32, "d" * 32],
+        "load_timestamp": pd.Timestamp("2024-01-04"),
+    })
+    loaded = loader.generate_row_hash(chunk, ["show_id", "date_added"])
+    # s2 was loaded by the last run; s3 carries the same date but arrived later
+    monkeypatch.setattr(loaders, "read_row_hash_subset", lambda conn, table, keys: pd.Series({"b" * 32: loaded[1]}).reindex(list(keys)).dropna())
+    upserted = []
+    monkeypatch.setattr(loaders, "upsert_dataframe", lambda conn, df, *args: upserted.append(df))
+    monkeypatch.setattr(loaders, "save_row_hashes", lambda *args: None)
+
+    tracker = {"append_only": True, "watermark_column": "date_added", "high_water_mark": pd.Timestamp("2024-01-02"),
+               "seen_keys": set(), "max_watermark": None, "changed": 0, "unchanged": 0}
+    loader.load_incremental_chunk(tracker, chunk, "shows", "stage", "sk")
+    assert upserted[0]["show_id"].tolist() == ["s3", "s4"]
+    assert (tracker["changed"], tracker["unchanged"]) == (2, 2)
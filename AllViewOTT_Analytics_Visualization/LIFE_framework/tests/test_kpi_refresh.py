@@ -0,0 +1,45 @@
+# Run Command: python -m pytest tests
+import json
+import pandas as pd
+import pytest
+from code import loaders
+
+T1, T2, T3 = (pd.Timestamp(f"2025-01-0{day}") for day in (1, 2, 3))
+
+class Connection:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+@pytest.fixture
+def refresh(tmp_path, monkeypatch):
+    """Run the consumption loader against the given fact loads row and summary state; returns the calls it made."""
+    config_path = tmp_path / "kpi.conf"
+    config_path.write_text(json.dumps({"target_table": "ott_kpi_summary", "distinct_table": "ott_kpi_distinct"}))
+    calls = []
+    monkeypatch.setattr(loaders, "rebuild_kpi_summary", lambda *args: calls.append(("rebuild",)))
+    monkeypatch.setattr(loaders, "refresh_kpi_summary", lambda *args: calls.append(("refresh",) + args[-2:]))
+    monkeypatch.setattr(loaders, "save_load_state", lambda conn, table, **state: calls.append(("save", state["high_water_mark"])))
+
+    def run(loads, summary_state):
+        monkeypatch.setattr(loaders, "get_table_loads", lambda conn, table: loads)
+        monkeypatch.setattr(loaders, "get_load_state", lambda conn, table: summary_state)
+        loaders.ConsumptionLoader(str(config_path), conn=Connection()).run_pipeline()
+        return calls
+    return run
+
+def test_scd2_appends_refresh_from_the_recorded_load(refresh):
+    calls = refresh({"high_water_mark": T1, "last_load_at": T3}, {"high_water_mark": T2})
+    assert calls == [("refresh", T2, T3), ("save", T3)]
+
+def test_rewritten_fact_table_is_rebuilt_in_full(refresh):
+    calls = refresh({"high_water_mark": T3, "last_load_at": T3}, {"high_water_mark": T2})
+    assert calls == [("rebuild",), ("save", T3)]
+
+def test_current_summary_is_left_alone(refresh):
+    assert refresh({"high_water_mark": T1, "last_load_at": T2}, {"high_water_mark": T2}) == []
+
+def test_unrecorded_fact_loads_rebuild_without_a_watermark(refresh):
+    assert refresh(None, {"high_water_mark": T2}) == [("rebuild",)]
@@ -0,0 +1,58 @@
+# Run Command: python -m pytest tests
+import threading
+import pytest
+import orchestrator
+
+JOBS = {
+    "netflix_stg": {"run_layer": "stage"},
+    "hulu_stg": {"run_layer": "stage"},
+    "fact_ott_processed": {"run_layer": "processed"},
+    "genre_processed": {"run_layer": "processed", "depends_on": ["fact_ott_processed"]},
+    "ott_kpi_summary_consumption": {"run_layer": "consumption"},
+}
+
+@pytest.fixture
+def jobs_run(monkeypatch):
+    """Replace the job runner: records the order jobs start in and fails the keys in failing."""
+    started, failing, lock = [], set(), threading.Lock()
+    def timed_job(key):
+        with lock:
+            started.append(key)
+        if key in failing:
+            raise RuntimeError(f"{key} failed")
+        return 0.0
+    monkeypatch.setattr(orchestrator, "timed_job", timed_job)
+    return started, failing
+
+def test_build_dag_follows_layers_and_explicit_dependencies():
+    dag = orchestrator.build_dag(JOBS)
+    assert dag["netflix_stg"] == set()
+    assert dag["fact_ott_processed"] == {"netflix_stg", "hulu_stg"}
+    assert dag["genre_processed"] == {"netflix_stg", "hulu_stg", "fact_ott_processed"}
+    assert dag["ott_kpi_summary_consumption"] == {"netflix_stg", "hulu_stg", "fact_ott_processed", "genre_processed"}
+
+def test_build_dag_rejects_cycles_and_unknown_dependencies():
+    with pytest.raises(ValueError, match="cycle"):
+        orchestrator.build_dag({"a": {"run_layer": "stage", "depends_on": ["b"]}, "b": {"run_layer": "stage", "depends_on": ["a"]}})
+    with pytest.raises(ValueError, match="unknown"):
+        orchestrator.build_dag({"a": {"run_layer": "stage", "depends_on": ["missing"]}})
+    with pytest.raises(ValueError, match="run_layer"):
+        orchestrator.build_dag({"a": {"run_layer": "raw"}})
+
+def test_jobs_start_after_their_dependencies(jobs_run):
+    started, _ = jobs_run
+    dag = orchestrator.build_dag(JOBS)
+    results = orchestrator.run_dag(dag, workers=3)
+    assert {status for status, _ in results.values()} == {"success"}
+    for key, deps in dag.items():
+        assert all(started.index(dep) < started.index(key) for dep in deps)
+
+def test_failed_job_skips_only_its_descendants(jobs_run):
+    started, failing = jobs_run
+    failing.add("fact_ott_processed")
+    jobs = {**JOBS, "other_processed": {"run_layer": "processed"}}
+    results = orchestrator.run_dag(orchestrator.build_dag(jobs), workers=2)
+    assert results["fact_ott_processed"][0] == "failed"
+    assert results["genre_processed"][0] == "skipped" and results["ott_kpi_summary_consumption"][0] == "skipped"
+    assert results["other_processed"][0] == "success" and results["hulu_stg"][0] == "success"
+    assert "genre_processed" not in started
@@ -0,0 +1,18 @@
+# Run Command: python -m pytest tests
+import pandas as pd
+from code.utils.scd_utils import scd2_changes
+
+EXISTING = pd.DataFrame({"id": [1, 2, 3], "name": ["a", "b", "c"], "plan": ["basic", "premium", None]})
+
+def test_scd2_changes_keeps_new_and_changed_rows():
+    new = pd.DataFrame({"id": [1, 2, 4], "name": ["a", "B", "d"], "plan": ["basic", "premium", "basic"]})
+    for mode in ("md5", "fast"):
+        changes = scd2_changes(new, EXISTING, ["id"], mode)
+        assert changes["id"].tolist() == [2, 4]
+        assert changes["_merge"].tolist() == ["both", "left_only"]
+        assert changes["name_existing"].iloc[0] == "b"
+
+def test_scd2_changes_tells_null_from_empty():
+    new = pd.DataFrame({"id": [3], "name": ["c"], "plan": [""]})
+    assert scd2_changes(new, EXISTING, ["id"])["id"].tolist() == [3]
+    assert scd2_changes(EXISTING, EXISTING, ["id"]).empty
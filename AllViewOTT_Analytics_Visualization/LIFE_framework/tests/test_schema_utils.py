@@ -0,0 +1,64 @@
+# Run Command: python -m pytest tests
+import pandas as pd
+import pytest
+from code.utils.schema_utils import compile_schema, null_key_reasons, REJECT_COLUMN
+
+SCHEMA = """column_name,data_type,format,nullable,min,max,allowed_values
+show_id,str,,false,,,
+type,str,,,,,Movie|TV Show
+release_year,int,,,1900,2100,
+rating,float,,,,,
+is_original,bool,,,,,
+date_added,datetime,,,,,
+"""
+
+@pytest.fixture
+def schema(tmp_path):
+    path = tmp_path / "schema_test.csv"
+    path.write_text(SCHEMA)
+    return compile_schema(str(path))
+
+def raw(**columns):
+    base = {"show_id": "s1", "type": "Movie", "release_year": "2020", "rating": "7.5", "is_original": "yes", "date_added": "25/09/21"}
+    return pd.DataFrame([{**base, **row} for row in columns.get("rows", [{}])], dtype=object)
+
+def test_clean_rows_are_cast_to_the_schema_types(schema):
+    valid, rejects = schema.apply(raw(rows=[{}, {"release_year": None, "is_original": "N"}]))
+    assert rejects.empty
+    assert str(valid["release_year"].dtype) == "Int64" and valid["release_year"].tolist()[0] == 2020
+    assert valid["rating"].dtype == float
+    assert valid["is_original"].tolist() == [True, False]
+    assert valid["date_added"].tolist()[0] == pd.Timestamp("2021-09-25")
+
+def test_rejected_rows_carry_the_first_failing_rule(schema):
+    frame = raw(rows=[
+        {},
+        {"show_id": None},
+        {"type": "Podcast"},
+        {"release_year": "20x0"},
+        {"release_year": "1850"},
+        {"release_year": "2020.5"},
+        {"rating": "high"},
+        {"is_original": "maybe"},
+        {"date_added": "2021-09-25"},
+        {"show_id": None, "rating": "high"},
+    ])
+    valid, rejects = schema.apply(frame)
+    assert len(valid) == 1 and str(valid["release_year"].dtype) == "int64"
+    assert rejects[REJECT_COLUMN].tolist() == [
+        "null_value:show_id", "not_allowed:type", "invalid_type:release_year", "out_of_range:release_year",
+        "invalid_type:release_year", "invalid_type:rating", "invalid_type:is_original", "invalid_date:date_added",
+        "null_value:show_id",
+    ]
+    # Rejected rows keep their raw values for the reject file
+    assert rejects["release_year"].tolist()[2] == "20x0"
+
+def test_unsupported_type_fails_the_compile(tmp_path):
+    path = tmp_path / "schema_bad.csv"
+    path.write_text("column_name,data_type\nshow_id,uuid\n")
+    with pytest.raises(ValueError):
+        compile_schema(str(path))
+
+def test_null_key_reasons_name_the_first_null_key():
+    frame = pd.DataFrame({"show_id": ["s1", None, None], "title": ["a", "b", None]})
+    assert null_key_reasons(frame, ["show_id", "title"]).tolist() == [None, "null_key:show_id", "null_key:show_id"]
@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+import pandas as pd
+from psycopg2 import sql
+from psycopg2.pool import ThreadedConnectionPool
+
+# One pass over the view: the grand total feeds the KPI tiles, the per-platform and per-month
+# grouping sets feed the charts. AVG ignores NULLs the same way pandas mean() skips NaN.
+SUMMARY_QUERY = """
+SELECT
+    ott_platform,
+    content_added_month,
+    GROUPING(ott_platform) AS by_platform,
+    GROUPING(content_added_month) AS by_month,
+    SUM(total_titles) AS total_titles,
+    SUM(total_movies) AS total_movies,
+    SUM(total_tv_shows) AS total_tv_shows,
+    SUM(unique_countries) AS unique_countries,
+    SUM(unique_directors) AS unique_directors,
+    AVG(avg_movie_duration_min) AS avg_movie_duration_min,
+    AVG(avg_tvshow_seasons) AS avg_tvshow_seasons
+FROM {view}
+WHERE ott_platform = ANY(%(platforms)s) AND release_year BETWEEN %(year_from)s AND %(year_to)s
+GROUP BY GROUPING SETS ((), (ott_platform), (content_added_month))
+"""
+
+FILTER_OPTIONS_QUERY = """
+SELECT
+    ARRAY_AGG(DISTINCT ott_platform ORDER BY ott_platform) AS platforms,
+    MIN(release_year) AS min_year,
+    MAX(release_year) AS max_year
+FROM {view}
+"""
+
+class DashboardDataService:
+    """Pooled, parameterised access to the KPI summary; all filtering and aggregation runs in Postgres."""
+    def __init__(self, db_config, view_schema, view_name, minconn=1, maxconn=5):
+        self.pool = ThreadedConnectionPool(
+            minconn, maxconn,
+            dbname=db_config["dbname"],
+            user=db_config["user"],
+            password=db_config["password"],
+            host=db_config["host"],
+            port=db_config["port"]
+        )
+        self.view = sql.SQL("{}.{}").format(sql.Identifier(view_schema), sql.Identifier(view_name))
+
+    @contextmanager
+    def connection(self):
+        conn = self.pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def _fetch(self, query, params=None):
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(sql.SQL(query).format(view=self.view), params)
+            columns = [desc[0] for desc in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    def filter_options(self):
+        """Platforms and release year bounds for the sidebar widgets."""
+        row = self._fetch(FILTER_OPTIONS_QUERY).iloc[0]
+        return list(row["platforms"] or []), int(row["min_year"]), int(row["max_year"])
+
+    def summary(self, platforms, year_range):
+        """
+        KPI totals plus the per-platform and monthly chart series for one filter state,
+        returned as (kpis, by_platform, by_month).
+        """
+        df = self._fetch(SUMMARY_QUERY, {"platforms": list(platforms), "year_from": year_range[0], "year_to": year_range[1]})
+        numeric = df.columns.drop(["ott_platform", "content_added_month", "by_platform", "by_month"])
+        df[numeric] = df[numeric].astype(float)
+
+        totals = df[(df["by_platform"] == 1) & (df["by_month"] == 1)]
+        kpis = totals.iloc[0][numeric].astype(float) if not totals.empty else pd.Series(0.0, index=numeric)
+        by_platform = df[(df["by_platform"] == 0) & (df["by_month"] == 1)].sort_values("ott_platform").reset_index(drop=True)
+        by_month = df[(df["by_platform"] == 1) & (df["by_month"] == 0) & df["content_added_month"].notna()].sort_values("content_added_month").reset_index(drop=True)
+        return kpis.fillna(0), by_platform, by_month
+
+    def close(self):
+        self.pool.closeall()
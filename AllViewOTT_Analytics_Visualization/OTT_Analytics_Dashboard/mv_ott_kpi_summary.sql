@@ -33,4 +33,8 @@ SELECT
     release_year
 
 FROM base
-GROUP BY ott_platform, content_added_month, release_year
\ No newline at end of file
+GROUP BY ott_platform, content_added_month, release_year;
+
+-- Supports the dashboard's platform / release year filter pushdown
+CREATE INDEX mv_ott_kpi_summary_platform_year_idx
+    ON project_analytics.consumption.mv_ott_kpi_summary (ott_platform, release_year);
\ No newline at end of file
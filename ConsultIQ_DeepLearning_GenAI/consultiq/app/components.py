@@ -0,0 +1,94 @@
+import threading
+import time
+from app.config import SERVICE_ROLE, PATIENT_INDEX_DIR
+from app.utils.metrics import log_event
+
+# Components each role needs, in warm-up order
+ROLES = {
+    "all": ["retriever", "text_processor", "embedder", "context_builder", "response_cache", "llm_client",
+            "audio_processor", "transcription_queue"],
+    "query": ["retriever", "text_processor", "embedder", "context_builder", "response_cache", "llm_client"],
+    "ingest": ["audio_processor", "transcription_queue"],
+}
+
+
+class Components:
+    """
+    Builds each service component on first use and only if the role needs it, so a query-only
+    replica never imports torch or transformers for ASR. Model modules are imported inside
+    the builders for the same reason.
+    """
+    def __init__(self, role=SERVICE_ROLE):
+        if role not in ROLES:
+            raise ValueError(f"Unsupported service role {role}. Expected one of {list(ROLES)}.")
+        self.role = role
+        self.instances = {}
+        self.load_seconds = {}
+        self.locks = {name: threading.Lock() for name in ROLES[role]}
+
+    def _build_audio_processor(self):
+        from app.models.audio_processor import AudioProcessor
+        return AudioProcessor()
+
+    def _build_transcription_queue(self):
+        from app.models.transcription_queue import TranscriptionQueue
+        return TranscriptionQueue(self.get("audio_processor"))
+
+    def _build_text_processor(self):
+        from app.models.text_processor import TextProcessor
+        return TextProcessor()
+
+    def _build_embedder(self):
+        from app.models.embedder import Embedder
+        return Embedder()
+
+    def _build_retriever(self):
+        from app.models.retriever import Retriever
+        retriever = Retriever(store_dir=PATIENT_INDEX_DIR)
+        retriever.load_all()
+        return retriever
+
+    def _build_context_builder(self):
+        from app.models.context_builder import ContextBuilder
+        return ContextBuilder(self.get("retriever"), self.get("embedder"))
+
+    def _build_llm_client(self):
+        from app.models.llm_client import LLMClient
+        return LLMClient()
+
+    def _build_response_cache(self):
+        from app.models.response_cache import ResponseCache
+        return ResponseCache()
+
+    def available(self, name):
+        return name in self.locks
+
+    def get(self, name):
+        if name in self.instances:
+            return self.instances[name]
+        if not self.available(name):
+            raise RuntimeError(f"{name} is not available in the '{self.role}' service role.")
+        with self.locks[name]:
+            if name not in self.instances:
+                start = time.perf_counter()
+                self.instances[name] = getattr(self, f"_build_{name}")()
+                self.load_seconds[name] = time.perf_counter() - start
+                log_event("component_loaded", component=name, role=self.role, seconds=round(self.load_seconds[name], 3))
+        return self.instances[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_") or not any(name in names for names in ROLES.values()):
+            raise AttributeError(name)
+        return self.get(name)
+
+    def warm_up(self):
+        """Load every component of the role; a failing one is reported and retried on first use."""
+        for name in ROLES[self.role]:
+            try:
+                self.get(name)
+            except Exception as e:
+                log_event("warm_up_failed", component=name, role=self.role, error=str(e))
+
+    def shutdown(self):
+        if "transcription_queue" in self.instances:
+            self.instances["transcription_queue"].shutdown()
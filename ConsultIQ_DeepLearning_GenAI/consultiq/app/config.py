@@ -1,5 +1,70 @@
 import os
 
 DATA_DIR = os.path.join(os.getcwd(), 'data')
-INDEX_PATH = os.path.join(os.getcwd(), 'vectorstore', 'faiss_index.bin')
-TRANSCRIPT_DIR = os.path.join(DATA_DIR, 'transcripts')
\ No newline at end of file
+PATIENT_INDEX_DIR = os.path.join(os.getcwd(), 'vectorstore', 'patients')
+TRANSCRIPT_DIR = os.path.join(DATA_DIR, 'transcripts')
+
+# Embedding service
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 64))
+EMBED_MAX_WAIT_MS = float(os.getenv('EMBED_MAX_WAIT_MS', 5))
+EMBED_CACHE_SIZE = int(os.getenv('EMBED_CACHE_SIZE', 10000))
+EMBED_CACHE_DIR = os.path.join(os.getcwd(), 'vectorstore', 'embeddings')
+
+# CPU inference backend of the embedding and ASR models: 'torch' (fp32), 'int8' (torch dynamic quantization)
+# or 'onnx' (ONNX Runtime on a model exported once into ONNX_MODEL_DIR); 0 intra-op threads means one per core
+EMBED_BACKEND = os.getenv('EMBED_BACKEND', 'torch')
+ASR_MODEL = os.getenv('ASR_MODEL', 'facebook/wav2vec2-base-960h')
+ASR_BACKEND = os.getenv('ASR_BACKEND', 'torch')
+ONNX_MODEL_DIR = os.path.join(os.getcwd(), 'vectorstore', 'onnx')
+ONNX_INTRA_OP_THREADS = int(os.getenv('ONNX_INTRA_OP_THREADS', 0))
+
+# Vector index: 'flat' (exact), 'ivf', 'hnsw' or 'ivfpq'; metric 'l2', 'ip' (inner product) or 'cosine'.
+# Indices are per patient and stay flat until they can be trained: ivf from 39 vectors, ivfpq from
+# 39 * 2**PQ_NBITS (9984 at 8 bits), more chunks than one consultation transcript produces
+INDEX_TYPE = os.getenv('INDEX_TYPE', 'flat')
+INDEX_METRIC = os.getenv('INDEX_METRIC', 'l2')
+INDEX_TRAIN_SAMPLE = int(os.getenv('INDEX_TRAIN_SAMPLE', 50000))
+IVF_NLIST = int(os.getenv('IVF_NLIST', 1024))
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', 16))
+HNSW_M = int(os.getenv('HNSW_M', 32))
+HNSW_EF_CONSTRUCTION = int(os.getenv('HNSW_EF_CONSTRUCTION', 200))
+HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', 64))
+PQ_M = int(os.getenv('PQ_M', 48))
+PQ_NBITS = int(os.getenv('PQ_NBITS', 8))
+
+# Transcription: overlapping windows batched through Wav2Vec2 by a background worker pool
+TRANSCRIBE_WINDOW_S = float(os.getenv('TRANSCRIBE_WINDOW_S', 30))
+TRANSCRIBE_OVERLAP_S = float(os.getenv('TRANSCRIBE_OVERLAP_S', 2))
+TRANSCRIBE_BATCH_SIZE = int(os.getenv('TRANSCRIBE_BATCH_SIZE', 4))
+TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', 1))
+# Finished jobs stay queryable on /jobs/{job_id} for this long, then are forgotten
+TRANSCRIBE_JOB_TTL_S = float(os.getenv('TRANSCRIBE_JOB_TTL_S', 3600))
+
+# LLM client: 'gemini', or 'fake' for a local stand-in that streams canned tokens
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-2.0-flash')
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+LLM_TIMEOUT_S = float(os.getenv('LLM_TIMEOUT_S', 60))
+LLM_RETRIES = int(os.getenv('LLM_RETRIES', 2))
+LLM_BACKOFF_S = float(os.getenv('LLM_BACKOFF_S', 0.5))
+
+# Semantic response cache: answers are reused for a query at least this cosine-similar to a cached one
+RESPONSE_CACHE_THRESHOLD = float(os.getenv('RESPONSE_CACHE_THRESHOLD', 0.95))
+RESPONSE_CACHE_TTL_S = float(os.getenv('RESPONSE_CACHE_TTL_S', 3600))
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1000))
+
+# Service role: 'all', 'query' (retrieval + LLM, no ASR) or 'ingest' (transcription only).
+# With WARMUP the role's components load in the startup hook instead of on first use.
+SERVICE_ROLE = os.getenv('SERVICE_ROLE', 'all')
+WARMUP = os.getenv('WARMUP', '1') == '1'
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+MONGO_TIMEOUT_MS = int(os.getenv('MONGO_TIMEOUT_MS', 2000))
+
+# Retrieval: top-k candidates, optional rerank ('none', 'mmr' or 'cross-encoder'), then packed into a token budget
+RETRIEVAL_CANDIDATES = int(os.getenv('RETRIEVAL_CANDIDATES', 8))
+RERANKER = os.getenv('RERANKER', 'mmr')
+MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', 0.7))
+CROSS_ENCODER_MODEL = os.getenv('CROSS_ENCODER_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 1500))
+CHARS_PER_TOKEN = float(os.getenv('CHARS_PER_TOKEN', 4))
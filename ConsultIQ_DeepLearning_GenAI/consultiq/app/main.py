@@ -1,56 +1,206 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
+import json
 import os
+from collections import defaultdict
+from contextlib import asynccontextmanager
 
-from app.models.audio_processor import AudioProcessor
-from app.models.text_processor import TextProcessor
-from app.models.embedder import Embedder
-from app.models.retriever import Retriever
-from app.models.llm_client import LLMClient
-from app.utils.helpers import get_audio_path, get_transcript_path
-from app.config import INDEX_PATH
+from app.components import Components
+from app.models.transcription_queue import FAILED
+from app.utils.helpers import get_audio_path, get_transcript_path, file_signature
+from app.utils.metrics import registry, log_event, CONTENT_TYPE
+from app.config import WARMUP
 import asyncio
 
-app = FastAPI()
+components = Components()
+# One indexing pass per patient at a time; concurrent queries wait for it instead of repeating it
+index_locks = defaultdict(asyncio.Lock)
+component_locks = defaultdict(asyncio.Lock)
+
+@asynccontextmanager
+async def lifespan(app):
+    if WARMUP:
+        await asyncio.to_thread(components.warm_up)
+    yield
+    components.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 class UserQuery(BaseModel):
     patient_id: str
     query: str
 
-audio_processor = AudioProcessor()
-text_processor = TextProcessor()
-embedder = Embedder()
-retriever = Retriever(index_path=INDEX_PATH)
-llm_client = LLMClient()
+class IngestRequest(BaseModel):
+    patient_id: str
 
-@app.post("/query")
-async def query_patient(user_query: UserQuery):
-    audio_path = get_audio_path(user_query.patient_id)
-    transcript_path = get_transcript_path(user_query.patient_id)
+async def component(name):
+    """
+    The named component, or 503 when this service role does not run it. One not loaded yet
+    (warm-up off or failed) is built on a worker thread, one build per name at a time, so
+    loading a model never blocks the event loop.
+    """
+    if not components.available(name):
+        raise HTTPException(status_code=503, detail=f"{name} is not available in the '{components.role}' service role.")
+    if name not in components.instances:
+        async with component_locks[name]:
+            return await asyncio.to_thread(components.get, name)
+    return components.get(name)
+
+def pending_response(job):
+    return JSONResponse(status_code=202, content={"detail": "Transcript is being prepared, retry shortly.", **job.to_dict()})
+
+@app.post("/ingest", status_code=202)
+async def ingest_patient(request: IngestRequest):
+    audio_path = get_audio_path(request.patient_id)
+    transcript_path = get_transcript_path(request.patient_id)
 
     if not os.path.exists(audio_path):
         raise HTTPException(status_code=404, detail="Patient audio file not found.")
-    
-    # Load transcript if already exists
     if os.path.exists(transcript_path):
-        with open(transcript_path, "r") as f:
-            transcription = f.read()
-    else:
-        transcription = audio_processor.transcribe(audio_path)
-        with open(transcript_path, "w") as f:
-            f.write(transcription)
+        return JSONResponse(status_code=200, content={"patient_id": request.patient_id, "status": "done"})
+    transcription_queue = await component("transcription_queue")
+    return transcription_queue.submit(request.patient_id, audio_path, transcript_path).to_dict()
 
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    transcription_queue = await component("transcription_queue")
+    job = transcription_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Transcription job not found.")
+    return job.to_dict()
+
+async def index_transcript(patient_id, transcript_path, source):
+    """
+    Bring the patient's index up to the current transcript: a transcript that only grew gets its
+    new chunks added, any other change rebuilds the index so chunks of an older version stop
+    being retrieved. Chunks seen before come from the embedding cache and are not re-encoded.
+    Indexing and persisting run on a worker thread, off the event loop.
+    """
+    with open(transcript_path, "r") as f:
+        transcription = f.read()
+    retriever = await component("retriever")
+    text_processor = await component("text_processor")
     chunks = text_processor.split_text(transcription)
-    retriever.load_index()
-    if retriever.index is None:
-        chunk_embeddings = embedder.embed_text(chunks)
-        retriever.build_index(chunk_embeddings, chunks)
-        print("Built FAISS index from scratch.")
+    embedder = await component("embedder")
+    appended = retriever.appended_documents(patient_id, chunks)
+    if appended is not None:
+        chunk_embeddings = await embedder.aembed(appended)
+        await asyncio.to_thread(retriever.add_documents, patient_id, chunk_embeddings, appended, source)
     else:
-        print("Loaded existing FAISS index.")
-    
-    query_embedding = embedder.embed_text([user_query.query])[0]
-    relevant_chunks = retriever.search(query_embedding, top_k=1)
+        chunk_embeddings = await embedder.aembed(chunks)
+        await asyncio.to_thread(retriever.replace_documents, patient_id, chunk_embeddings, chunks, source)
+    response_cache = await component("response_cache")
+    response_cache.invalidate(patient_id)
+    log_event("chunks_indexed", patient_id=patient_id, chunks=len(chunks))
+
+async def retrieve_context(user_query: UserQuery):
+    """
+    (context, cache key, query embedding) for the query, where the context is the best transcript
+    chunks that fit the token budget, or a 202 response while the transcript is pending.
+    """
+    audio_path = get_audio_path(user_query.patient_id)
+    transcript_path = get_transcript_path(user_query.patient_id)
+
+    if not os.path.exists(audio_path):
+        raise HTTPException(status_code=404, detail="Patient audio file not found.")
+    retriever = await component("retriever")
+    embedder = await component("embedder")
+
+    # The transcript is only read and split when it differs from the one the patient's index was built from
+    source = file_signature(transcript_path)
+    if source is None:
+        # Transcribing runs on the worker pool, or on the ingest service for query-only replicas;
+        # the client polls /jobs/{job_id} or retries the query
+        if not components.available("transcription_queue"):
+            return JSONResponse(status_code=202, content={"detail": "Transcript has not been ingested yet.",
+                                                          "patient_id": user_query.patient_id, "status": "pending"})
+        transcription_queue = await component("transcription_queue")
+        job = transcription_queue.job_for_patient(user_query.patient_id)
+        if job is not None and job.status == FAILED:
+            raise HTTPException(status_code=500, detail=f"Transcription failed: {job.error}")
+        return pending_response(transcription_queue.submit(user_query.patient_id, audio_path, transcript_path))
+    if source != retriever.indexed_source(user_query.patient_id):
+        async with index_locks[user_query.patient_id]:
+            # Another request may have indexed this transcript while we waited
+            if source != retriever.indexed_source(user_query.patient_id):
+                await index_transcript(user_query.patient_id, transcript_path, source)
+
+    query_embedding = (await embedder.aembed([user_query.query]))[0]
+    context_builder = await component("context_builder")
+    context, chunk_ids, _ = await context_builder.build(user_query.patient_id, user_query.query, query_embedding)
+
+    cache_key = (user_query.patient_id, retriever.index_version(user_query.patient_id), tuple(chunk_ids))
+    return context, cache_key, query_embedding
+
+def cacheable(response):
+    return not response.startswith("[LLM Error]")
+
+@app.post("/query")
+async def query_patient(user_query: UserQuery):
+    retrieved = await retrieve_context(user_query)
+    if isinstance(retrieved, JSONResponse):
+        return retrieved
+    context, cache_key, query_embedding = retrieved
+    response_cache = await component("response_cache")
+
+    response = response_cache.get(cache_key, query_embedding)
+    if response is not None:
+        return {"response": response, "cached": True}
+    llm_client = await component("llm_client")
+    response = await llm_client.generate_response(context, user_query.query)
+    if cacheable(response):
+        response_cache.put(cache_key, query_embedding, response)
+    return {"response": response, "cached": False}
+
+@app.post("/query/stream")
+async def query_patient_stream(user_query: UserQuery):
+    """Same as /query, but the answer is sent as server-sent events while it is generated."""
+    retrieved = await retrieve_context(user_query)
+    if isinstance(retrieved, JSONResponse):
+        return retrieved
+    context, cache_key, query_embedding = retrieved
+    response_cache = await component("response_cache")
+    llm_client = await component("llm_client")
+
+    async def events():
+        cached = response_cache.get(cache_key, query_embedding)
+        if cached is not None:
+            yield f"data: {json.dumps({'token': cached})}\n\n"
+            yield f"event: done\ndata: {json.dumps({'cached': True})}\n\n"
+            return
+        try:
+            pieces = []
+            async for piece in llm_client.stream_response(context, user_query.query):
+                pieces.append(piece)
+                yield f"data: {json.dumps({'token': piece})}\n\n"
+            response_cache.put(cache_key, query_embedding, "".join(pieces).strip())
+            yield f"event: done\ndata: {json.dumps({'cached': False})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e) or type(e).__name__})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/health")
+async def health():
+    return {"role": components.role, "load_seconds": components.load_seconds}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage latency histograms and error counters in the Prometheus text format."""
+    return PlainTextResponse(registry.expose(), media_type=CONTENT_TYPE)
+
+@app.get("/metrics/llm")
+async def llm_metrics():
+    llm_client = await component("llm_client")
+    return llm_client.metrics.snapshot()
+
+@app.get("/metrics/retrieval")
+async def retrieval_metrics():
+    context_builder = await component("context_builder")
+    return context_builder.snapshot()
 
-    response = await llm_client.generate_response(relevant_chunks[0], user_query.query)
-    return {"response": response}
+@app.get("/metrics/cache")
+async def cache_metrics():
+    response_cache = await component("response_cache")
+    return response_cache.snapshot()
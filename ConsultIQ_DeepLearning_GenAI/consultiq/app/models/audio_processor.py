@@ -1,25 +1,74 @@
-from transformers import Wav2Vec2ForCTC, Wav2Vec2Tokenizer
+from transformers import Wav2Vec2Tokenizer
 import torch
 import librosa
+import math
+import numpy as np
 import os
+from app.config import ASR_MODEL, ASR_BACKEND, TRANSCRIBE_WINDOW_S, TRANSCRIBE_OVERLAP_S, TRANSCRIBE_BATCH_SIZE
+from app.models.inference import OnnxCTCModel, load_ctc_model
+
+SAMPLE_RATE = 16000
+# Wav2Vec2's feature encoder emits one CTC frame per 320 samples (20 ms)
+FRAME_SAMPLES = 320
 
 class AudioProcessor:
-    def __init__(self):
-        self.model_name = "facebook/wav2vec2-base-960h"
+    def __init__(self, window_seconds=TRANSCRIBE_WINDOW_S, overlap_seconds=TRANSCRIBE_OVERLAP_S, batch_size=TRANSCRIBE_BATCH_SIZE,
+                 model_name=ASR_MODEL, backend=ASR_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
         self.tokenizer = Wav2Vec2Tokenizer.from_pretrained(self.model_name)
-        self.model = Wav2Vec2ForCTC.from_pretrained(self.model_name)
+        self.model = load_ctc_model(self.model_name, backend)
+        # Whole CTC frames on both sides keep every window's frames aligned to one global frame grid
+        self.window = int(window_seconds * SAMPLE_RATE) // FRAME_SAMPLES * FRAME_SAMPLES
+        self.overlap = int(overlap_seconds * SAMPLE_RATE) // (2 * FRAME_SAMPLES) * 2 * FRAME_SAMPLES
+        if self.overlap >= self.window:
+            raise ValueError("Transcription window must be longer than its overlap.")
+        self.batch_size = batch_size
+
+    def windows(self, audio):
+        """
+        Split audio into windows of self.window samples overlapping by self.overlap, as
+        (start, samples) pairs; the last window is zero padded to full length.
+        """
+        step = self.window - self.overlap
+        count = max(1, math.ceil((len(audio) - self.overlap) / step))
+        for i in range(count):
+            start = i * step
+            piece = audio[start:start + self.window]
+            yield start, np.pad(piece, (0, self.window - len(piece)))
+
+    def predict_ids(self, input_values):
+        """Greedy CTC token ids per frame of a batch of windows, on whichever backend the model runs."""
+        if isinstance(self.model, OnnxCTCModel):
+            return torch.from_numpy(self.model.logits(input_values.numpy()).argmax(axis=-1))
+        with torch.inference_mode():
+            return torch.argmax(self.model(input_values).logits, dim=-1)
 
     def transcribe(self, file_path: str) -> str:
-        audio, rate = librosa.load(file_path, sr=16000, duration=180)
-        input_values = self.tokenizer(audio, return_tensors="pt", padding="longest").input_values
-        with torch.no_grad():
-            logits = self.model(input_values).logits
-        predicted_ids = torch.argmax(logits, dim=-1)
-        transcription = self.tokenizer.batch_decode(predicted_ids)[0]
-        return transcription
+        """
+        Transcribe the whole file: overlapping windows go through the model in batches and
+        their CTC predictions are stitched at the middle of each overlap before one decode,
+        so words on a window boundary are neither lost nor repeated.
+        """
+        audio, rate = librosa.load(file_path, sr=SAMPLE_RATE)
+        windows = list(self.windows(audio))
+        trim = self.overlap // 2 // FRAME_SAMPLES
+        predicted = []
+        for batch_start in range(0, len(windows), self.batch_size):
+            batch = windows[batch_start:batch_start + self.batch_size]
+            input_values = self.tokenizer([samples for _, samples in batch], return_tensors="pt", padding="longest").input_values
+            ids = self.predict_ids(input_values)
+            for offset, (start, _) in enumerate(batch):
+                i = batch_start + offset
+                frames = ids[offset]
+                valid = math.ceil((min(len(audio), start + self.window) - start) / FRAME_SAMPLES)
+                first = trim if i > 0 else 0
+                last = min(valid, self.window // FRAME_SAMPLES - trim) if i < len(windows) - 1 else valid
+                predicted.append(frames[first:last])
+        return self.tokenizer.decode(torch.cat(predicted).tolist()) if predicted else ""
 
 # if __name__=="__main__":
 #     audio_path = "/Users/suryakurapati/Desktop/NCI/NCI-Notes/Deep Learning and Gen AI/Assignment/consultiq/data/ABC123.wav"
 #     audio_processor = AudioProcessor()
 #     transcription = audio_processor.transcribe(audio_path)
-#     print(type(transcription))
\ No newline at end of file
+#     print(type(transcription))
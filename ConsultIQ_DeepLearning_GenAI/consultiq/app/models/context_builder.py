@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+from collections import deque
+import numpy as np
+from app.config import (RETRIEVAL_CANDIDATES, RERANKER, MMR_LAMBDA, CROSS_ENCODER_MODEL,
+                        CONTEXT_TOKEN_BUDGET, CHARS_PER_TOKEN)
+from app.utils.metrics import STAGE_SECONDS
+
+RERANKERS = ("none", "mmr", "cross-encoder")
+STAGES = ("search", "dedup", "rerank", "pack", "total")
+CHUNK_SEPARATOR = "\n...\n"
+
+
+def estimate_tokens(text, chars_per_token=CHARS_PER_TOKEN):
+    """Rough token count; Gemini's tokenizer is not available locally."""
+    return int(len(text) / chars_per_token) + 1
+
+
+def overlap_length(previous, following):
+    """Length of the longest suffix of previous that is also a prefix of following."""
+    for length in range(min(len(previous), len(following)), 0, -1):
+        if previous.endswith(following[:length]):
+            return length
+    return 0
+
+
+def drop_duplicates(ids, docs):
+    """Drop chunks whose whitespace-normalised text is contained in a better ranked chunk."""
+    kept = []
+    for i, doc in zip(ids, docs):
+        normalised = " ".join(doc.split())
+        if not any(normalised in other for _, _, other in kept):
+            kept.append((i, doc, normalised))
+    return [i for i, _, _ in kept], [doc for _, doc, _ in kept]
+
+
+def mmr_order(query_embedding, doc_embeddings, mmr_lambda=MMR_LAMBDA):
+    """Maximal marginal relevance ranking: relevance to the query traded off against redundancy with chunks ranked above."""
+    docs = doc_embeddings / np.maximum(np.linalg.norm(doc_embeddings, axis=1, keepdims=True), 1e-12)
+    query = query_embedding / max(np.linalg.norm(query_embedding), 1e-12)
+    relevance = docs @ query
+    similarity = docs @ docs.T
+    selected, remaining = [], list(range(len(docs)))
+    while remaining:
+        scores = relevance[remaining]
+        if selected:
+            scores = mmr_lambda * scores - (1 - mmr_lambda) * similarity[np.ix_(remaining, selected)].max(axis=1)
+        selected.append(remaining.pop(int(np.argmax(scores))))
+    return selected
+
+
+def pack(ids, docs, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Take chunks in rank order while they fit the token budget, then lay them out in transcript
+    order with the splitter's overlap between neighbouring chunks removed.
+    Returns (context, packed ids).
+    """
+    chosen, used = [], 0
+    for i, doc in zip(ids, docs):
+        cost = estimate_tokens(doc)
+        if used + cost <= token_budget:
+            chosen.append((i, doc))
+            used += cost
+    if not chosen and ids:
+        chosen = [(ids[0], docs[0][:int(token_budget * CHARS_PER_TOKEN)])]
+    chosen.sort()
+
+    parts = []
+    for position, (i, doc) in enumerate(chosen):
+        if position and chosen[position - 1][0] == i - 1:
+            parts[-1] += doc[overlap_length(chosen[position - 1][1], doc):]
+        else:
+            parts.append(doc)
+    return CHUNK_SEPARATOR.join(parts), [i for i, _ in chosen]
+
+
+class ContextBuilder:
+    """
+    Turns a query into LLM context: one top-k FAISS search, duplicate removal, an optional
+    MMR or cross-encoder rerank and token-budgeted packing, timing every stage.
+    """
+    def __init__(self, retriever, embedder, candidates=RETRIEVAL_CANDIDATES, reranker=RERANKER,
+                 mmr_lambda=MMR_LAMBDA, token_budget=CONTEXT_TOKEN_BUDGET, window=1000):
+        if reranker not in RERANKERS:
+            raise ValueError(f"Unsupported reranker {reranker}. Expected one of {RERANKERS}.")
+        self.retriever = retriever
+        self.embedder = embedder
+        self.candidates = candidates
+        self.reranker = reranker
+        self.mmr_lambda = mmr_lambda
+        self.token_budget = token_budget
+        self.cross_encoder = None
+        self.lock = threading.Lock()
+        self.stage_seconds = {stage: deque(maxlen=window) for stage in STAGES}
+
+    def _cross_encoder(self):
+        with self.lock:
+            if self.cross_encoder is None:
+                from sentence_transformers import CrossEncoder
+                self.cross_encoder = CrossEncoder(CROSS_ENCODER_MODEL)
+        return self.cross_encoder
+
+    async def rerank(self, query, query_embedding, docs):
+        """Positions of docs in reranked order."""
+        if self.reranker == "none" or len(docs) < 2:
+            return list(range(len(docs)))
+        if self.reranker == "mmr":
+            # Chunk embeddings come back from the Embedder's cache, they were computed at indexing time
+            return mmr_order(np.asarray(query_embedding), await self.embedder.aembed(docs), self.mmr_lambda)
+        scores = await asyncio.to_thread(self._cross_encoder().predict, [(query, doc) for doc in docs])
+        return [int(i) for i in np.argsort(-np.asarray(scores))]
+
+    async def build(self, patient_id, query, query_embedding):
+        """(context, packed chunk ids, per-stage seconds) for the query."""
+        timings = {}
+        start = last = time.perf_counter()
+
+        def mark(stage):
+            nonlocal last
+            now = time.perf_counter()
+            timings[stage] = now - last
+            last = now
+
+        ids = self.retriever.search_ids(patient_id, query_embedding, self.candidates)
+        docs = self.retriever.documents(patient_id, ids)
+        mark("search")
+        ids, docs = drop_duplicates(ids, docs)
+        mark("dedup")
+        order = await self.rerank(query, query_embedding, docs)
+        ids, docs = [ids[i] for i in order], [docs[i] for i in order]
+        mark("rerank")
+        context, packed_ids = pack(ids, docs, self.token_budget)
+        mark("pack")
+        timings["total"] = last - start
+
+        for stage, seconds in timings.items():
+            self.stage_seconds[stage].append(seconds)
+            # The FAISS search itself is already recorded as stage="search" by the retriever
+            STAGE_SECONDS.observe(seconds, stage=f"context_{stage}")
+        return context, packed_ids, timings
+
+    def snapshot(self):
+        summary = {"candidates": self.candidates, "reranker": self.reranker, "token_budget": self.token_budget}
+        for stage, samples in self.stage_seconds.items():
+            values = np.array(samples) * 1000
+            summary[f"{stage}_ms"] = {"count": len(values)} if not len(values) else {
+                "count": len(values), "mean": float(values.mean()),
+                "p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95))}
+        return summary
@@ -1,9 +1,176 @@
-from sentence_transformers import SentenceTransformer
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
 import numpy as np
+from app.config import EMBEDDING_MODEL, EMBED_BACKEND, EMBED_BATCH_SIZE, EMBED_MAX_WAIT_MS, EMBED_CACHE_SIZE, EMBED_CACHE_DIR
+from app.utils.metrics import timed
+
+
+def content_key(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-hash keyed embeddings: an in-memory LRU in front of an append-only
+    float32 matrix on disk, read back through np.memmap.
+    """
+    def __init__(self, cache_dir, dim, max_items=EMBED_CACHE_SIZE):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.keys_path = os.path.join(cache_dir, "keys.txt")
+        self.meta_path = os.path.join(cache_dir, "meta.json")
+        self.dim = dim
+        self.max_items = max_items
+        self.memory = OrderedDict()
+        self.rows = {}
+        self.matrix = None
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                if json.load(f)["dim"] != self.dim:
+                    print(f"Embedding cache at {self.meta_path} has a different dimension, starting a new one.")
+                    for path in (self.vectors_path, self.keys_path):
+                        if os.path.exists(path):
+                            os.remove(path)
+        with open(self.meta_path, "w") as f:
+            json.dump({"dim": self.dim}, f)
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path) as f:
+            keys = f.read().split()
+        # Vectors are written before their keys, so a torn append leaves at most unreferenced rows
+        stored = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        self.rows = {key: row for row, key in enumerate(keys[:stored])}
+
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)
+
+    def get_many(self, keys):
+        """Cached vectors for whichever of keys are known, as {key: vector}."""
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[key] = self.memory[key]
+                elif key in self.rows:
+                    if self.matrix is None or self.matrix.shape[0] <= self.rows[key]:
+                        self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r").reshape(-1, self.dim)
+                    found[key] = np.array(self.matrix[self.rows[key]])
+                    self._remember(key, found[key])
+        return found
+
+    def put_many(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self.lock:
+            new = [i for i, key in enumerate(keys) if key not in self.rows]
+            if new:
+                with open(self.vectors_path, "ab") as f:
+                    f.write(vectors[new].tobytes())
+                with open(self.keys_path, "a") as f:
+                    f.write("".join(f"{keys[i]}\n" for i in new))
+                start = len(self.rows)
+                for offset, i in enumerate(new):
+                    self.rows[keys[i]] = start + offset
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+
+
+class MicroBatcher:
+    """
+    Merges concurrent requests into one call of encode(texts): the first request waits up
+    to max_wait_ms for others to join, or until batch_size texts are queued.
+    """
+    def __init__(self, encode, batch_size=EMBED_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS):
+        self.encode = encode
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self.worker = None
+
+    async def submit(self, texts):
+        loop = asyncio.get_running_loop()
+        if self.worker is None or self.worker.done():
+            self.queue = asyncio.Queue()
+            self.worker = loop.create_task(self._run())
+        future = loop.create_future()
+        await self.queue.put((texts, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.batch_size:
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            try:
+                vectors = await asyncio.to_thread(self.encode, [text for texts, _ in pending for text in texts])
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            start = 0
+            for texts, future in pending:
+                if not future.done():
+                    future.set_result(vectors[start:start + len(texts)])
+                start += len(texts)
+
 
 class Embedder:
-    def __init__(self):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(self, model_name=EMBEDDING_MODEL, model=None, cache_dir=EMBED_CACHE_DIR,
+                 batch_size=EMBED_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS, cache_size=EMBED_CACHE_SIZE, backend=EMBED_BACKEND):
+        if model is None:
+            from app.models.inference import load_sentence_model
+            model = load_sentence_model(model_name, backend)
+        self.model = model
+        self.backend = backend
+        self.batch_size = batch_size
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.cache = None
+        if cache_dir:
+            # Quantized and exported models drift slightly from fp32, so their vectors are cached apart
+            cache_name = model_name.replace("/", "_") + ("" if backend == "torch" else f"_{backend}")
+            self.cache = EmbeddingCache(os.path.join(cache_dir, cache_name), self.dim, cache_size)
+        self.batcher = MicroBatcher(self.embed_text, batch_size, max_wait_ms)
 
     def embed_text(self, texts):
-        return self.model.encode(texts)
+        """float32 embeddings of texts, encoding only the distinct texts not already cached in one batched call."""
+        keys = [content_key(text) for text in texts]
+        vectors = self.cache.get_many(keys) if self.cache else {}
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            encoded = self.model.encode(list(missing.values()), batch_size=self.batch_size,
+                                        convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+            if self.cache:
+                self.cache.put_many(list(missing), encoded)
+            vectors.update(zip(missing, encoded))
+        if not keys:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys])
+
+    @timed("embed")
+    async def aembed(self, texts):
+        """Async embed_text; cache misses from concurrent callers are encoded together by the micro-batcher."""
+        texts = list(texts)
+        if self.cache and len(self.cache.get_many([content_key(text) for text in texts])) == len(set(texts)):
+            return self.embed_text(texts)
+        return await self.batcher.submit(texts)
@@ -0,0 +1,163 @@
+import os
+import numpy as np
+from app.config import ONNX_MODEL_DIR, ONNX_INTRA_OP_THREADS
+from app.utils.metrics import log_event
+
+# 'torch': the model as published (fp32), 'int8': torch dynamic quantization of its Linear layers,
+# 'onnx': the model exported once to ONNX_MODEL_DIR and run by ONNX Runtime on CPU
+BACKENDS = ("torch", "int8", "onnx")
+ONNX_OPSET = 14
+
+
+def check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported inference backend {backend}. Expected one of {BACKENDS}.")
+    return backend
+
+
+def quantize_dynamic(model):
+    """int8 weights for every nn.Linear, activations quantized on the fly; CPU only."""
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def onnx_path(model_name, model_dir=ONNX_MODEL_DIR):
+    return os.path.join(model_dir, model_name.replace("/", "_") + ".onnx")
+
+
+def export_onnx(module, path, example_inputs, input_names, output_name, dynamic_axes):
+    """Trace module into path; written next to it first so a crashed export never leaves a half file."""
+    import torch
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(module, example_inputs, tmp_path, input_names=input_names, output_names=[output_name],
+                          dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET, do_constant_folding=True)
+    os.replace(tmp_path, path)
+    log_event("onnx_exported", path=path)
+
+
+def onnx_session(path, intra_op_threads=ONNX_INTRA_OP_THREADS):
+    """CPU InferenceSession with full graph optimization; intra_op_threads 0 lets ONNX Runtime use one per core."""
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise RuntimeError("The 'onnx' inference backend needs the onnxruntime package.") from e
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+class OnnxSentenceEncoder:
+    """
+    The SentenceTransformer interface Embedder uses (encode, get_sentence_embedding_dimension)
+    over an ONNX Runtime session of its transformer, with the model's own tokenizer, pooling
+    and normalization applied around it in numpy.
+    """
+    def __init__(self, session, tokenizer, dim, max_seq_length, pooling="mean", normalize=True):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.dim = dim
+        self.max_seq_length = max_seq_length
+        self.pooling = pooling
+        self.normalize = normalize
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        # Length-sorted batches keep padding short, as SentenceTransformer.encode does
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            tokens = self.tokenizer([texts[i] for i in rows], padding=True, truncation=True,
+                                    max_length=self.max_seq_length, return_tensors="np")
+            mask = tokens["attention_mask"].astype(np.int64)
+            hidden = self.session.run(None, {"input_ids": tokens["input_ids"].astype(np.int64), "attention_mask": mask})[0]
+            if self.pooling == "cls":
+                pooled = hidden[:, 0]
+            else:
+                pooled = (hidden * mask[..., None]).sum(axis=1) / np.clip(mask.sum(axis=1, keepdims=True), 1e-9, None)
+            vectors[rows] = pooled
+        if self.normalize:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+
+class OnnxCTCModel:
+    """Wav2Vec2ForCTC forward pass on ONNX Runtime: input_values (batch, samples) to logits (batch, frames, vocab)."""
+    def __init__(self, session):
+        self.session = session
+
+    def logits(self, input_values):
+        return self.session.run(None, {"input_values": np.asarray(input_values, dtype=np.float32)})[0]
+
+
+def _sentence_onnx(model_name, model, intra_op_threads):
+    import torch
+    from sentence_transformers.models import Normalize, Pooling
+
+    pooling = next((module for module in model if isinstance(module, Pooling)), None)
+    if pooling is not None and not (pooling.pooling_mode_mean_tokens or pooling.pooling_mode_cls_token):
+        raise ValueError(f"{model_name} pools with a mode the ONNX encoder does not implement; use 'torch' or 'int8'.")
+    mode = "cls" if pooling is not None and pooling.pooling_mode_cls_token else "mean"
+
+    path = onnx_path(model_name)
+    if not os.path.exists(path):
+        class HiddenStates(torch.nn.Module):
+            def __init__(self, transformer):
+                super().__init__()
+                self.transformer = transformer
+
+            def forward(self, input_ids, attention_mask):
+                return self.transformer(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+        example = model.tokenizer(["export example"], return_tensors="pt")
+        axes = {0: "batch", 1: "tokens"}
+        export_onnx(HiddenStates(model[0].auto_model.eval()), path, (example["input_ids"], example["attention_mask"]),
+                    ["input_ids", "attention_mask"], "last_hidden_state",
+                    {"input_ids": axes, "attention_mask": axes, "last_hidden_state": axes})
+    return OnnxSentenceEncoder(onnx_session(path, intra_op_threads), model.tokenizer, model.get_sentence_embedding_dimension(),
+                               model.max_seq_length, mode, any(isinstance(module, Normalize) for module in model))
+
+
+def load_sentence_model(model_name, backend, intra_op_threads=ONNX_INTRA_OP_THREADS):
+    """The SentenceTransformer of model_name on backend; onnx still reads its tokenizer and pooling from it, exporting on first use."""
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, device="cpu")
+    if check_backend(backend) == "int8":
+        return quantize_dynamic(model)
+    if backend == "onnx":
+        return _sentence_onnx(model_name, model, intra_op_threads)
+    return model
+
+
+def load_ctc_model(model_name, backend, intra_op_threads=ONNX_INTRA_OP_THREADS):
+    """Wav2Vec2ForCTC of model_name on backend, in eval mode; onnx returns an OnnxCTCModel."""
+    import torch
+    from transformers import Wav2Vec2ForCTC
+    check_backend(backend)
+    path = onnx_path(model_name)
+    if backend == "onnx" and os.path.exists(path):
+        return OnnxCTCModel(onnx_session(path, intra_op_threads))
+    model = Wav2Vec2ForCTC.from_pretrained(model_name).eval()
+    if backend == "int8":
+        return quantize_dynamic(model)
+    if backend == "onnx":
+        class Logits(torch.nn.Module):
+            def __init__(self, ctc):
+                super().__init__()
+                self.ctc = ctc
+
+            def forward(self, input_values):
+                return self.ctc(input_values).logits
+
+        export_onnx(Logits(model), path, (torch.zeros(1, 16000),), ["input_values"], "logits",
+                    {"input_values": {0: "batch", 1: "samples"}, "logits": {0: "batch", 1: "frames"}})
+        return OnnxCTCModel(onnx_session(path, intra_op_threads))
+    return model
@@ -1,37 +1,138 @@
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pymongo import MongoClient
-import google.generativeai as genai
 import asyncio
+import random
+import threading
 import time
+import numpy as np
+from app.config import (LLM_BACKEND, LLM_MODEL, LLM_MAX_CONCURRENCY, LLM_TIMEOUT_S, LLM_RETRIES, LLM_BACKOFF_S,
+                        GEMINI_API_KEY, MONGO_TIMEOUT_MS)
+from app.utils.metrics import STAGE_SECONDS, STAGE_ERRORS, LLM_TTFT_SECONDS, log_event
 
 
-class LLMClient:
-    def __init__(self, model_name="gemini-2.0-flash"):
-        self.model_name = model_name
-        self.api_key = self._load_api_key_from_mongo()
+_api_key = None
+_api_key_lock = threading.Lock()
+
+
+def load_api_key():
+    """
+    Gemini API key from GEMINI_API_KEY, else from MongoDB. A key found in Mongo is cached for
+    the life of the process; a failed lookup is not, so it is retried on the next call.
+    """
+    global _api_key
+    if GEMINI_API_KEY:
+        return GEMINI_API_KEY
+    with _api_key_lock:
+        if _api_key is None:
+            _api_key = _load_api_key_from_mongo()
+        return _api_key
+
+
+def _load_api_key_from_mongo():
+    connection_string = "mongodb://localhost:27017/"
+    database = "db_genai"
+    collection = "col_llm_conf"
+    query = {"_id": "gemini"}
+
+    try:
+        client = MongoClient(connection_string, serverSelectionTimeoutMS=MONGO_TIMEOUT_MS)
+        try:
+            doc = client[database][collection].find_one(query)
+        finally:
+            client.close()
+        return doc.get("api_key") if doc else None
+    except Exception as e:
+        print(f"[MongoDB Error] {e}")
+        return None
+
+
+class GeminiBackend:
+    def __init__(self, model_name=LLM_MODEL, timeout=LLM_TIMEOUT_S):
+        import google.generativeai as genai
+        self.api_key = load_api_key()
         if not self.api_key:
-            raise ValueError("Gemini API key not found in MongoDB.")
+            raise ValueError("Gemini API key not found in GEMINI_API_KEY or MongoDB.")
         genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(model_name=self.model_name)
+        self.model = genai.GenerativeModel(model_name=model_name)
+        self.timeout = timeout
 
-    def _load_api_key_from_mongo(self):
-        connection_string = "mongodb://localhost:27017/"
-        database = "db_genai"
-        collection = "col_llm_conf"
-        query = {"_id": "gemini"}
+    def stream(self, prompt):
+        """Blocking iterator over the text pieces of the answer as Gemini produces them."""
+        for chunk in self.model.generate_content(prompt, stream=True, request_options={"timeout": self.timeout}):
+            if chunk.text:
+                yield chunk.text
 
-        try:
-            client = MongoClient(connection_string)
-            db = client[database]
-            col = db[collection]
-            doc = col.find_one(query)
-            return doc.get("api_key") if doc else None
-        except Exception as e:
-            print(f"[MongoDB Error] {e}")
-            return None
 
-    async def generate_response(self, context: str, query: str) -> str:
-        prompt = f"""
+class FakeBackend:
+    """
+    Local stand-in for Gemini: streams a canned answer word by word after first_token_delay,
+    failing the first fail_first calls, so streaming, retries and timeouts run without a network.
+    """
+    def __init__(self, answer="This is a placeholder answer based on the consultation.", first_token_delay=0.2,
+                 token_delay=0.02, fail_first=0):
+        self.answer = answer
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.failures_left = fail_first
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def stream(self, prompt):
+        with self.lock:
+            self.calls += 1
+            fail = self.failures_left > 0
+            self.failures_left -= fail
+        time.sleep(self.first_token_delay)
+        if fail:
+            raise ConnectionError("Fake backend failure")
+        for i, word in enumerate(self.answer.split(" ")):
+            if i:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else f" {word}"
+
+
+class LLMMetrics:
+    """Rolling time-to-first-token and total latency samples plus request/error counters."""
+    def __init__(self, window=1000):
+        self.ttft = deque(maxlen=window)
+        self.total = deque(maxlen=window)
+        self.counts = {"requests": 0, "errors": 0, "retries": 0, "timeouts": 0, "in_flight": 0}
+
+    @staticmethod
+    def _summary(samples):
+        if not samples:
+            return {"count": 0}
+        values = np.array(samples)
+        return {"count": len(values), "mean": float(values.mean()),
+                "p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95))}
+
+    def snapshot(self):
+        return {**self.counts, "ttft_seconds": self._summary(self.ttft), "total_seconds": self._summary(self.total)}
+
+
+class LLMClient:
+    """
+    Streams answers from the backend through a bounded worker pool. At most max_concurrency
+    generations run at once; each attempt has a timeout and attempts that fail before the
+    first token are retried with exponential backoff and jitter.
+    """
+    def __init__(self, model_name=LLM_MODEL, backend=None, max_concurrency=LLM_MAX_CONCURRENCY,
+                 timeout=LLM_TIMEOUT_S, retries=LLM_RETRIES, backoff=LLM_BACKOFF_S):
+        self.model_name = model_name
+        if backend is None:
+            backend = FakeBackend() if LLM_BACKEND == "fake" else GeminiBackend(model_name, timeout)
+        self.backend = backend
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self.metrics = LLMMetrics()
+
+    def build_prompt(self, context: str, query: str) -> str:
+        return f"""
 You are a professional medical assistant. Based only on the following context, provide a helpful and accurate answer.
 
 Context:
@@ -42,10 +143,88 @@ User Query:
 
 Answer:"""
 
+    async def _stream_once(self, prompt, deadline):
+        """One attempt: the blocking backend iterator runs on the pool and hands pieces over through a queue."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            stream = self.backend.stream(prompt)
+            try:
+                for piece in stream:
+                    if stop.is_set():
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, piece)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                if not stop.is_set():
+                    loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                # Closing the backend's iterator ends its request instead of leaving it to run on
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+
+        worker = loop.run_in_executor(self.executor, produce)
+        try:
+            while True:
+                item = await asyncio.wait_for(queue.get(), max(deadline - loop.time(), 0))
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # The worker stops at its next piece; waiting for it keeps the caller's semaphore slot
+            # taken until the thread is free again, so timed-out streams never outnumber the slots
+            await asyncio.wait({worker})
+
+    async def stream_response(self, context: str, query: str):
+        """Async iterator over the answer's text pieces as they arrive."""
+        prompt = self.build_prompt(context, query)
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        first_token = None
+        self.metrics.counts["requests"] += 1
+        async with self.semaphore:
+            self.metrics.counts["in_flight"] += 1
+            try:
+                for attempt in range(self.retries + 1):
+                    try:
+                        async for piece in self._stream_once(prompt, loop.time() + self.timeout):
+                            if first_token is None:
+                                first_token = time.perf_counter()
+                                self.metrics.ttft.append(first_token - start)
+                                LLM_TTFT_SECONDS.observe(first_token - start)
+                            yield piece
+                        break
+                    except Exception as e:
+                        if isinstance(e, asyncio.TimeoutError):
+                            self.metrics.counts["timeouts"] += 1
+                        # Once tokens have reached the caller the answer cannot be restarted
+                        if first_token is not None or attempt == self.retries:
+                            self.metrics.counts["errors"] += 1
+                            STAGE_ERRORS.inc(stage="llm")
+                            raise
+                        self.metrics.counts["retries"] += 1
+                        delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.0)
+                        log_event("llm_retry", attempt=attempt + 1, error=repr(e), delay_seconds=round(delay, 3))
+                        await asyncio.sleep(delay)
+            finally:
+                self.metrics.counts["in_flight"] -= 1
+        total = time.perf_counter() - start
+        self.metrics.total.append(total)
+        STAGE_SECONDS.observe(total, stage="llm")
+
+    async def generate_response(self, context: str, query: str) -> str:
         try:
-            start = time.time()
-            response = await asyncio.to_thread(self.model.generate_content, prompt)
-            print("LLM took", time.time() - start, "seconds")
-            return response.text.strip()
+            start = time.perf_counter()
+            response = "".join([piece async for piece in self.stream_response(context, query)])
+            log_event("llm_response", model=self.model_name, seconds=round(time.perf_counter() - start, 3),
+                      characters=len(response))
+            return response.strip()
         except Exception as e:
-            return f"[LLM Error] Failed to generate response: {str(e)}"
+            return f"[LLM Error] Failed to generate response: {str(e) or type(e).__name__}"
@@ -0,0 +1,77 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict, defaultdict
+import numpy as np
+from app.config import RESPONSE_CACHE_THRESHOLD, RESPONSE_CACHE_TTL_S, RESPONSE_CACHE_SIZE
+
+
+class ResponseCache:
+    """
+    LLM answers keyed on (patient_id, index version, retrieved chunk ids). Within a key a
+    cached answer is reused when the new query embedding's cosine similarity to the cached
+    query is at least threshold. Entries expire after ttl seconds and the least recently
+    used are evicted beyond max_entries.
+    """
+    def __init__(self, threshold=RESPONSE_CACHE_THRESHOLD, ttl=RESPONSE_CACHE_TTL_S, max_entries=RESPONSE_CACHE_SIZE):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.by_key = defaultdict(set)
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @staticmethod
+    def _unit(embedding):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        return embedding / (np.linalg.norm(embedding) or 1.0)
+
+    def _drop(self, entry_id):
+        key = self.entries.pop(entry_id)[0]
+        self.by_key[key].discard(entry_id)
+        if not self.by_key[key]:
+            del self.by_key[key]
+
+    def get(self, key, query_embedding):
+        """The cached answer for the most similar query under key, or None."""
+        query = self._unit(query_embedding)
+        now = time.monotonic()
+        best, best_similarity = None, self.threshold
+        with self.lock:
+            for entry_id in list(self.by_key.get(key, ())):
+                _, embedding, _, expires_at = self.entries[entry_id]
+                if expires_at <= now:
+                    self._drop(entry_id)
+                    self.stats["expirations"] += 1
+                    continue
+                similarity = float(embedding @ query)
+                if similarity >= best_similarity:
+                    best, best_similarity = entry_id, similarity
+            if best is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(best)
+            self.stats["hits"] += 1
+            return self.entries[best][2]
+
+    def put(self, key, query_embedding, response):
+        with self.lock:
+            entry_id = next(self.ids)
+            self.entries[entry_id] = (key, self._unit(query_embedding), response, time.monotonic() + self.ttl)
+            self.by_key[key].add(entry_id)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+
+    def invalidate(self, patient_id):
+        """Forget every answer for the patient, e.g. after their transcript or index changed."""
+        with self.lock:
+            for entry_id in [entry_id for entry_id, entry in self.entries.items() if entry[0][0] == patient_id]:
+                self._drop(entry_id)
+                self.stats["invalidations"] += 1
+
+    def snapshot(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "entries": len(self.entries), "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
@@ -1,43 +1,332 @@
 import faiss
+import hashlib
+import json
 import os
+import shutil
+import threading
 import numpy as np
-import pickle
+from app.config import (INDEX_TYPE, INDEX_METRIC, INDEX_TRAIN_SAMPLE, IVF_NLIST, IVF_NPROBE,
+                        HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, PQ_M, PQ_NBITS)
+from app.utils.metrics import timed
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+INDEX_METRICS = ("l2", "ip", "cosine")
+# faiss wants ~39 training points per centroid
+POINTS_PER_CENTROID = 39
+
+
+def prepare_vectors(vectors, metric):
+    """float32 C-contiguous copy of vectors, L2-normalised for cosine so inner product ranks by cosine."""
+    vectors = np.array(vectors, dtype=np.float32, order="C", ndmin=2)
+    if metric == "cosine":
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def check_index_config(index_type, metric):
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type {index_type}. Expected one of {INDEX_TYPES}.")
+    if metric not in INDEX_METRICS:
+        raise ValueError(f"Unsupported index metric {metric}. Expected one of {INDEX_METRICS}.")
+
+
+def resolve_index_type(n, index_type, pq_nbits=PQ_NBITS):
+    """The configured index type, or 'flat' while there are too few vectors to train it."""
+    if index_type == "ivf" and n < POINTS_PER_CENTROID:
+        return "flat"
+    if index_type == "ivfpq" and n < POINTS_PER_CENTROID * 2 ** pq_nbits:
+        return "flat"
+    return index_type
+
+
+def create_index(dim, n, index_type=INDEX_TYPE, metric=INDEX_METRIC, nlist=IVF_NLIST,
+                 hnsw_m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, pq_m=PQ_M, pq_nbits=PQ_NBITS):
+    """
+    Empty IndexIDMap of index_type sized for about n vectors; IVF list counts are capped at
+    n / 39 so every centroid has enough training points. ivf and ivfpq still need train().
+    """
+    check_index_config(index_type, metric)
+    faiss_metric = faiss.METRIC_L2 if metric == "l2" else faiss.METRIC_INNER_PRODUCT
+    nlist = max(1, min(nlist, n // POINTS_PER_CENTROID))
+    if index_type == "flat":
+        base = faiss.IndexFlat(dim, faiss_metric)
+    elif index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, hnsw_m, faiss_metric)
+        base.hnsw.efConstruction = ef_construction
+    elif index_type == "ivf":
+        base = faiss.IndexIVFFlat(faiss.IndexFlat(dim, faiss_metric), dim, nlist, faiss_metric)
+    else:
+        if dim % pq_m:
+            raise ValueError(f"PQ_M={pq_m} must divide the embedding dimension {dim}.")
+        base = faiss.IndexIVFPQ(faiss.IndexFlat(dim, faiss_metric), dim, nlist, pq_m, pq_nbits, faiss_metric)
+    return faiss.IndexIDMap(base)
+
+
+def tune_index(index, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH):
+    """Apply the search-time knobs: nprobe for IVF indices, efSearch for HNSW."""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(nprobe, base.nlist)
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = ef_search
+    return index
+
+
+def build_index(vectors, ids, index_type=INDEX_TYPE, metric=INDEX_METRIC, train_sample=INDEX_TRAIN_SAMPLE, **params):
+    """
+    Index prepared vectors under ids, training IVF types on a random sample of at most
+    train_sample vectors. Returns (index, index_type actually built).
+    """
+    index_type = resolve_index_type(len(vectors), index_type, params.get("pq_nbits", PQ_NBITS))
+    index = create_index(vectors.shape[1], len(vectors), index_type, metric,
+                         **{k: v for k, v in params.items() if k not in ("nprobe", "ef_search")})
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > train_sample:
+            sample = vectors[np.random.default_rng(0).choice(len(vectors), train_sample, replace=False)]
+        index.train(sample)
+    if len(vectors):
+        index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    tune_index(index, params.get("nprobe", IVF_NPROBE), params.get("ef_search", HNSW_EF_SEARCH))
+    return index, index_type
+
+
+class DocStore:
+    """
+    Append-only document list kept as one UTF-8 blob plus an int64 offsets array,
+    both of which load through np.memmap / mmap_mode instead of unpickling.
+    """
+    def __init__(self, data=b"", offsets=None):
+        self.data = data
+        self.offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self.pending = []
+
+    @classmethod
+    def load(cls, path):
+        offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        blob_path = os.path.join(path, "docs.bin")
+        data = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else b""
+        return cls(data, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1 + len(self.pending)
+
+    def __getitem__(self, i):
+        stored = len(self.offsets) - 1
+        if i >= stored:
+            return self.pending[i - stored]
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def extend(self, documents):
+        self.pending.extend(documents)
+
+    def save(self, path):
+        encoded = [doc.encode("utf-8") for doc in self.pending]
+        lengths = np.fromiter((len(doc) for doc in encoded), dtype=np.int64, count=len(encoded))
+        offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths)])
+        with open(os.path.join(path, "docs.bin"), "wb") as f:
+            f.write(bytes(self.data))
+            for doc in encoded:
+                f.write(doc)
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+
+
+def document_key(doc):
+    return hashlib.sha256(doc.encode("utf-8")).hexdigest()
+
+
+class PatientIndex:
+    def __init__(self, index, docs, source=None, index_type="flat", metric="l2"):
+        self.index = index
+        self.docs = docs
+        self.source = source
+        self.index_type = index_type
+        self.metric = metric
+        self.keys = {document_key(doc) for doc in docs}
+
 
 class Retriever:
-    def __init__(self, index_path='vectorstore/faiss_index.bin'):
-        self.index_path = index_path
-        self.index = None
-        self.docs = []
-
-    def build_index(self, embeddings, documents):
-        dim = embeddings[0].shape[0]
-        self.index = faiss.IndexFlatL2(dim)
-        self.index.add(np.array(embeddings))
-        self.docs = documents
-        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
-        with open(self.index_path.replace(".bin", "_docs.pkl"), "wb") as f:
-            pickle.dump(self.docs, f)
-        faiss.write_index(self.index, self.index_path)
-
-    def load_index(self):
-        if os.path.exists(self.index_path):
+    """
+    One resident FAISS index per patient, each an IndexIDMap whose ids are row numbers
+    in that patient's DocStore. Every add is persisted as a new generation directory
+    that becomes current through an atomic rename of the CURRENT pointer file.
+    New indices use the configured index type and metric; a patient with too few vectors
+    to train it stays on an exact flat index until enough have been added.
+    """
+    def __init__(self, store_dir='vectorstore/patients', index_type=INDEX_TYPE, metric=INDEX_METRIC,
+                 nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH):
+        check_index_config(index_type, metric)
+        self.store_dir = store_dir
+        self.index_type = index_type
+        self.metric = metric
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.patients = {}
+        self.lock = threading.Lock()
+
+    def _patient_dir(self, patient_id):
+        return os.path.join(self.store_dir, patient_id)
+
+    def load_all(self):
+        """Warm-up: load every persisted patient index so no request touches the disk."""
+        if not os.path.isdir(self.store_dir):
+            return
+        for patient_id in sorted(os.listdir(self.store_dir)):
             try:
-                self.index = faiss.read_index(self.index_path)
-                with open(self.index_path.replace(".bin", "_docs.pkl"), "rb") as f:
-                    self.docs = pickle.load(f)
-                print("FAISS index and documents loaded.")
+                self.load_patient(patient_id)
             except Exception as e:
-                print(f"Failed to load FAISS index: {e}")
-                self.index = None
-                self.docs = []
-        else:
-            print("FAISS index path does not exist.")
-            self.index = None
-            self.docs = []
-
-
-    def search(self, query_embedding, top_k=1):
-        if self.index is None:
-            raise ValueError("FAISS index not loaded. Please build or load the index first.")
-        D, I = self.index.search(np.array([query_embedding]), top_k)
-        return [self.docs[i] for i in I[0]]
+                print(f"Failed to load FAISS index for patient {patient_id}: {e}")
+        print(f"Loaded FAISS indices for {len(self.patients)} patients.")
+
+    def load_patient(self, patient_id):
+        pointer = os.path.join(self._patient_dir(patient_id), "CURRENT")
+        if not os.path.exists(pointer):
+            return None
+        with open(pointer) as f:
+            path = os.path.join(self._patient_dir(patient_id), f.read().strip())
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        index = tune_index(faiss.read_index(os.path.join(path, "index.faiss")), self.nprobe, self.ef_search)
+        self.patients[patient_id] = PatientIndex(index, DocStore.load(path), meta.get("source"),
+                                                 meta.get("index_type", "flat"), meta.get("metric", "l2"))
+        return self.patients[patient_id]
+
+    def indexed_source(self, patient_id):
+        """Signature of the transcript the patient's index was last built from, if any."""
+        patient = self.patients.get(patient_id)
+        return patient.source if patient else None
+
+    def appended_documents(self, patient_id, documents):
+        """
+        When the patient's indexed documents are a prefix of documents (the transcript only grew),
+        the documents past them, without repeats; None when the index has to be replaced.
+        """
+        patient = self.patients.get(patient_id)
+        if patient is None:
+            return None
+        documents = [documents[i] for i in self._unseen(set(), documents)]
+        indexed = len(patient.docs)
+        if indexed > len(documents) or any(patient.docs[i] != documents[i] for i in range(indexed)):
+            return None
+        return documents[indexed:]
+
+    @staticmethod
+    def _unseen(known, documents):
+        """Positions of the documents whose key is not in known, first occurrence only."""
+        known = set(known)
+        positions = []
+        for i, doc in enumerate(documents):
+            key = document_key(doc)
+            if key not in known:
+                known.add(key)
+                positions.append(i)
+        return positions
+
+    def add_documents(self, patient_id, embeddings, documents, source=None):
+        """
+        Add documents and their embeddings to the patient's index and persist it. Documents
+        already indexed (e.g. added by a concurrent caller meanwhile) are skipped.
+        """
+        with self.lock:
+            patient = self.patients.get(patient_id)
+            keep = self._unseen(patient.keys if patient else set(), documents)
+            if len(keep) < len(documents):
+                documents = [documents[i] for i in keep]
+                embeddings = np.asarray(embeddings, dtype=np.float32)[keep]
+            start = len(patient.docs) if patient else 0
+            ids = np.arange(start, start + len(documents), dtype=np.int64)
+            if patient is None:
+                vectors = prepare_vectors(embeddings, self.metric)
+                index, index_type = build_index(vectors, ids, self.index_type, self.metric,
+                                                nprobe=self.nprobe, ef_search=self.ef_search)
+                patient = PatientIndex(index, DocStore(), source, index_type, self.metric)
+            elif len(documents):
+                patient.index.add_with_ids(prepare_vectors(embeddings, patient.metric), ids)
+                if self._outgrew_flat(patient):
+                    self._rebuild(patient)
+            if len(documents):
+                patient.docs.extend(documents)
+                patient.keys.update(document_key(doc) for doc in documents)
+            patient.source = source if source is not None else patient.source
+            self._persist(patient_id, patient)
+            self.patients[patient_id] = patient
+
+    def replace_documents(self, patient_id, embeddings, documents, source=None):
+        """
+        Rebuild the patient's index from exactly these documents, dropping whatever an older
+        transcript contributed, and persist it as a new generation.
+        """
+        keep = self._unseen(set(), documents)
+        documents = [documents[i] for i in keep]
+        vectors = prepare_vectors(np.asarray(embeddings, dtype=np.float32)[keep], self.metric)
+        index, index_type = build_index(vectors, np.arange(len(documents), dtype=np.int64), self.index_type, self.metric,
+                                        nprobe=self.nprobe, ef_search=self.ef_search)
+        patient = PatientIndex(index, DocStore(), source, index_type, self.metric)
+        patient.docs.extend(documents)
+        patient.keys.update(document_key(doc) for doc in documents)
+        with self.lock:
+            self._persist(patient_id, patient)
+            self.patients[patient_id] = patient
+
+    def _outgrew_flat(self, patient):
+        return (patient.index_type == "flat" and self.index_type != "flat" and patient.metric == self.metric
+                and resolve_index_type(patient.index.ntotal, self.index_type) != "flat")
+
+    def _rebuild(self, patient):
+        """Move a patient off the flat fallback onto the configured index type."""
+        base = faiss.downcast_index(patient.index.index)
+        vectors = base.reconstruct_n(0, base.ntotal)
+        ids = faiss.vector_to_array(patient.index.id_map)
+        patient.index, patient.index_type = build_index(vectors, ids, self.index_type, self.metric,
+                                                        nprobe=self.nprobe, ef_search=self.ef_search)
+        print(f"Rebuilt FAISS index as {patient.index_type} with {len(ids)} vectors.")
+
+    def _persist(self, patient_id, patient):
+        patient_dir = self._patient_dir(patient_id)
+        os.makedirs(patient_dir, exist_ok=True)
+        generations = [int(name[1:]) for name in os.listdir(patient_dir) if name.startswith("g") and name[1:].isdigit()]
+        generation = f"g{max(generations, default=0) + 1}"
+        path = os.path.join(patient_dir, generation)
+        os.makedirs(path)
+        faiss.write_index(patient.index, os.path.join(path, "index.faiss"))
+        patient.docs.save(path)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"source": patient.source, "documents": len(patient.docs),
+                       "index_type": patient.index_type, "metric": patient.metric}, f)
+
+        tmp_pointer = os.path.join(patient_dir, "CURRENT.tmp")
+        with open(tmp_pointer, "w") as f:
+            f.write(generation)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_pointer, os.path.join(patient_dir, "CURRENT"))
+
+        # Reopen the docs from the new generation so they are served from the mapped files again
+        patient.docs = DocStore.load(path)
+        for name in os.listdir(patient_dir):
+            if name.startswith("g") and name != generation and os.path.isdir(os.path.join(patient_dir, name)):
+                shutil.rmtree(os.path.join(patient_dir, name), ignore_errors=True)
+
+    def index_version(self, patient_id):
+        """Changes whenever the patient's transcript or indexed documents change."""
+        patient = self.patients.get(patient_id)
+        return f"{patient.source}:{len(patient.docs)}" if patient else None
+
+    @timed("search")
+    def search_ids(self, patient_id, query_embedding, top_k=1):
+        """Row ids of the patient's top_k nearest documents."""
+        patient = self.patients.get(patient_id)
+        if patient is None or patient.index.ntotal == 0:
+            raise ValueError(f"No FAISS index for patient {patient_id}. Please add their transcript first.")
+        D, I = patient.index.search(prepare_vectors(query_embedding, patient.metric), top_k)
+        return [int(i) for i in I[0] if i != -1]
+
+    def documents(self, patient_id, ids):
+        docs = self.patients[patient_id].docs
+        return [docs[i] for i in ids]
+
+    def search(self, patient_id, query_embedding, top_k=1):
+        return self.documents(patient_id, self.search_ids(patient_id, query_embedding, top_k))
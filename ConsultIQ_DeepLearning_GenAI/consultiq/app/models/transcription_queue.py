@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from app.config import TRANSCRIBE_WORKERS, TRANSCRIBE_JOB_TTL_S
+from app.utils.metrics import timed, log_event
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class TranscriptionJob:
+    def __init__(self, patient_id, audio_path, transcript_path):
+        self.job_id = uuid.uuid4().hex
+        self.patient_id = patient_id
+        self.audio_path = audio_path
+        self.transcript_path = transcript_path
+        self.status = PENDING
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "patient_id": self.patient_id,
+            "status": self.status,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class TranscriptionQueue:
+    """
+    Runs AudioProcessor.transcribe on a worker pool off the event loop. There is at most one
+    live job per patient, and a transcript file only appears once it is complete.
+    Finished jobs are forgotten job_ttl seconds after they end.
+    """
+    def __init__(self, audio_processor, workers=TRANSCRIBE_WORKERS, job_ttl=TRANSCRIBE_JOB_TTL_S):
+        self.audio_processor = audio_processor
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcribe")
+        self.job_ttl = job_ttl
+        self.jobs = {}
+        self.by_patient = {}
+        self.finished = deque()
+        self.lock = threading.Lock()
+
+    def _evict_expired(self):
+        # finished is in finishing order, so expired jobs are always at its left end
+        cutoff = time.time() - self.job_ttl
+        while self.finished and self.finished[0].finished_at <= cutoff:
+            job = self.finished.popleft()
+            self.jobs.pop(job.job_id, None)
+            if self.by_patient.get(job.patient_id) == job.job_id:
+                del self.by_patient[job.patient_id]
+
+    def submit(self, patient_id, audio_path, transcript_path):
+        """Queue a transcription for the patient, or return the job already queued or running for them."""
+        with self.lock:
+            self._evict_expired()
+            job = self.jobs.get(self.by_patient.get(patient_id))
+            if job is not None and job.status in (PENDING, RUNNING):
+                return job
+            job = TranscriptionJob(patient_id, audio_path, transcript_path)
+            self.jobs[job.job_id] = job
+            self.by_patient[patient_id] = job.job_id
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def job_for_patient(self, patient_id):
+        return self.jobs.get(self.by_patient.get(patient_id))
+
+    def _run(self, job):
+        job.status = RUNNING
+        start = time.time()
+        try:
+            with timed("transcribe"):
+                transcription = self.audio_processor.transcribe(job.audio_path)
+            tmp_path = f"{job.transcript_path}.{job.job_id}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(transcription)
+            os.replace(tmp_path, job.transcript_path)
+            job.status = DONE
+            log_event("transcribed", job_id=job.job_id, patient_id=job.patient_id, audio_path=job.audio_path,
+                      seconds=round(time.time() - start, 3))
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            log_event("transcription_failed", job_id=job.job_id, patient_id=job.patient_id, audio_path=job.audio_path,
+                      error=str(e))
+        finally:
+            with self.lock:
+                job.finished_at = time.time()
+                self.finished.append(job)
+                self._evict_expired()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
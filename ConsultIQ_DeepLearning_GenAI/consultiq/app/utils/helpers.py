@@ -6,4 +6,11 @@ def get_audio_path(patient_id):
 
 def get_transcript_path(patient_id):
     os.makedirs(TRANSCRIPT_DIR, exist_ok=True)
-    return os.path.join(TRANSCRIPT_DIR, f"{patient_id}.txt")
\ No newline at end of file
+    return os.path.join(TRANSCRIPT_DIR, f"{patient_id}.txt")
+
+def file_signature(path):
+    """'mtime:size' of a file, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
@@ -0,0 +1,146 @@
+import functools
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Seconds; wide enough for a cached embedding lookup up to a full consultation transcription
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def log_event(event, **fields):
+    """One JSON object per line on stdout, for timings and errors a log shipper can parse."""
+    entry = {"time": datetime.now().isoformat(timespec="milliseconds"), "event": event, **fields}
+    print(json.dumps(entry, default=str), flush=True)
+
+
+def _label_text(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return "+Inf" if value == float("inf") else repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus text format."""
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self.lock:
+            counts, total = self.series.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.series[key] = (counts, total + value)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, key, [('le', _format_value(bound))])} {count}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def expose(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.expose()) + "\n"
+
+
+registry = Registry()
+STAGE_SECONDS = registry.register(Histogram(
+    "consultiq_stage_seconds", "Wall time of each request stage (embed, search, llm, transcribe, ...)", labels=("stage",)))
+STAGE_ERRORS = registry.register(Counter(
+    "consultiq_stage_errors_total", "Stage calls that raised", labels=("stage",)))
+LLM_TTFT_SECONDS = registry.register(Histogram(
+    "consultiq_llm_time_to_first_token_seconds", "Time from LLM request to its first streamed token"))
+
+
+@contextmanager
+def _stage_timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+class timed:
+    """
+    Records wall time in consultiq_stage_seconds{stage=...}, either around a block
+    (`with timed("search"):`) or as a decorator on plain and async functions.
+    """
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.context = _stage_timer(self.stage)
+        return self.context.__enter__()
+
+    def __exit__(self, *exc):
+        return self.context.__exit__(*exc)
+
+    def __call__(self, func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _stage_timer(self.stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _stage_timer(self.stage):
+                return func(*args, **kwargs)
+        return wrapper
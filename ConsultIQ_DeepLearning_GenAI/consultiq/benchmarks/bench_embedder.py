@@ -0,0 +1,86 @@
+# Run Command (from consultiq): python -m benchmarks.bench_embedder [--synthetic] [--clients 32] [--requests 20]
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import numpy as np
+from app.models.embedder import Embedder
+from app.config import EMBEDDING_MODEL, TRANSCRIPT_DIR
+
+
+class SyntheticModel:
+    """Stand-in for SentenceTransformer with a fixed per-call overhead plus a per-text cost."""
+    def __init__(self, dim=384, call_ms=8.0, text_ms=0.5):
+        self.dim = dim
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+        self.calls = 0
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        time.sleep((self.call_ms + self.text_ms * len(texts)) / 1000)
+        return np.random.default_rng(len(texts)).standard_normal((len(texts), self.dim)).astype(np.float32)
+
+
+def load_texts():
+    """5000 distinct query-sized texts drawn from the sample transcript vocabulary."""
+    try:
+        with open(os.path.join(TRANSCRIPT_DIR, "ABC123.txt")) as f:
+            words = f.read().split()
+    except OSError:
+        words = []
+    words = words or "the patient reports mild headaches and trouble sleeping".split()
+    rng = random.Random(0)
+    return [" ".join(rng.choice(words) for _ in range(12)) + f" #{i}" for i in range(5000)]
+
+
+async def run_clients(embed, texts, clients, requests, repeat_ratio):
+    """clients concurrent callers, each embedding requests single queries; repeat_ratio of them are repeats."""
+    rng = random.Random(1)
+    hot = texts[:20]
+    latencies = []
+
+    async def client(offset):
+        for i in range(requests):
+            text = rng.choice(hot) if rng.random() < repeat_ratio else texts[(offset * requests + i) % len(texts)]
+            start = time.perf_counter()
+            await embed([text])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, np.percentile(latencies, 50) * 1000, np.percentile(latencies, 95) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding throughput under concurrent load")
+    parser.add_argument("--synthetic", action="store_true", help="use a timed stand-in instead of downloading the model")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--repeat-ratio", type=float, default=0.5)
+    args = parser.parse_args()
+
+    texts = load_texts()
+    model = SyntheticModel() if args.synthetic else None
+    with tempfile.TemporaryDirectory() as cache_dir:
+        uncached = Embedder(EMBEDDING_MODEL, model=model, cache_dir=None)
+        cached = Embedder(EMBEDDING_MODEL, model=uncached.model, cache_dir=cache_dir)
+        scenarios = {
+            "per-request encode": lambda batch: asyncio.to_thread(uncached.model.encode, batch),
+            "micro-batched": uncached.aembed,
+            "micro-batched + cache": cached.aembed,
+        }
+        print(f"{args.clients} clients x {args.requests} requests, repeat ratio {args.repeat_ratio}")
+        for name, embed in scenarios.items():
+            throughput, p50, p95 = asyncio.run(run_clients(embed, texts, args.clients, args.requests, args.repeat_ratio))
+            print(f"{name:<24} {throughput:8.1f} req/s   p50 {p50:7.1f} ms   p95 {p95:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Run Command (from consultiq): python -m benchmarks.bench_index [--vectors 100000] [--queries 1000] [--metric cosine]
+import argparse
+import time
+import faiss
+import numpy as np
+from app.models.retriever import build_index, tune_index, prepare_vectors
+
+DIM = 384
+TOP_K = 10
+# (index type, knob values swept at search time)
+SWEEPS = [
+    ("flat", [None]),
+    ("ivf", [1, 4, 16, 64]),
+    ("hnsw", [16, 64, 256]),
+    ("ivfpq", [4, 16, 64]),
+]
+
+
+def synthetic_corpus(n, queries, dim=DIM, clusters=256, seed=0):
+    """Clustered gaussian vectors, a rough stand-in for MiniLM sentence embeddings of many consultations."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    corpus = centres[rng.integers(clusters, size=n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    query = centres[rng.integers(clusters, size=queries)] + 0.6 * rng.standard_normal((queries, dim)).astype(np.float32)
+    return corpus, query
+
+
+def recall_at_k(found, truth):
+    return np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency of the Retriever index types")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--metric", default="cosine", choices=["l2", "ip", "cosine"])
+    args = parser.parse_args()
+
+    corpus, queries = synthetic_corpus(args.vectors, args.queries)
+    corpus, queries = prepare_vectors(corpus, args.metric), prepare_vectors(queries, args.metric)
+    ids = np.arange(len(corpus), dtype=np.int64)
+    faiss.omp_set_num_threads(1)
+
+    print(f"{args.vectors} x {DIM}-d vectors, {args.queries} queries, metric {args.metric}, recall@{TOP_K} vs flat")
+    print(f"{'index':<8} {'knob':>6} {'build s':>8} {'size MB':>8} {'ms/query':>9} {'recall':>7}")
+    truth = None
+    for index_type, knobs in SWEEPS:
+        start = time.perf_counter()
+        index, built = build_index(corpus, ids, index_type, args.metric)
+        build_seconds = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 2 ** 20
+        for knob in knobs:
+            if knob is not None:
+                tune_index(index, nprobe=knob, ef_search=knob)
+            start = time.perf_counter()
+            _, found = index.search(queries, TOP_K)
+            latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            if truth is None:
+                truth = found
+            label = "-" if knob is None else str(knob)
+            print(f"{built:<8} {label:>6} {build_seconds:8.2f} {size_mb:8.1f} {latency_ms:9.3f} {recall_at_k(found, truth):7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# Run Command (from consultiq): python -m benchmarks.bench_inference [--backends torch int8 onnx] [--audio data/ABC123.wav] [--texts 2000]
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from app.config import DATA_DIR, TRANSCRIPT_DIR
+from app.models.inference import BACKENDS
+
+SINGLE_QUERIES = 200
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def probe_embed(backend, texts_count, out):
+    """Load time, single-query latency and batch throughput of one embedding backend; vectors go to out."""
+    from app.models.embedder import Embedder
+    from benchmarks.bench_embedder import load_texts
+    texts = load_texts()[:texts_count]
+    start = time.perf_counter()
+    embedder = Embedder(backend=backend, cache_dir=None)
+    load_seconds = time.perf_counter() - start
+    embedder.embed_text(texts[:embedder.batch_size])
+
+    latencies = []
+    for text in texts[:SINGLE_QUERIES]:
+        start = time.perf_counter()
+        embedder.embed_text([text])
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    vectors = embedder.embed_text(texts)
+    batch_seconds = time.perf_counter() - start
+    np.save(out, vectors)
+    return {"load_seconds": load_seconds, "p50_ms": np.percentile(latencies, 50) * 1000,
+            "p95_ms": np.percentile(latencies, 95) * 1000, "texts_per_s": len(texts) / batch_seconds}
+
+
+def probe_asr(backend, audio_files, out):
+    """Load time and per-file transcription time of one ASR backend; transcripts go to out."""
+    import librosa
+    from app.models.audio_processor import AudioProcessor, SAMPLE_RATE
+    start = time.perf_counter()
+    processor = AudioProcessor(backend=backend)
+    load_seconds = time.perf_counter() - start
+    processor.transcribe(audio_files[0])
+
+    transcripts, seconds, audio_seconds = {}, 0.0, 0.0
+    for path in audio_files:
+        audio_seconds += librosa.get_duration(path=path, sr=SAMPLE_RATE)
+        start = time.perf_counter()
+        transcripts[path] = processor.transcribe(path)
+        seconds += time.perf_counter() - start
+    with open(out, "w") as f:
+        json.dump(transcripts, f)
+    return {"load_seconds": load_seconds, "seconds": seconds, "real_time_factor": seconds / audio_seconds,
+            "audio_s_per_s": audio_seconds / seconds}
+
+
+def run_probe(kind, backend, out, args):
+    """One probe in a fresh interpreter, so peak memory and thread pools belong to that backend alone."""
+    command = [sys.executable, "-m", "benchmarks.bench_inference", "--probe", kind, "--backend", backend, "--out", out,
+               "--texts", str(args.texts), "--audio", *args.audio]
+    result = subprocess.run(command, capture_output=True, text=True)
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        return {"error": (result.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(lines[-1])
+
+
+def cosine_drift(vectors, reference):
+    """(mean, min) row-wise cosine similarity of vectors to the fp32 reference."""
+    dots = (vectors * reference).sum(axis=1)
+    cosine = dots / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1))
+    return float(cosine.mean()), float(cosine.min())
+
+
+def wer(reference, hypothesis):
+    """Word error rate: word-level edit distance over the reference length."""
+    ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    if not ref:
+        return float(bool(hyp))
+    distance = np.arange(len(hyp) + 1)
+    for i, word in enumerate(ref, 1):
+        previous, distance = distance, np.empty_like(distance)
+        distance[0] = i
+        for j, other in enumerate(hyp, 1):
+            distance[j] = min(previous[j] + 1, distance[j - 1] + 1, previous[j - 1] + (word != other))
+    return distance[-1] / len(ref)
+
+
+def reference_transcript(path):
+    """data/transcripts/<name>.txt of an audio file, if one was saved for it."""
+    text_path = os.path.join(TRANSCRIPT_DIR, os.path.splitext(os.path.basename(path))[0] + ".txt")
+    if not os.path.exists(text_path):
+        return None
+    with open(text_path) as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency, throughput, memory and accuracy drift of each CPU inference backend")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--audio", nargs="*", default=None, help="sample audio files (default: data/*.wav)")
+    parser.add_argument("--texts", type=int, default=2000, help="texts embedded for throughput and drift")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--probe", choices=["embed", "asr"], help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.audio is None:
+        args.audio = sorted(glob.glob(os.path.join(DATA_DIR, "*.wav")))
+
+    if args.probe:
+        result = probe_embed(args.backend, args.texts, args.out) if args.probe == "embed" else probe_asr(args.backend, args.audio, args.out)
+        print(json.dumps({**result, "peak_rss_mb": peak_rss_mb()}))
+        return
+
+    # fp32 torch is the reference every other backend is compared with
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+    results = {"embed": {}, "asr": {}}
+    with tempfile.TemporaryDirectory() as out_dir:
+        print(f"{'embedding':<10} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'texts/s':>9} {'RSS MB':>8} {'cos mean':>9} {'cos min':>9}")
+        for backend in backends:
+            out = os.path.join(out_dir, f"embed_{backend}.npy")
+            result = results["embed"][backend] = run_probe("embed", backend, out, args)
+            if "error" in result:
+                print(f"{backend:<10} error: {result['error']}")
+                continue
+            reference = os.path.join(out_dir, "embed_torch.npy")
+            if os.path.exists(reference):
+                result["cosine_mean"], result["cosine_min"] = cosine_drift(np.load(out), np.load(reference))
+            print(f"{backend:<10} {result['load_seconds']:7.2f} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} "
+                  f"{result['texts_per_s']:9.1f} {result['peak_rss_mb']:8.0f} "
+                  f"{result.get('cosine_mean', float('nan')):9.5f} {result.get('cosine_min', float('nan')):9.5f}")
+
+        if not args.audio:
+            print("\nNo sample audio (pass --audio or put .wav files in data/), skipping transcription.")
+        else:
+            print(f"\n{'asr':<10} {'load s':>7} {'RTF':>8} {'audio s/s':>10} {'RSS MB':>8} {'WER vs fp32':>12} {'WER vs saved':>13}")
+            for backend in backends:
+                out = os.path.join(out_dir, f"asr_{backend}.json")
+                result = results["asr"][backend] = run_probe("asr", backend, out, args)
+                if "error" in result:
+                    print(f"{backend:<10} error: {result['error']}")
+                    continue
+                with open(out) as f:
+                    transcripts = json.load(f)
+                reference_path = os.path.join(out_dir, "asr_torch.json")
+                if os.path.exists(reference_path):
+                    with open(reference_path) as f:
+                        fp32 = json.load(f)
+                    result["wer_vs_fp32"] = float(np.mean([wer(fp32[path], text) for path, text in transcripts.items()]))
+                saved = {path: reference_transcript(path) for path in transcripts}
+                if all(text is not None for text in saved.values()):
+                    result["wer_vs_saved"] = float(np.mean([wer(saved[path], text) for path, text in transcripts.items()]))
+                print(f"{backend:<10} {result['load_seconds']:7.2f} {result['real_time_factor']:8.3f} {result['audio_s_per_s']:10.1f} "
+                      f"{result['peak_rss_mb']:8.0f} {result.get('wer_vs_fp32', float('nan')):12.4f} {result.get('wer_vs_saved', float('nan')):13.4f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
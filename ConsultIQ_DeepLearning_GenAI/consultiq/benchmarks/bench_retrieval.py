@@ -0,0 +1,57 @@
+# Run Command (from consultiq): python -m benchmarks.bench_retrieval [--chunks 2000] [--queries 200]
+import argparse
+import asyncio
+import random
+import tempfile
+import numpy as np
+from app.models.context_builder import ContextBuilder, STAGES
+from app.models.embedder import Embedder
+from app.models.retriever import Retriever
+from benchmarks.bench_embedder import SyntheticModel, load_texts
+
+PATIENT = "BENCH"
+KS = [1, 2, 4, 8, 16, 32]
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+def synthetic_chunks(n):
+    """n chunks of a long synthetic transcript, overlapping like TextProcessor's splitter."""
+    words = " ".join(load_texts()).split()
+    rng = random.Random(2)
+    text = " ".join(rng.choice(words) for _ in range(n * (CHUNK_SIZE - CHUNK_OVERLAP) // 6))
+    step = CHUNK_SIZE - CHUNK_OVERLAP
+    return [text[i:i + CHUNK_SIZE] for i in range(0, len(text) - CHUNK_OVERLAP, step)][:n]
+
+
+async def run(builder, queries, query_embeddings):
+    for query, embedding in zip(queries, query_embeddings):
+        await builder.build(PATIENT, query, embedding)
+    return builder.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage retrieval cost against the number of candidates k")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        embedder = Embedder(model=SyntheticModel(call_ms=0.5, text_ms=0.05), cache_dir=f"{tmp}/embeddings")
+        retriever = Retriever(store_dir=f"{tmp}/patients")
+        chunks = synthetic_chunks(args.chunks)
+        retriever.add_documents(PATIENT, embedder.embed_text(chunks), chunks)
+        queries = load_texts()[:args.queries]
+        query_embeddings = np.random.default_rng(3).standard_normal((len(queries), embedder.dim)).astype(np.float32)
+
+        print(f"{len(chunks)} chunks, {len(queries)} queries; mean ms per query")
+        print(f"{'reranker':<9} {'k':>3} " + " ".join(f"{stage:>8}" for stage in STAGES))
+        for reranker in ("none", "mmr"):
+            for k in KS:
+                builder = ContextBuilder(retriever, embedder, candidates=k, reranker=reranker)
+                summary = asyncio.run(run(builder, queries, query_embeddings))
+                print(f"{reranker:<9} {k:>3} " + " ".join(f"{summary[f'{stage}_ms']['mean']:8.3f}" for stage in STAGES))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Run Command (from consultiq): python -m benchmarks.bench_startup [--json startup.json]
+import argparse
+import json
+import os
+import subprocess
+import sys
+from app.components import ROLES
+
+MODULES = {
+    "audio_processor": "app.models.audio_processor",
+    "transcription_queue": "app.models.transcription_queue",
+    "text_processor": "app.models.text_processor",
+    "embedder": "app.models.embedder",
+    "context_builder": "app.models.context_builder",
+    "retriever": "app.models.retriever",
+    "llm_client": "app.models.llm_client",
+    "response_cache": "app.models.response_cache",
+}
+
+# Each measurement runs in a fresh interpreter so imports are cold
+COMPONENT_PROBE = """
+import importlib, json, time
+start = time.perf_counter()
+from app.components import Components
+importlib.import_module({module!r})
+imported = time.perf_counter()
+Components("all").get({name!r})
+print(json.dumps({{"import_seconds": imported - start, "load_seconds": time.perf_counter() - imported}}))
+"""
+
+ROLE_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+app.main.components.warm_up()
+print(json.dumps({"import_seconds": imported - start, "load_seconds": time.perf_counter() - imported,
+                  "heavy_modules": sorted(m for m in ("torch", "transformers", "librosa") if m in sys.modules)}))
+"""
+
+
+def probe(code, env=None):
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env)
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        return {"error": (result.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import and load time of each ConsultIQ component and role")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = {"components": {}, "roles": {}}
+    print(f"{'component':<20} {'import s':>9} {'load s':>9}")
+    for name, module in MODULES.items():
+        timing = probe(COMPONENT_PROBE.format(module=module, name=name))
+        results["components"][name] = timing
+        if "error" in timing:
+            print(f"{name:<20} {'error: ' + timing['error']}")
+        else:
+            print(f"{name:<20} {timing['import_seconds']:9.2f} {timing['load_seconds']:9.2f}")
+
+    print(f"\n{'role':<20} {'import s':>9} {'warm-up s':>9}  heavy modules loaded")
+    for role in ROLES:
+        timing = probe(ROLE_PROBE, env={**os.environ, "SERVICE_ROLE": role})
+        results["roles"][role] = timing
+        if "error" in timing:
+            print(f"{role:<20} {'error: ' + timing['error']}")
+        else:
+            print(f"{role:<20} {timing['import_seconds']:9.2f} {timing['load_seconds']:9.2f}  {', '.join(timing['heavy_modules']) or '-'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Run Command (from consultiq): python -m pytest tests
+import asyncio
+import numpy as np
+import pytest
+from app.config import CHARS_PER_TOKEN
+from app.models.context_builder import (ContextBuilder, CHUNK_SEPARATOR, drop_duplicates, estimate_tokens,
+                                        mmr_order, overlap_length, pack)
+from app.models.retriever import Retriever
+
+
+def test_mmr_prefers_a_diverse_chunk_over_a_near_duplicate():
+    query = np.array([1.0, 0.0, 0.0])
+    docs = np.array([[1.0, 0.1, 0.0], [1.0, 0.12, 0.0], [0.7, 0.0, 0.7]])
+    assert mmr_order(query, docs, mmr_lambda=1.0) == [0, 1, 2]
+    assert mmr_order(query, docs, mmr_lambda=0.5) == [0, 2, 1]
+
+
+def test_drop_duplicates_keeps_the_better_ranked_chunk():
+    ids, docs = drop_duplicates([4, 1, 2], ["the  patient has\na cough", "patient has a", "fever"])
+    assert ids == [4, 2] and docs == ["the  patient has\na cough", "fever"]
+
+
+def test_pack_fills_the_budget_in_rank_order_and_lays_out_in_transcript_order():
+    docs = {0: "a" * 40, 1: "b" * 40, 2: "c" * 400, 3: "d" * 40}
+    ids = [3, 2, 0]
+    budget = estimate_tokens(docs[3]) + estimate_tokens(docs[0])
+    context, packed = pack(ids, [docs[i] for i in ids], budget)
+    assert packed == [0, 3]
+    assert context == docs[0] + CHUNK_SEPARATOR + docs[3]
+
+
+def test_pack_merges_the_overlap_of_neighbouring_chunks():
+    first, second = "the patient reports chest pain", "chest pain since monday"
+    assert overlap_length(first, second) == len("chest pain")
+    context, packed = pack([1, 0], [second, first], token_budget=100)
+    assert packed == [0, 1] and context == "the patient reports chest pain since monday"
+
+
+def test_pack_truncates_a_first_chunk_larger_than_the_budget():
+    context, packed = pack([5], ["x" * 1000], token_budget=10)
+    assert packed == [5] and len(context) == int(10 * CHARS_PER_TOKEN)
+
+
+class LookupEmbedder:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    async def aembed(self, texts):
+        return np.array([self.vectors[text] for text in texts], dtype=np.float32)
+
+
+@pytest.mark.parametrize("reranker", ["none", "mmr"])
+def test_build_returns_packed_context_and_stage_timings(tmp_path, reranker):
+    chunks = ["fever for three days", "fever for three days and chills", "no known allergies", "takes ibuprofen"]
+    vectors = {chunk: np.eye(4, dtype=np.float32)[i] + 0.1 for i, chunk in enumerate(chunks)}
+    retriever = Retriever(str(tmp_path), index_type="flat")
+    retriever.replace_documents("ABC123", np.stack([vectors[chunk] for chunk in chunks]), chunks, source="v1")
+    builder = ContextBuilder(retriever, LookupEmbedder(vectors), candidates=4, reranker=reranker, token_budget=15)
+
+    context, packed, timings = asyncio.run(builder.build("ABC123", "fever?", vectors[chunks[1]]))
+    # "fever for three days" is contained in the better ranked chunk 1 and dropped
+    assert 0 not in packed and 1 in packed and packed == sorted(packed)
+    assert sum(estimate_tokens(chunks[i]) for i in packed) <= 15
+    assert chunks[1] in context
+    assert set(timings) == {"search", "dedup", "rerank", "pack", "total"}
+    assert builder.snapshot()["total_ms"]["count"] == 1
+
+
+def test_unknown_reranker_is_rejected():
+    with pytest.raises(ValueError):
+        ContextBuilder(None, None, reranker="bm25")
@@ -0,0 +1,63 @@
+# Run Command (from consultiq): python -m pytest tests
+import asyncio
+import numpy as np
+from app.models.embedder import Embedder, EmbeddingCache, content_key
+
+DIM = 4
+
+
+class CountingModel:
+    """Stand-in sentence model: a text's vector is derived from its length, every encode() call is recorded."""
+    def __init__(self):
+        self.calls = []
+
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, show_progress_bar=False):
+        self.calls.append(list(texts))
+        return np.array([[len(text), 1.0, 0.0, i] for i, text in enumerate(texts)], dtype=np.float64)
+
+
+def make_embedder(tmp_path, **kwargs):
+    model = CountingModel()
+    return Embedder(model_name="test/model", model=model, cache_dir=str(tmp_path), **kwargs), model
+
+
+def test_embed_text_encodes_distinct_uncached_texts_once(tmp_path):
+    embedder, model = make_embedder(tmp_path)
+    vectors = embedder.embed_text(["a", "bb", "a"])
+    assert model.calls == [["a", "bb"]]
+    assert vectors.dtype == np.float32 and vectors.shape == (3, DIM)
+    np.testing.assert_array_equal(vectors[0], vectors[2])
+
+    embedder.embed_text(["bb", "ccc"])
+    assert model.calls[-1] == ["ccc"]
+    assert embedder.embed_text([]).shape == (0, DIM)
+
+
+def test_cache_survives_a_restart(tmp_path):
+    embedder, _ = make_embedder(tmp_path)
+    expected = embedder.embed_text(["first chunk", "second chunk"])
+
+    restarted, model = make_embedder(tmp_path, cache_size=1)
+    np.testing.assert_array_equal(restarted.embed_text(["second chunk", "first chunk"]), expected[::-1])
+    assert model.calls == []
+
+
+def test_cache_with_another_dimension_starts_over(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), DIM)
+    cache.put_many([content_key("a")], np.ones((1, DIM)))
+    assert EmbeddingCache(str(tmp_path), DIM * 2).get_many([content_key("a")]) == {}
+
+
+def test_concurrent_aembed_calls_share_one_encode(tmp_path):
+    embedder, model = make_embedder(tmp_path, max_wait_ms=50)
+
+    async def run():
+        return await asyncio.gather(embedder.aembed(["a", "b"]), embedder.aembed(["cc"]), embedder.aembed(["a"]))
+
+    first, second, third = asyncio.run(run())
+    assert len(model.calls) == 1 and sorted(model.calls[0]) == ["a", "b", "cc"]
+    assert first.shape == (2, DIM) and second.shape == (1, DIM)
+    np.testing.assert_array_equal(third[0], first[0])
@@ -0,0 +1,73 @@
+# Run Command (from consultiq): python -m pytest tests
+import asyncio
+from app.models.llm_client import FakeBackend, LLMClient
+
+
+class RecordingBackend(FakeBackend):
+    """FakeBackend that counts the pieces it produced and notes when its stream was closed."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.produced = 0
+        self.closed = False
+
+    def stream(self, prompt):
+        try:
+            for piece in super().stream(prompt):
+                self.produced += 1
+                yield piece
+        finally:
+            self.closed = True
+
+
+def make_client(backend, **kwargs):
+    return LLMClient(model_name="fake", backend=backend, **{"timeout": 1.0, "retries": 2, "backoff": 0.0, **kwargs})
+
+
+async def collect(client):
+    return [piece async for piece in client.stream_response("context", "query")]
+
+
+def test_streams_pieces_in_order():
+    client = make_client(FakeBackend(answer="one two three", first_token_delay=0, token_delay=0))
+    assert asyncio.run(collect(client)) == ["one", " two", " three"]
+    assert asyncio.run(client.generate_response("context", "query")) == "one two three"
+    assert client.metrics.snapshot()["ttft_seconds"]["count"] == 2
+
+
+def test_retries_failures_before_the_first_token():
+    backend = FakeBackend(answer="ok", first_token_delay=0, fail_first=2)
+    client = make_client(backend)
+    assert asyncio.run(client.generate_response("context", "query")) == "ok"
+    assert backend.calls == 3
+    assert client.metrics.counts["retries"] == 2
+    assert client.metrics.counts["errors"] == 0
+
+
+def test_gives_up_after_the_last_retry():
+    backend = FakeBackend(first_token_delay=0, fail_first=5)
+    client = make_client(backend, retries=1)
+    assert asyncio.run(client.generate_response("context", "query")).startswith("[LLM Error]")
+    assert backend.calls == 2
+    assert client.metrics.counts["errors"] == 1
+
+
+def test_timeout_before_the_first_token_is_retried():
+    backend = FakeBackend(answer="late", first_token_delay=0.3)
+    client = make_client(backend, timeout=0.05, retries=1)
+    assert asyncio.run(client.generate_response("context", "query")).startswith("[LLM Error]")
+    assert backend.calls == 2
+    assert client.metrics.counts["timeouts"] == 2
+
+
+def test_timeout_mid_answer_stops_the_backend_stream():
+    backend = RecordingBackend(answer=" ".join(["word"] * 50), first_token_delay=0, token_delay=0.05)
+    client = make_client(backend, timeout=0.12, max_concurrency=1)
+    assert asyncio.run(client.generate_response("context", "query")).startswith("[LLM Error]")
+    # Tokens had reached the caller, so no retry; the worker has exited before the call returned
+    assert backend.calls == 1
+    assert backend.closed
+    produced = backend.produced
+    assert produced < 10
+    asyncio.run(asyncio.sleep(0.2))
+    assert backend.produced == produced
+    assert client.metrics.counts["in_flight"] == 0
@@ -0,0 +1,49 @@
+# Run Command (from consultiq): python -m pytest tests
+import time
+from app.models.response_cache import ResponseCache
+
+KEY = ("ABC123", 1, (0, 1, 2))
+
+
+def test_similar_query_hits_and_dissimilar_misses():
+    cache = ResponseCache(threshold=0.95, ttl=60, max_entries=10)
+    cache.put(KEY, [1.0, 0.0], "answer")
+    assert cache.get(KEY, [2.0, 0.1]) == "answer"
+    assert cache.get(KEY, [0.0, 1.0]) is None
+    assert cache.get(("ABC123", 2, (0, 1, 2)), [1.0, 0.0]) is None
+    assert cache.snapshot()["hits"] == 1 and cache.snapshot()["misses"] == 2
+
+
+def test_most_similar_entry_wins():
+    cache = ResponseCache(threshold=0.5, ttl=60, max_entries=10)
+    cache.put(KEY, [1.0, 0.0], "first")
+    cache.put(KEY, [0.8, 0.6], "second")
+    assert cache.get(KEY, [0.7, 0.7]) == "second"
+
+
+def test_entries_expire_after_ttl():
+    cache = ResponseCache(threshold=0.9, ttl=0.05, max_entries=10)
+    cache.put(KEY, [1.0, 0.0], "answer")
+    time.sleep(0.06)
+    assert cache.get(KEY, [1.0, 0.0]) is None
+    assert cache.snapshot()["expirations"] == 1 and cache.snapshot()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(threshold=0.9, ttl=60, max_entries=2)
+    cache.put(("A", 1, ()), [1.0], "a")
+    cache.put(("B", 1, ()), [1.0], "b")
+    assert cache.get(("A", 1, ()), [1.0]) == "a"
+    cache.put(("C", 1, ()), [1.0], "c")
+    assert cache.get(("B", 1, ()), [1.0]) is None
+    assert cache.get(("A", 1, ()), [1.0]) == "a"
+    assert cache.snapshot()["evictions"] == 1
+
+
+def test_invalidate_forgets_only_that_patient():
+    cache = ResponseCache(threshold=0.9, ttl=60, max_entries=10)
+    cache.put(("A", 1, ()), [1.0], "a")
+    cache.put(("B", 1, ()), [1.0], "b")
+    cache.invalidate("A")
+    assert cache.get(("A", 1, ()), [1.0]) is None
+    assert cache.get(("B", 1, ()), [1.0]) == "b"
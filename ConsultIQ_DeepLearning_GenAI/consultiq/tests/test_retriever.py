@@ -0,0 +1,74 @@
+# Run Command (from consultiq): python -m pytest tests
+import numpy as np
+import pytest
+from app.models.retriever import Retriever, build_index, prepare_vectors, POINTS_PER_CENTROID
+
+PATIENT = "ABC123"
+
+
+def embeddings(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_add_documents_skips_indexed_ones_and_persists(tmp_path):
+    retriever = Retriever(str(tmp_path), index_type="flat")
+    vectors = embeddings(4)
+    retriever.add_documents(PATIENT, vectors[:3], ["a", "b", "c"], source="v1")
+    retriever.add_documents(PATIENT, vectors[2:], ["c", "d"], source="v2")
+    assert list(retriever.patients[PATIENT].docs) == ["a", "b", "c", "d"]
+    assert retriever.search(PATIENT, vectors[3]) == ["d"]
+
+    reloaded = Retriever(str(tmp_path), index_type="flat")
+    reloaded.load_all()
+    assert reloaded.indexed_source(PATIENT) == "v2"
+    assert reloaded.search(PATIENT, vectors[1]) == ["b"]
+
+
+def test_replace_documents_drops_the_old_transcript(tmp_path):
+    retriever = Retriever(str(tmp_path), index_type="flat")
+    vectors = embeddings(4)
+    retriever.add_documents(PATIENT, vectors[:2], ["old a", "old b"], source="v1")
+    retriever.replace_documents(PATIENT, vectors[2:], ["new a", "new b"], source="v2")
+    assert list(retriever.patients[PATIENT].docs) == ["new a", "new b"]
+    assert sorted(retriever.search(PATIENT, vectors[0], top_k=5)) == ["new a", "new b"]
+
+
+def test_appended_documents_only_for_a_grown_transcript(tmp_path):
+    retriever = Retriever(str(tmp_path), index_type="flat")
+    assert retriever.appended_documents(PATIENT, ["a"]) is None
+    retriever.replace_documents(PATIENT, embeddings(2), ["a", "b"], source="v1")
+    assert retriever.appended_documents(PATIENT, ["a", "b", "a", "c"]) == ["c"]
+    assert retriever.appended_documents(PATIENT, ["a", "b"]) == []
+    assert retriever.appended_documents(PATIENT, ["a", "x", "c"]) is None
+    assert retriever.appended_documents(PATIENT, ["a"]) is None
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw"])
+@pytest.mark.parametrize("metric", ["l2", "cosine"])
+def test_every_index_mode_finds_the_query_document(tmp_path, index_type, metric):
+    retriever = Retriever(str(tmp_path), index_type=index_type, metric=metric, nprobe=64)
+    vectors = embeddings(4 * POINTS_PER_CENTROID)
+    docs = [f"chunk {i}" for i in range(len(vectors))]
+    retriever.replace_documents(PATIENT, vectors, docs, source="v1")
+    assert retriever.patients[PATIENT].index_type == index_type
+    assert retriever.search(PATIENT, vectors[7]) == ["chunk 7"]
+
+
+def test_small_patient_falls_back_to_flat_and_moves_on_once_trainable(tmp_path):
+    retriever = Retriever(str(tmp_path), index_type="ivf")
+    vectors = embeddings(2 * POINTS_PER_CENTROID)
+    docs = [f"chunk {i}" for i in range(len(vectors))]
+    retriever.add_documents(PATIENT, vectors[:10], docs[:10], source="v1")
+    assert retriever.patients[PATIENT].index_type == "flat"
+    retriever.add_documents(PATIENT, vectors[10:], docs[10:], source="v2")
+    assert retriever.patients[PATIENT].index_type == "ivf"
+    assert retriever.search(PATIENT, vectors[50]) == ["chunk 50"]
+
+
+def test_ivfpq_index_is_trained_and_searchable():
+    # Small PQ parameters keep the training sample (39 * 2 ** pq_nbits) test sized
+    vectors = prepare_vectors(embeddings(POINTS_PER_CENTROID * 16, dim=16), "l2")
+    index, index_type = build_index(vectors, np.arange(len(vectors)), "ivfpq", "l2", pq_m=4, pq_nbits=4, nprobe=64)
+    assert index_type == "ivfpq" and index.ntotal == len(vectors)
+    _, ids = index.search(vectors[:20], 5)
+    assert (ids == np.arange(20)[:, None]).any(axis=1).mean() >= 0.9
@@ -0,0 +1,30 @@
+# Run Command (from consultiq): python -m pytest tests
+import time
+from app.models.transcription_queue import TranscriptionQueue, DONE
+
+
+class EchoProcessor:
+    def transcribe(self, audio_path):
+        return f"transcript of {audio_path}"
+
+
+def wait_for(job, timeout=2.0):
+    deadline = time.time() + timeout
+    while job.finished_at is None and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_finished_jobs_are_evicted_after_their_ttl(tmp_path):
+    queue = TranscriptionQueue(EchoProcessor(), job_ttl=0.1)
+    first = queue.submit("P1", "p1.wav", str(tmp_path / "p1.txt"))
+    wait_for(first)
+    assert first.status == DONE
+    assert queue.get(first.job_id) is first and queue.job_for_patient("P1") is first
+    assert (tmp_path / "p1.txt").read_text() == "transcript of p1.wav"
+
+    time.sleep(0.15)
+    second = queue.submit("P2", "p2.wav", str(tmp_path / "p2.txt"))
+    wait_for(second)
+    assert queue.get(first.job_id) is None and queue.job_for_patient("P1") is None
+    assert list(queue.jobs) == [second.job_id]
+    queue.shutdown()